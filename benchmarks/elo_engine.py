@@ -0,0 +1,66 @@
+import argparse
+import gc
+import random
+import time
+
+from data.chess_structs import ChessGame
+from helpers.elo import EloCalculator
+
+
+def GenerateGames(games_count: int, players_count: int, seed: int=0):
+    rnd = random.Random(seed)
+    games = []
+    for i in range(games_count):
+        p1, p2 = rnd.sample(range(1, players_count + 1), 2)
+        games.append(ChessGame(i + 1, i, p1, p2, rnd.randint(0, 2), None))
+    return games
+
+
+def RunEngine(engine_mode: int, games, players_count: int, repeat: int=1):
+    # -> best time of repeat runs and results of the last one
+    EloCalculator.ENGINE_MODE = engine_mode
+    best = None
+    for _ in range(repeat):
+        players_elo = {id: EloCalculator.ELO_START for id in range(1, players_count + 1)}
+        gdetails_list = checkpoints = None
+        # Garbage of the previous run is not collected during the measured one
+        gc.collect()
+
+        start = time.perf_counter()
+        gdetails_list, checkpoints = EloCalculator.ReplayGames(players_elo, iter(games))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, gdetails_list, checkpoints, players_elo
+
+
+def GameDetailsKey(gdetails):
+    return (gdetails.id, gdetails.player_1_elo, gdetails.player_2_elo, gdetails.player_1_change, gdetails.player_2_change)
+
+
+def Main():
+    parser = argparse.ArgumentParser(description='Compare python and numpy ELO replay engines.')
+    parser.add_argument('--games', type=int, default=1000000)
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every engine, the best time is reported')
+    args = parser.parse_args()
+
+    games = GenerateGames(args.games, args.players)
+
+    py_time, py_details, py_checkpoints, py_elo = RunEngine(EloCalculator.ENGINE_PYTHON, games, args.players, args.repeat)
+    np_time, np_details, np_checkpoints, np_elo = RunEngine(EloCalculator.ENGINE_NUMPY, games, args.players, args.repeat)
+
+    identical = (
+        [GameDetailsKey(d) for d in py_details] == [GameDetailsKey(d) for d in np_details]
+        and py_checkpoints == np_checkpoints
+        and py_elo == np_elo
+    )
+
+    print('games: {}, players: {}'.format(args.games, args.players))
+    print('python: {:.2f}s ({:.0f} games/s)'.format(py_time, args.games / py_time))
+    print('numpy:  {:.2f}s ({:.0f} games/s)'.format(np_time, args.games / np_time))
+    print('speedup: {:.1f}x, identical: {}'.format(py_time / np_time, identical))
+
+
+if __name__ == '__main__':
+    Main()
@@ -0,0 +1,75 @@
+import random
+
+import chess
+
+from data.chess_structs import ChessGame, GameResult
+
+
+class SyntheticGenerator:
+    ''' Generates synthetic players and games for benchmarks '''
+    # Number of distinct move texts, games reuse them to keep generation fast
+    PGN_POOL_SIZE = 200
+    # Date of the first game and average time between two games
+    START_DATE = 1420070400
+    AVERAGE_GAP = 600
+
+    def __init__(self, players: int, games: int, result_weights=(0.4, 0.3, 0.3), plies=(20, 120), seed: int=0):
+        # result_weights - probability of (white win, black win, draw)
+        # plies - range of length of generated games
+        self.players = players
+        self.games = games
+        self.result_weights = result_weights
+        self.plies = plies
+        self.rnd = random.Random(seed)
+        self.pgn_pool = None
+
+    def GetPlayers(self):
+        for i in range(self.players):
+            yield ('Player{} Synthetic{}'.format(i, i), 'P{}'.format(i))
+
+    def GetGames(self, player_ids):
+        # player_ids - ids of the generated players in the database
+        results = [GameResult.WHITE_WIN, GameResult.BLACK_WIN, GameResult.DRAW]
+        date = SyntheticGenerator.START_DATE
+        for _ in range(self.games):
+            white, black = self.rnd.sample(player_ids, 2)
+            result = self.rnd.choices(results, self.result_weights)[0]
+            date += self.rnd.randint(1, 2 * SyntheticGenerator.AVERAGE_GAP)
+            yield ChessGame(None, date, white, black, result, self.GetRandomPGN(result))
+
+    def PreparePGNPool(self):
+        if self.pgn_pool is None:
+            self.pgn_pool = [self.CreateMoveText() for _ in range(SyntheticGenerator.PGN_POOL_SIZE)]
+
+    def GetRandomPGN(self, result: int)-> str:
+        self.PreparePGNPool()
+        result_str = {GameResult.WHITE_WIN: '1-0', GameResult.BLACK_WIN: '0-1', GameResult.DRAW: '1/2-1/2'}[result]
+        return '{} {}'.format(self.rnd.choice(self.pgn_pool), result_str)
+
+    def CreateMoveText(self)-> str:
+        # Random legal game, moves are numbered like in a real PGN
+        board = chess.Board()
+        tokens = []
+        for _ in range(self.rnd.randint(*self.plies)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            move = self.rnd.choice(moves)
+            if board.turn == chess.WHITE:
+                tokens.append('{}.'.format(board.fullmove_number))
+            tokens.append(board.san(move))
+            board.push(move)
+        return ' '.join(tokens)
+
+    def FillDatabase(self, api, chunk_size: int=10000):
+        player_ids = api.AddPlayersBatch(list(self.GetPlayers()))
+        chunk = []
+        # Positions are left to the backfill, benchmarks measure the inserts only
+        for game in self.GetGames(player_ids):
+            chunk.append(game)
+            if len(chunk) >= chunk_size:
+                api.AddGamesBatch(chunk, index_positions=False)
+                chunk = []
+        if chunk:
+            api.AddGamesBatch(chunk, index_positions=False)
+        return player_ids
@@ -0,0 +1,70 @@
+import argparse
+import gc
+import os
+import tempfile
+import tracemalloc
+
+from data.chess_structs import ChessGame, ChessPlayer, GameDetails, RichChessGame
+from data.database_api import ChessDataAPI
+from benchmarks.generator import SyntheticGenerator
+
+RICH_FIELDS = (
+    'id',
+    'player_1_id', 'player_1_full_name', 'player_1_nick', 'player_1_display_name', 'player_1_elo', 'player_1_change',
+    'player_2_id', 'player_2_full_name', 'player_2_nick', 'player_2_display_name', 'player_2_elo', 'player_2_change',
+    'date', 'result', 'pgn', 'archived',
+)
+
+
+def MeasureBytes(create, count: int)-> float:
+    # -> bytes allocated per created object, values passed to the records are allocated beforehand
+    gc.collect()
+    tracemalloc.start()
+    objects = create()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current / count
+
+
+def Main():
+    parser = argparse.ArgumentParser(description='Measure memory used by one record of every kind.')
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--players', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        with ChessDataAPI(os.path.join(folder, 'memory.db')) as api:
+            generator = SyntheticGenerator(args.players, args.games)
+            generator.PreparePGNPool()
+            generator.FillDatabase(api)
+            api.UpdateEloTimestamp(2 ** 40)
+            api.RecalculateArchivedElo()
+
+            # Whole rows including their values, as the Games tab holds them
+            rich_row = MeasureBytes(lambda: list(api.GetRichGames()), args.games)
+
+            games = list(api.GetRichGames())
+            players = list(api.GetPlayers())
+
+    # Records only, values are shared with the already loaded rows
+    rich_values = [{name: getattr(g, name) for name in RICH_FIELDS} for g in games]
+    game_values = [(g.id, g.date, g.player_1_id, g.player_2_id, g.result, g.pgn) for g in games]
+    details_values = [(g.id, g.player_1_elo, g.player_2_elo, g.player_1_change, g.player_2_change) for g in games]
+    player_values = [(p.id, p.full_name, p.nick, p.elo) for p in players]
+
+    results = [
+        ('RichChessGame row', rich_row),
+        ('RichChessGame', MeasureBytes(lambda: [RichChessGame(**v) for v in rich_values], len(games))),
+        ('ChessGame', MeasureBytes(lambda: [ChessGame(*v) for v in game_values], len(games))),
+        ('GameDetails', MeasureBytes(lambda: [GameDetails(*v) for v in details_values], len(games))),
+        ('ChessPlayer', MeasureBytes(lambda: [ChessPlayer(*v) for v in player_values], len(players))),
+    ]
+
+    print('games: {}, players: {}'.format(args.games, args.players))
+    for name, size in results:
+        print('{:<20} {:>8.1f} bytes'.format(name, size))
+
+
+if __name__ == '__main__':
+    Main()
@@ -0,0 +1,135 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+
+from benchmarks.generator import SyntheticGenerator
+from data.database_api import ChessDataAPI
+from helpers.pgn_codec import PgnCodec
+from helpers.pgn_timeline import PositionTimeline
+
+
+class BenchmarkRunner:
+    ''' Timed scenarios over a synthetic database, results are collected as JSON '''
+    # Number of games parsed in the PGN scenario
+    PGN_SAMPLE = 1000
+
+    def __init__(self, games: int, players: int, seed: int=0):
+        self.games = games
+        self.players = players
+        self.seed = seed
+        self.results = []
+
+    def Run(self):
+        with tempfile.TemporaryDirectory() as folder:
+            db_path = os.path.join(folder, 'benchmark.db')
+            api = ChessDataAPI(db_path)
+            try:
+                generator = SyntheticGenerator(self.players, self.games, seed=self.seed)
+                generator.PreparePGNPool()
+                self.Measure('bulk_insert', self.games, generator.FillDatabase, api)
+
+                last_date = api.conn.execute('''SELECT MAX(date) FROM CH_GAMES''').fetchone()[0]
+                middle_date = api.conn.execute('''
+                    SELECT date FROM CH_GAMES ORDER BY date LIMIT 1 OFFSET ?
+                ''', (self.games // 2,)).fetchone()[0]
+
+                self.Measure('recalculate_elo_iterate_half', self.games // 2, api.RecalculateEloIterate, middle_date)
+                self.Measure('recalculate_elo_iterate_rest', self.games - self.games // 2, api.RecalculateEloIterate, last_date)
+                self.Measure('recalculate_archived_elo', self.games, api.RecalculateArchivedElo)
+                self.Measure('get_rich_games', self.games, lambda: sum(1 for _ in api.GetRichGames()))
+                self.Measure('get_rich_games_no_pgn', self.games, lambda: sum(1 for _ in api.GetRichGames(with_pgn=False)))
+                self.Measure('get_players', self.players, lambda: sum(1 for _ in api.GetPlayers()))
+
+                sample_games = [g for _, g in zip(range(BenchmarkRunner.PGN_SAMPLE), api.GetGames())]
+                sample = [g.pgn for g in sample_games]
+                self.Measure('parse_pgn_details', len(sample), BenchmarkRunner.ParseDetailsPGN, sample)
+                self.Measure('store_pgn_info', len(sample), BenchmarkRunner.StorePgnInfo, api, sample_games)
+                self.Measure('open_pgn_info', len(sample), BenchmarkRunner.OpenPgnInfo, api, sample_games)
+
+                # PGN storage, games above were stored as text
+                packed = [PgnCodec.Encode(pgn) for pgn in sample]
+                self.Measure('pack_pgn', len(sample), lambda: [PgnCodec.Encode(pgn) for pgn in sample])
+                self.Measure('unpack_pgn', len(sample), lambda: [PgnCodec.Decode(data) for data in packed])
+                self.MeasureSize('database_size_text', api, db_path)
+                self.Measure('convert_pgn_to_compact', self.games, api.SetPgnCompact, True)
+                self.MeasureSize('database_size_compact', api, db_path)
+                self.Measure('get_rich_games_compact', self.games, lambda: sum(1 for _ in api.GetRichGames()))
+            finally:
+                api.Close()
+        return self.results
+
+    def Measure(self, name: str, items: int, func, *args):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+
+        self.results.append({
+            'scenario': name,
+            'games': self.games,
+            'players': self.players,
+            'items': items,
+            'seconds': elapsed,
+            'items_per_second': items / elapsed if elapsed > 0 else None,
+        })
+
+    def MeasureSize(self, name: str, api, db_path: str):
+        # Size of the database file without free pages
+        api.conn.execute('''VACUUM''')
+        self.results.append({
+            'scenario': name,
+            'games': self.games,
+            'players': self.players,
+            'bytes': os.path.getsize(db_path),
+            'bytes_per_game': os.path.getsize(db_path) / self.games,
+        })
+
+    @staticmethod
+    def ParseDetailsPGN(pgn_list):
+        # Same work as GameDetailsDialog does when a game without stored PGN info is opened
+        for pgn in pgn_list:
+            PositionTimeline.FromPGN(pgn)
+
+    @staticmethod
+    def StorePgnInfo(api, games):
+        for game in games:
+            api.StoreGamePgnInfo(game.id, game.pgn, PositionTimeline.ParsePgn(game.pgn))
+
+    @staticmethod
+    def OpenPgnInfo(api, games):
+        # Same work as GameDetailsDialog does when a game with stored PGN info is opened
+        for game in games:
+            PositionTimeline.FromPgnInfo(api.GetGamePgnInfo(game.id))
+
+def Main():
+    parser = argparse.ArgumentParser(description='Run benchmarks on synthetic databases.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='number of games')
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file for results, stdout if not set')
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        results += BenchmarkRunner(size, args.players, args.seed).Run()
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    Main()
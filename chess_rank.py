@@ -1,14 +1,20 @@
 import sys, os
-from PySide6 import QtWidgets
-from data.data_manager import DataManager
-from gui.wid_main import MainWidget
 
 if __name__ == "__main__":
     # For dev
     root_folder = os.path.dirname(os.path.abspath(__file__))
     # For release
     # root_folder = ""
-    
+
+    # Headless mode, Qt is never imported
+    if len(sys.argv) > 1 and sys.argv[1] == 'cli':
+        from cli.chess_cli import Main
+        sys.exit(Main(root_folder, sys.argv[2:]))
+
+    from PySide6 import QtWidgets
+    from data.data_manager import DataManager
+    from gui.wid_main import MainWidget
+
     chess_data = DataManager(root_folder)
     chess_data.LoadData()
 
@@ -19,4 +25,6 @@ if __name__ == "__main__":
     widget.resize(1000, 600)
     widget.show()
 
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    chess_data.Close()
+    sys.exit(exit_code)
@@ -0,0 +1,218 @@
+import argparse
+import sys
+import time
+
+from data.chess_structs import GameResult, GameSide
+from data.data_manager import DataManager
+from data.pgn_importer import PgnImporter
+from data.position_indexer import PositionIndexer
+from helpers.elo import EloCalculator
+
+
+class ChessCLI:
+    ''' Headless access to the database, no Qt is imported '''
+
+    # Seven tag roster, exported first in this order, '?' if the game does not have the tag
+    # Date, White, Black and Result are taken from the database
+    STR_TAGS = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+    EXPORT_RESULT_MAP = {
+        GameResult.WHITE_WIN: '1-0',
+        GameResult.BLACK_WIN: '0-1',
+        GameResult.DRAW: '1/2-1/2',
+    }
+
+    def __init__(self, root_folder: str):
+        self.root_folder = root_folder
+
+    def Run(self, argv)-> int:
+        args = ChessCLI.CreateParser().parse_args(argv)
+
+        data_manager = DataManager(self.root_folder, args.db)
+        data_manager.LoadData()
+        if not data_manager.IsLoaded():
+            print(data_manager.load_err, file=sys.stderr)
+            return 1
+
+        try:
+            return args.command(self, data_manager.GetDatabaseAPI(), args)
+        finally:
+            data_manager.Close()
+
+    @staticmethod
+    def CreateParser()-> argparse.ArgumentParser:
+        parser = argparse.ArgumentParser(prog='chess_rank cli', description='Chess ELO without GUI.')
+        parser.add_argument('--db', help='path to the database file')
+        commands = parser.add_subparsers(required=True, metavar='command')
+
+        recalc = commands.add_parser('recalc', help='recalculate ELO')
+        recalc.add_argument('--until', help='archive games up to this date (YYYY-MM-DD or seconds since epoch)')
+        recalc.add_argument('--period', type=int, metavar='SECONDS', 
+            help='length of the rating period, games of one period are rated together, 0 - every game separately')
+        recalc.add_argument('--engine', choices=['python', 'numpy'], help='engine used to replay games')
+        recalc.add_argument('--trace', action='store_true', help='print rating change of every game')
+        recalc.set_defaults(command=ChessCLI.Recalc)
+
+        imp = commands.add_parser('import', help='import games from a PGN file')
+        imp.add_argument('path')
+        imp.add_argument('--processes', type=int, default=1, help='number of processes parsing games')
+        imp.add_argument('--validate', action='store_true', help='parse moves and skip invalid games')
+        imp.set_defaults(command=ChessCLI.Import)
+
+        exp = commands.add_parser('export', help='export all games to a PGN file')
+        exp.add_argument('path')
+        exp.set_defaults(command=ChessCLI.Export)
+
+        stats = commands.add_parser('stats', help='show database statistics')
+        stats.add_argument('--top', type=int, default=10, help='number of best players to show')
+        stats.set_defaults(command=ChessCLI.Stats)
+
+        rebuild = commands.add_parser('rebuild-stats', help='recompute player statistics from games')
+        rebuild.set_defaults(command=ChessCLI.RebuildStats)
+
+        positions = commands.add_parser('index-positions', help='add positions of not indexed games to the position index')
+        positions.add_argument('--processes', type=int, default=1, help='number of processes hashing positions')
+        positions.set_defaults(command=ChessCLI.IndexPositions)
+
+        storage = commands.add_parser('pgn-storage', help='store PGN of all games packed or as text')
+        storage.add_argument('mode', choices=['compact', 'text'])
+        storage.add_argument('--vacuum', action='store_true', help='shrink the database file afterwards')
+        storage.set_defaults(command=ChessCLI.PgnStorage)
+
+        return parser
+
+    # Commands
+    def Recalc(self, api, args)-> int:
+        if args.engine:
+            EloCalculator.ENGINE_MODE = EloCalculator.ENGINE_NUMPY if args.engine == 'numpy' else EloCalculator.ENGINE_PYTHON
+
+        if args.trace:
+            EloCalculator.AddTraceHook(ChessCLI.PrintTrace)
+
+        try:
+            if args.period is not None:
+                # A new period length replays all archived games
+                if args.period < 0:
+                    print('Period length cannot be negative', file=sys.stderr)
+                    return 1
+                until = ChessCLI.ParseTimestamp(args.until) if args.until else None
+                metrics = api.SetEloPeriodLength(args.period, until)
+            elif args.until:
+                metrics = api.RecalculateEloIterate(ChessCLI.ParseTimestamp(args.until))
+            else:
+                metrics = api.RecalculateArchivedElo()
+        finally:
+            if args.trace:
+                EloCalculator.RemoveTraceHook(ChessCLI.PrintTrace)
+
+        print('ELO calculated: {}'.format(metrics.GetSummary()))
+        return 0
+
+    def Import(self, api, args)-> int:
+        importer = PgnImporter(api, processes=args.processes, validate=args.validate)
+        stats = importer.Import(args.path, progress=lambda imported, skipped: print(
+            '{} games imported, {} skipped'.format(imported, skipped)))
+
+        for error in stats.errors:
+            print('Skipped: {}'.format(error), file=sys.stderr)
+        print(stats.GetSummary())
+        return 0
+
+    def Export(self, api, args)-> int:
+        count = 0
+        with open(args.path, 'w', encoding='utf-8') as pgn_file:
+            for game in api.GetRichGames():
+                pgn_file.write(ChessCLI.CreateExportPGN(game))
+                pgn_file.write('\n\n')
+                count += 1
+
+        print('Exported {} games to {}'.format(count, args.path))
+        return 0
+
+    def Stats(self, api, args)-> int:
+        info = api.GetInfo()
+        cur = api.conn.cursor()
+        games = cur.execute('''SELECT COUNT(*) FROM CH_GAMES''').fetchone()[0]
+        archived = cur.execute('''SELECT COUNT(*) FROM CH_GAMES WHERE date <= ?''', (info.elo_calc_date,)).fetchone()[0]
+
+        print('Players: {}'.format(api.GetPlayersCount()[0]))
+        print('Games: {} ({} archived)'.format(games, archived))
+        print('ELO calculated up to: {}'.format(time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info.elo_calc_date))))
+        print('Rating period: {}'.format('{}s'.format(info.elo_period_length) if info.elo_period_length else 'none'))
+        print('PGN storage: {}'.format('compact' if info.pgn_compact else 'text'))
+
+        players = sorted(api.GetPlayers(), key=lambda p: p.elo, reverse=True)
+        for i, p in enumerate(players[:args.top]):
+            print('{:>3}. {:<32} {}'.format(i + 1, '{} ({})'.format(p.full_name, p.nick), p.elo))
+        return 0
+
+    def RebuildStats(self, api, args)-> int:
+        start = time.perf_counter()
+        api.RebuildPlayerStats()
+        print('Player statistics rebuilt in {:.2f}s'.format(time.perf_counter() - start))
+        return 0
+
+    def IndexPositions(self, api, args)-> int:
+        indexer = PositionIndexer(api, processes=args.processes)
+        stats = indexer.Backfill(progress=lambda indexed, total: print('{}/{} games indexed'.format(indexed, total)))
+        print(stats.GetSummary())
+        return 0
+
+    def PgnStorage(self, api, args)-> int:
+        start = time.perf_counter()
+        converted = api.SetPgnCompact(args.mode == 'compact')
+        print('Converted PGN of {} games in {:.2f}s'.format(converted, time.perf_counter() - start))
+
+        if args.vacuum:
+            # Pages freed by the conversion are otherwise only reused by new data
+            start = time.perf_counter()
+            api.conn.execute('''VACUUM''')
+            print('Database vacuumed in {:.2f}s'.format(time.perf_counter() - start))
+        return 0
+
+    # Helpers
+    @staticmethod
+    def PrintTrace(game, gdetails):
+        print('Game {}: P{} {} {:+d}, P{} {} {:+d}'.format(
+            game.id,
+            game.player_1_id, gdetails.player_1_elo, gdetails.player_1_change,
+            game.player_2_id, gdetails.player_2_elo, gdetails.player_2_change))
+
+    @staticmethod
+    def ParseTimestamp(value: str)-> int:
+        if value.lstrip('-').isdigit():
+            return int(value)
+        return int(time.mktime(time.strptime(value, '%Y-%m-%d')))
+
+    @staticmethod
+    def CreateExportPGN(game)-> str:
+        # Seven tag roster values known by the database override the stored ones,
+        # other stored tags follow the roster in their original order
+        tags = {tag: '?' for tag in ChessCLI.STR_TAGS}
+        moves = []
+        for line in (game.pgn or '').splitlines():
+            header = PgnImporter.HEADER_RE.match(line.strip())
+            if header:
+                tags[header.group(1)] = PgnImporter.ESCAPE_RE.sub(r'\1', header.group(2))
+            else:
+                moves.append(line)
+
+        tags.update({
+            'Date': time.strftime('%Y.%m.%d', time.gmtime(game.date)),
+            'White': game.player_1_full_name,
+            'Black': game.player_2_full_name,
+            'Result': ChessCLI.EXPORT_RESULT_MAP[game.result],
+        })
+        headers = [ChessCLI.FormatTag(tag, value) for tag, value in tags.items()]
+        move_text = '\n'.join(moves).strip()
+        if not move_text.endswith(tags['Result']):
+            move_text = '{} {}'.format(move_text, tags['Result']).strip()
+        return '{}\n\n{}'.format('\n'.join(headers), move_text)
+
+    @staticmethod
+    def FormatTag(tag: str, value: str)-> str:
+        # '"' and '\' in the value are escaped with '\'
+        return '[{} "{}"]'.format(tag, value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def Main(root_folder: str, argv)-> int:
+    return ChessCLI(root_folder).Run(argv)
@@ -0,0 +1,262 @@
+import collections
+import functools
+import inspect
+import json
+import threading
+import time
+
+
+class ProfileEntry:
+    ''' Statistics of one API method or one SQL statement '''
+    # Number of the latest latencies used for percentiles
+    MAX_SAMPLES = 10000
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.calls = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.samples = collections.deque(maxlen=ProfileEntry.MAX_SAMPLES)
+
+    def Add(self, seconds: float, rows: int):
+        self.calls += 1
+        self.rows += rows
+        self.total_time += seconds
+        self.max_time = max(self.max_time, seconds)
+        self.samples.append(seconds)
+
+    def GetPercentile(self, percent: float)-> float:
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100.0))]
+
+    def ToDict(self)-> dict:
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'calls': self.calls,
+            'rows': self.rows,
+            'total_ms': self.total_time * 1000.0,
+            'mean_ms': self.total_time * 1000.0 / self.calls if self.calls else 0.0,
+            'p50_ms': self.GetPercentile(50) * 1000.0,
+            'p95_ms': self.GetPercentile(95) * 1000.0,
+            'p99_ms': self.GetPercentile(99) * 1000.0,
+            'max_ms': self.max_time * 1000.0,
+        }
+
+
+class ApiProfiler:
+    ''' Opt-in statistics of ChessDataAPI methods and SQL statements they run '''
+    KIND_API = 'api'
+    KIND_SQL = 'sql'
+
+    # Statements slower than this get their query plan captured
+    SLOW_QUERY_SECONDS = 0.05
+
+    def __init__(self, capture_plans: bool=False):
+        self.capture_plans = capture_plans
+        self.lock = threading.Lock()
+        self.entries = {}
+        # SQL -> rows of EXPLAIN QUERY PLAN
+        self.plans = {}
+
+    def Reset(self):
+        with self.lock:
+            self.entries.clear()
+            self.plans.clear()
+
+    def Record(self, kind: str, name: str, seconds: float, rows: int=0):
+        with self.lock:
+            entry = self.entries.get((kind, name))
+            if not entry:
+                entry = self.entries[(kind, name)] = ProfileEntry(kind, name)
+            entry.Add(seconds, rows)
+
+    def RecordPlan(self, conn, sql: str, params):
+        if sql in self.plans:
+            return
+        try:
+            plan = conn.execute('''EXPLAIN QUERY PLAN {}'''.format(sql), params).fetchall()
+        except Exception as e:
+            plan = [('error', str(e))]
+        with self.lock:
+            self.plans[sql] = [' '.join(str(c) for c in row) for row in plan]
+
+    def GetEntries(self)-> list:
+        # -> entries as dicts, the slowest first
+        with self.lock:
+            entries = [e.ToDict() for e in self.entries.values()]
+            plans = dict(self.plans)
+        for e in entries:
+            e['plan'] = plans.get(e['name'], []) if e['kind'] == ApiProfiler.KIND_SQL else []
+        return sorted(entries, key=lambda e: e['total_ms'], reverse=True)
+
+    def ExportJson(self, path: str):
+        with open(path, 'w', encoding='utf-8') as json_file:
+            json.dump({'created': int(time.time()), 'entries': self.GetEntries()}, json_file, indent=2)
+
+    # Wrappers
+    def WrapMethod(self, name: str, method):
+        # Generators are measured until they are exhausted, rows are the yielded items
+        is_generator = inspect.isgeneratorfunction(method)
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            if is_generator:
+                return self.__MeasureGenerator(name, method(*args, **kwargs))
+
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+            self.Record(ApiProfiler.KIND_API, name, elapsed, len(result) if isinstance(result, list) else 0)
+            return result
+
+        return wrapper
+
+    def WrapConnection(self, conn):
+        return ProfiledConnection(conn, self)
+
+    def __MeasureGenerator(self, name: str, generator):
+        rows = 0
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                rows += 1
+                yield item
+        finally:
+            self.Record(ApiProfiler.KIND_API, name, elapsed, rows)
+
+
+class ProfiledCursor:
+    ''' Cursor proxy, time of execute and all fetches is recorded as one call of the statement '''
+
+    def __init__(self, cursor, conn, profiler: ApiProfiler):
+        self.cursor = cursor
+        self.conn = conn
+        self.profiler = profiler
+        self.sql = None
+        self.params = None
+        self.elapsed = 0.0
+        self.rows = 0
+
+    def __del__(self):
+        self.__Flush()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = next(self.cursor)
+        except StopIteration:
+            self.elapsed += time.perf_counter() - start
+            self.__Flush()
+            raise
+        self.elapsed += time.perf_counter() - start
+        self.rows += 1
+        return row
+
+    def execute(self, sql: str, params=()):
+        self.__Flush()
+        self.sql = sql
+        self.params = params
+        start = time.perf_counter()
+        self.cursor.execute(sql, params)
+        self.elapsed += time.perf_counter() - start
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self.__Flush()
+        start = time.perf_counter()
+        self.cursor.executemany(sql, seq_of_params)
+        self.profiler.Record(ApiProfiler.KIND_SQL, ProfiledCursor.NormalizeSql(sql),
+            time.perf_counter() - start, max(self.cursor.rowcount, 0))
+        return self
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self.cursor.fetchone()
+        self.elapsed += time.perf_counter() - start
+        if row is None:
+            self.__Flush()
+        else:
+            self.rows += 1
+        return row
+
+    def fetchmany(self, size: int=None):
+        start = time.perf_counter()
+        rows = self.cursor.fetchmany(self.cursor.arraysize if size is None else size)
+        self.elapsed += time.perf_counter() - start
+        self.rows += len(rows)
+        if not rows:
+            self.__Flush()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self.cursor.fetchall()
+        self.elapsed += time.perf_counter() - start
+        self.rows += len(rows)
+        self.__Flush()
+        return rows
+
+    @staticmethod
+    def NormalizeSql(sql: str)-> str:
+        return ' '.join(sql.split())
+
+    def __Flush(self):
+        if self.sql is None:
+            return
+
+        sql = ProfiledCursor.NormalizeSql(self.sql)
+        self.profiler.Record(ApiProfiler.KIND_SQL, sql, self.elapsed, self.rows)
+        if self.profiler.capture_plans and self.elapsed >= ApiProfiler.SLOW_QUERY_SECONDS:
+            self.profiler.RecordPlan(self.conn, sql, self.params)
+
+        self.sql = None
+        self.params = None
+        self.elapsed = 0.0
+        self.rows = 0
+
+
+class ProfiledConnection:
+    ''' Connection proxy handing out profiled cursors '''
+
+    def __init__(self, conn, profiler: ApiProfiler):
+        self.conn = conn
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        self.conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.conn.__exit__(exc_type, exc_value, traceback)
+
+    def cursor(self):
+        return ProfiledCursor(self.conn.cursor(), self.conn, self.profiler)
+
+    def execute(self, sql: str, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql: str, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
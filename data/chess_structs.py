@@ -1,9 +1,14 @@
-from PySide6 import QtCore
+import datetime
+import time
 
 
 class DatabaseInfo:
-    def __init__(self, calc_date: int):
+    def __init__(self, calc_date: int, period_length: int=0, pgn_compact: bool=False):
         self.elo_calc_date = calc_date
+        # Length of the rating period in seconds, 0 - every game is rated separately
+        self.elo_period_length = period_length
+        # PGN of new games is packed by PgnCodec
+        self.pgn_compact = pgn_compact
 
 
 class GameSide:
@@ -72,6 +77,8 @@ class ChessGamesDifference:
 
 
 class ChessGame:
+    __slots__ = ('id', 'date', 'player_1_id', 'player_2_id', 'result', 'pgn')
+
     def __init__(self, 
         id, 
         date: str, 
@@ -91,7 +98,7 @@ class ChessGame:
     def GetBlankGame():
         return ChessGame(
             None,
-            QtCore.QDateTime.currentSecsSinceEpoch(),
+            int(time.time()),
             None,
             None,
             GameResult.DRAW,
@@ -116,14 +123,22 @@ class ChessGame:
         return flag
 
     def GetQtDate(self):
+        # Qt is imported only when needed, so the data layer works without it
+        from PySide6 import QtCore
         return QtCore.QDateTime.fromSecsSinceEpoch(self.date)
 
     def GetFormatedDate(self):
-        return self.GetQtDate().toString()
+        return ChessGame.FormatDate(self.date)
+
+    @staticmethod
+    def FormatDate(date: int)-> str:
+        # Same format as QDateTime.toString(), e.g. 'Wed May 3 14:05:00 2023'
+        dt = datetime.datetime.fromtimestamp(date)
+        return '{:%a %b} {} {:%H:%M:%S %Y}'.format(dt, dt.day, dt)
 
     def getData(self):
         yield self.id
-        yield self.GetQtDate().toString()
+        yield self.GetFormatedDate()
         yield self.player_1_id
         yield self.player_1_id
         yield GameResult.getString(self.result)
@@ -138,9 +153,44 @@ class ChessGame:
 
 
 class RichChessGame(ChessGame):
-    def __init__(self, **kwargs):
-        for key, value in kwargs.items():
-            self.__dict__[key] = value
+    __slots__ = (
+        'player_1_full_name', 'player_1_nick', 'player_1_display_name', 'player_1_elo', 'player_1_change',
+        'player_2_full_name', 'player_2_nick', 'player_2_display_name', 'player_2_elo', 'player_2_change',
+        'archived', 'pgn_valid', 'pgn_plies'
+    )
+
+    def __init__(self, *,
+        id: int,
+        player_1_id: int, player_1_full_name: str, player_1_nick: str, player_1_display_name: str, 
+        player_1_elo: int, player_1_change: int,
+        player_2_id: int, player_2_full_name: str, player_2_nick: str, player_2_display_name: str, 
+        player_2_elo: int, player_2_change: int,
+        date: int,
+        result: int,
+        pgn: str,
+        archived: bool,
+        pgn_valid: bool=None,
+        pgn_plies: int=None
+    ):
+        super().__init__(id, date, player_1_id, player_2_id, result, pgn)
+
+        self.player_1_full_name = player_1_full_name
+        self.player_1_nick = player_1_nick
+        self.player_1_display_name = player_1_display_name
+        self.player_1_elo = player_1_elo
+        self.player_1_change = player_1_change
+
+        self.player_2_full_name = player_2_full_name
+        self.player_2_nick = player_2_nick
+        self.player_2_display_name = player_2_display_name
+        self.player_2_elo = player_2_elo
+        self.player_2_change = player_2_change
+
+        self.archived = archived
+
+        # Stored GamePgnInfo of the game, None if it was not parsed yet
+        self.pgn_valid = pgn_valid
+        self.pgn_plies = pgn_plies
 
     def GetChessGame(self)-> ChessGame:
         return ChessGame(
@@ -153,19 +203,12 @@ class RichChessGame(ChessGame):
         )
 
     def GetPlayerDisplayName(self, player: int):
-        p_fullname = None
-        p_nick = None
+        # Display names are formatted by the database when the rich game row is written
         if player == GameSide.WHITE:
-            p_fullname = self.player_1_full_name
-            p_nick = self.player_1_nick
+            return self.player_1_display_name
         if player == GameSide.BLACK:
-            p_fullname = self.player_2_full_name
-            p_nick = self.player_2_nick
-        if not p_fullname or not p_nick:
-            return "[Invalid]"
-
-        p_fullname = p_fullname.split(' ')
-        return "{} '{}' {}".format(p_fullname[0], p_nick, ' '.join(p_fullname[1:]))
+            return self.player_2_display_name
+        return "[Invalid]"
 
     def GetPlayerEloChange(self, player: int):
         if player == GameSide.WHITE:
@@ -184,8 +227,62 @@ class RichChessGame(ChessGame):
     def GetFormatedResult(self):
         return GameResult.getString(self.result)
 
+    def GetFormatedPgnStatus(self):
+        return GamePgnInfo.FormatStatus(self.pgn_valid, self.pgn_plies)
+
+
+class GameFilter:
+    ''' Conditions of the games search, None or empty text matches any game '''
+    __slots__ = ('text', 'player_id', 'date_from', 'date_to', 'result', 'archived')
+
+    def __init__(self, 
+        text: str='', 
+        player_id: int=None, 
+        date_from: int=None, 
+        date_to: int=None, 
+        result: int=None, 
+        archived: bool=None
+    ):
+        # text - words searched in player names and PGN headers/comments
+        self.text = text
+        # player_id - player on either side
+        self.player_id = player_id
+        self.date_from = date_from
+        self.date_to = date_to
+        self.result = result
+        self.archived = archived
+
+    def IsEmpty(self)-> bool:
+        return (not self.text.strip() and self.player_id is None and self.date_from is None 
+            and self.date_to is None and self.result is None and self.archived is None)
+
+
+class GamePgnInfo:
+    ''' Result of parsing the PGN of a game, stored when the game is saved '''
+    __slots__ = ('valid', 'plies', 'fen', 'sans', 'moves', 'errors')
+
+    def __init__(self, valid: bool, plies: int, fen: str, sans: list, moves: list, errors: list):
+        # valid - the PGN was read without errors
+        self.valid = valid
+        self.plies = plies
+        # fen - starting position, None for the standard one
+        self.fen = fen
+        # sans, moves - mainline up to the first error, moves as chess.Move
+        self.sans = sans
+        self.moves = moves
+        self.errors = errors
+
+    @staticmethod
+    def FormatStatus(valid: bool, plies: int)-> str:
+        # '-' for a game that was not parsed yet
+        if valid is None:
+            return '-'
+        return '{} / {} plies'.format('Valid' if valid else 'Invalid', plies)
+
 
 class GameDetails:
+    __slots__ = ('id', 'player_1_elo', 'player_2_elo', 'player_1_change', 'player_2_change')
+
     def __init__(self, id, player_1_elo, player_2_elo, player_1_change, player_2_change):
         self.id = id
         self.player_1_elo = player_1_elo 
@@ -194,22 +291,96 @@ class GameDetails:
         self.player_2_change = player_2_change
 
 
+class RatingHistoryEntry:
+    __slots__ = ('player_id', 'date', 'game_id', 'rating_before', 'delta')
+
+    def __init__(self, player_id: int, date: int, game_id: int, rating_before: int, delta: int):
+        self.player_id = player_id
+        self.date = date
+        self.game_id = game_id
+        self.rating_before = rating_before
+        self.delta = delta
+
+    def GetRatingAfter(self)-> int:
+        return self.rating_before + self.delta
+
+    def GetFormatedDate(self):
+        return ChessGame.FormatDate(self.date)
+
+
+class PlayerStats:
+    __slots__ = (
+        'white_wins', 'white_draws', 'white_losses', 'black_wins', 'black_draws', 'black_losses',
+        'rated_games', 'rated_points', 'opponent_rating_sum', 'peak_rating'
+    )
+
+    def __init__(self, 
+        white_wins: int, white_draws: int, white_losses: int, 
+        black_wins: int, black_draws: int, black_losses: int,
+        rated_games: int, rated_points: int, opponent_rating_sum: int, peak_rating: int
+    ):
+        self.white_wins = white_wins
+        self.white_draws = white_draws
+        self.white_losses = white_losses
+        self.black_wins = black_wins
+        self.black_draws = black_draws
+        self.black_losses = black_losses
+
+        self.rated_games = rated_games
+        # Points of rated games doubled, win = 2, draw = 1
+        self.rated_points = rated_points
+        self.opponent_rating_sum = opponent_rating_sum
+        # None without rated games
+        self.peak_rating = peak_rating
+
+    def GetGamesCount(self)-> int:
+        return (self.white_wins + self.white_draws + self.white_losses 
+            + self.black_wins + self.black_draws + self.black_losses)
+
+    def GetFormatedResults(self, side: int)-> str:
+        # Wins/draws/losses
+        if side == GameSide.WHITE:
+            return '{}/{}/{}'.format(self.white_wins, self.white_draws, self.white_losses)
+        return '{}/{}/{}'.format(self.black_wins, self.black_draws, self.black_losses)
+
+    def GetPerformanceRating(self):
+        # Average opponent rating + 400 * (wins - losses) / games, None without rated games
+        if not self.rated_games:
+            return None
+        wins_minus_losses = self.rated_points - self.rated_games
+        return round((self.opponent_rating_sum + 400 * wins_minus_losses) / self.rated_games)
+
+
 class ChessPlayer:
-    def __init__(self, id: int, full_name: str, nick: str, elo: int) -> None:
+    __slots__ = ('id', 'full_name', 'nick', 'elo', 'stats')
+
+    def __init__(self, id: int, full_name: str, nick: str, elo: int, stats: PlayerStats = None) -> None:
         self.id = id
         self.full_name = full_name
         self.nick = nick
         self.elo = elo
+        self.stats = stats
 
     def getData(self):
         yield self.id
         yield self.full_name
         yield self.nick
         yield self.elo
+        if self.stats:
+            yield self.stats.GetGamesCount()
+            yield self.stats.GetFormatedResults(GameSide.WHITE)
+            yield self.stats.GetFormatedResults(GameSide.BLACK)
+            yield self.stats.peak_rating
+            yield self.stats.GetPerformanceRating()
 
     @staticmethod
     def getHeaders():
         yield 'ID'
         yield 'Full Name'
         yield 'Nick'
-        yield 'Elo'
\ No newline at end of file
+        yield 'Elo'
+        yield 'Games'
+        yield 'White W/D/L'
+        yield 'Black W/D/L'
+        yield 'Peak'
+        yield 'Performance'
\ No newline at end of file
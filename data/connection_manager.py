@@ -0,0 +1,53 @@
+import sqlite3
+import threading
+
+from data.database_creator import ChessDatabaseConnector
+
+
+class ChessConnectionManager:
+    ''' Hands out one configured connection per thread, all of them are closed by Close '''
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.closed = False
+
+        # Thread ident -> connection, ident of a finished thread may be reused by a new one
+        self.connections = {}
+
+        # Structures are created or migrated by the first connection
+        self.connections[threading.get_ident()] = ChessDatabaseConnector.GetOrCreateDatabase(db_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    def GetConnection(self)-> sqlite3.Connection:
+        conn = self.connections.get(threading.get_ident())
+        if conn:
+            return conn
+
+        with self.lock:
+            if self.closed:
+                raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+            conn = ChessDatabaseConnector.Connect(self.db_path)
+            self.connections[threading.get_ident()] = conn
+            return conn
+
+    def ReleaseConnection(self):
+        # Closes connection of the calling thread, e.g. at the end of a background task
+        with self.lock:
+            conn = self.connections.pop(threading.get_ident(), None)
+        if conn:
+            conn.close()
+
+    def Close(self):
+        with self.lock:
+            self.closed = True
+            connections = list(self.connections.values())
+            self.connections.clear()
+
+        for conn in connections:
+            conn.close()
@@ -2,8 +2,6 @@ import os
 import json
 import traceback
 
-from PySide6.QtWidgets import QLabel, QWidget
-from PySide6 import QtGui
 from data.chess_structs import RichChessGame
 
 from data.database_api import ChessDataAPI
@@ -11,11 +9,11 @@ from data.database_api import ChessDataAPI
 class DataManager:
     SQL_DB_PATH = "./database.db"
 
-    def __init__(self, root_folder):
+    def __init__(self, root_folder, db_path: str = None):
         self.main_widget = None
 
         # Path
-        self.db_path = os.path.join(root_folder, DataManager.SQL_DB_PATH)
+        self.db_path = db_path if db_path else os.path.join(root_folder, DataManager.SQL_DB_PATH)
 
         # Data
         self.data = None
@@ -31,6 +29,15 @@ class DataManager:
     def GetDatabaseAPI(self):
         return self.data
 
+    def GetDatabasePath(self)-> str:
+        return self.db_path
+
+    def Close(self)-> None:
+        if self.data:
+            self.data.Close()
+            self.data = None
+            self.loaded = False
+
     # Bootstrap
     def LoadData(self)-> None:
         try:
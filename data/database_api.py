@@ -1,18 +1,113 @@
-from data.chess_structs import ChessGame, ChessPlayer, RichChessGame, GameDetails, GameResult, DatabaseInfo
+import contextlib
+import sys
+
+from data.chess_structs import ChessGame, ChessPlayer, RichChessGame, GameDetails, GameFilter, GamePgnInfo, GameResult, DatabaseInfo, RatingHistoryEntry, PlayerStats
+from data.api_profiler import ApiProfiler
+from data.connection_manager import ChessConnectionManager
 from data.database_creator import ChessDatabaseConnector
 from helpers.elo import EloCalculator
+from helpers.elo_metrics import EloMetrics
+from helpers.pgn_codec import PgnCodec
+from helpers.pgn_timeline import PositionTimeline
+from helpers.position_hash import PositionHasher
 
 
 class ChessDataAPI:
     GAME_UPDATE_MODE_CHECK = 0
     GAME_UPDATE_MODE_SIMPLE = 1
 
-    def __init__(self, db_path: str) -> None:
-        self.conn = ChessDatabaseConnector.GetOrCreateDatabase(db_path)
+    # Methods that are never profiled
+    PROFILER_EXCLUDED = ('Close', 'ReleaseConnection', 'EnableProfiling', 'DisableProfiling', 'GetProfiler', 'ReadSnapshot',
+                         'WriteTransaction')
+
+    # Rows fetched from sqlite at once by the streaming generators
+    FETCH_SIZE = 1000
+
+    # Games matching a text search up to this count are collected and sorted by date,
+    # more of them are found faster by walking the games in date order
+    SEARCH_SORT_LIMIT = 5000
+
+    def __init__(self, db_path: str, fetch_size: int=FETCH_SIZE) -> None:
+        self.connections = ChessConnectionManager(db_path)
+        self.profiler = None
+        self.fetch_size = fetch_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.Close()
+
+    @property
+    def conn(self):
+        # Every thread works on its own connection
+        conn = self.connections.GetConnection()
+        if self.profiler:
+            return self.profiler.WrapConnection(conn)
+        return conn
+
+    def ReleaseConnection(self):
+        # Closes connection of the calling thread, the next call opens a new one
+        self.connections.ReleaseConnection()
+
+    def Close(self):
+        self.connections.Close()
+
+    def SetFetchSize(self, fetch_size: int):
+        self.fetch_size = max(1, fetch_size)
+
+    @contextlib.contextmanager
+    def ReadSnapshot(self):
+        # Reads inside see one state of the database, writers of other threads are not blocked (WAL)
+        # The snapshot ends before the caller writes its results
+        conn = self.conn
+        if conn.in_transaction:
+            yield
+            return
+
+        conn.execute('''BEGIN''')
+        try:
+            yield
+        finally:
+            conn.commit()
+
+    @contextlib.contextmanager
+    def WriteTransaction(self):
+        # Writes inside are committed together or not at all, batch methods inside do not commit themselves
+        conn = self.conn
+        if conn.in_transaction:
+            yield
+            return
+
+        conn.execute('''BEGIN''')
+        try:
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    # Profiling
+    def EnableProfiling(self, capture_plans: bool=False)-> ApiProfiler:
+        # Public methods are replaced by measuring wrappers on this instance only
+        if not self.profiler:
+            self.profiler = ApiProfiler()
+            for name, member in vars(ChessDataAPI).items():
+                if callable(member) and not name.startswith('_') and name not in ChessDataAPI.PROFILER_EXCLUDED:
+                    setattr(self, name, self.profiler.WrapMethod(name, getattr(self, name)))
+        self.profiler.capture_plans = capture_plans
+        return self.profiler
 
-    def __del__(self):
-        print("Database destructor called.")
-        # self.conn.close()
+    def DisableProfiling(self):
+        if not self.profiler:
+            return
+        for name in list(vars(self)):
+            if hasattr(ChessDataAPI, name) and callable(getattr(ChessDataAPI, name)):
+                delattr(self, name)
+        self.profiler = None
+
+    def GetProfiler(self)-> ApiProfiler:
+        return self.profiler
 
     ########################
     # API
@@ -20,15 +115,32 @@ class ChessDataAPI:
     # Info
     def GetInfo(self)-> DatabaseInfo:
         cur = self.conn.cursor()
-        res = cur.execute('''SELECT elo_calc_date FROM CH_INFO''')
+        res = cur.execute('''SELECT elo_calc_date, elo_period_length, pgn_compact FROM CH_INFO''')
         for r in res.fetchall():
-            return DatabaseInfo(*r)
+            return DatabaseInfo(r[0], r[1], bool(r[2]))
 
     def UpdateEloTimestamp(self, timestamp):
         cur = self.conn.cursor()
         res = cur.execute('''UPDATE CH_INFO SET elo_calc_date = ?''', (timestamp,))
         self.conn.commit()
 
+    def SetEloPeriodLength(self, period_length: int, timestamp: int=None, progress=None)-> EloMetrics:
+        # Ratings depend on the period length, so everything is recalculated
+        # The length is stored with the new ratings, a failed calculation keeps the old one
+        return EloCalculator.RecalculateArchivedElo(self, timestamp, progress=progress, period_length=period_length)
+
+    def SetPgnCompact(self, compact: bool)-> int:
+        # Stores PGN of new games packed or as text and converts the existing ones, returns number of converted games
+        # Text of the games does not change, so the search and position indexes are kept
+        with self.conn:
+            cur = self.conn.cursor()
+            cur.execute('''UPDATE CH_INFO SET pgn_compact = ?''', (int(compact),))
+            if compact:
+                cur.execute('''UPDATE CH_GAMES SET pgn_packed = pgn_pack(pgn), pgn = NULL WHERE pgn IS NOT NULL''')
+            else:
+                cur.execute('''UPDATE CH_GAMES SET pgn = pgn_unpack(pgn_packed), pgn_packed = NULL WHERE pgn_packed IS NOT NULL''')
+            return cur.rowcount
+
     # Players
     def AddPlayer(self, full_name: str, nick: str)-> int:
         cur = self.conn.cursor()
@@ -43,6 +155,18 @@ class ChessDataAPI:
         cur.execute(query, data)
         self.conn.commit()
 
+    def AddPlayersBatch(self, players)-> list:
+        # players - list of (full_name, nick), returns ids of the new players in the same order
+        ids = []
+        with self.WriteTransaction():
+            cur = self.conn.cursor()
+            for full_name, nick in players:
+                cur.execute('''
+                    INSERT INTO CH_PLAYERS (full_name, nick, elo) VALUES (?, ?, ?)
+                ''', (full_name, nick, int(1500)))
+                ids.append(cur.lastrowid)
+        return ids
+
     def UpdatePlayer(self, id: int, full_name: str, nick: str)-> int:
         cur = self.conn.cursor()
         data = (full_name, nick, id)
@@ -58,33 +182,72 @@ class ChessDataAPI:
     def GetPlayers(self, start: int=0, end: int=0)-> int:
         cur = self.conn.cursor()
         if start + end == 0:
-            res = cur.execute('''SELECT id, full_name, nick, elo FROM CH_PLAYERS ORDER BY id ASC''')
+            res = self.__Stream(cur, '''SELECT id, full_name, nick, elo FROM CH_PLAYERS ORDER BY id ASC''')
         else:
             data = (start, end)
-            res = cur.execute('''SELECT id, full_name, nick, elo FROM CH_PLAYERS WHERE id >= ? AND id <= ? ORDER BY id ASC''', data)
+            res = self.__Stream(cur, '''SELECT id, full_name, nick, elo FROM CH_PLAYERS WHERE id >= ? AND id <= ? ORDER BY id ASC''', data)
         
-        for r in res.fetchall():
+        for r in res:
             yield ChessPlayer(*r) 
 
+    def GetPlayersPage(self, after_id: int, limit: int):
+        # Keyset pagination ordered by id, players come with their stats
+        # after_id - id of the last player of the previous page, None for the first page
+        return self.SearchPlayersPage('', after_id, limit)
+
+    def SearchPlayersPage(self, text: str, after_id: int, limit: int):
+        # Players whose full name or nick contain words starting with the words of text, paged like GetPlayersPage
+        data = [after_id if after_id is not None else -1]
+        filter = ''
+        query = ChessDataAPI.__FtsQuery(text)
+        if query:
+            filter = 'AND P.id IN (SELECT rowid FROM CH_PLAYERS_FTS WHERE CH_PLAYERS_FTS MATCH ?)'
+            data.append(query)
+        data.append(limit)
+
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT 
+                P.id, P.full_name, P.nick, P.elo,
+                S.white_wins, S.white_draws, S.white_losses, 
+                S.black_wins, S.black_draws, S.black_losses,
+                S.rated_games, S.rated_points, S.opponent_rating_sum, S.peak_rating
+            FROM 
+                CH_PLAYERS AS P 
+            JOIN 
+                CH_PLAYER_STATS AS S ON S.player_id == P.id
+            WHERE 
+                P.id > ? {}
+            ORDER BY P.id ASC 
+            LIMIT ?
+        '''.format(filter), data)
+
+        return [ChessPlayer(*r[:4], stats=PlayerStats(*r[4:])) for r in res.fetchall()]
+
+    def RebuildPlayerStats(self):
+        # Recomputes all player stats from games and rating history
+        with self.conn:
+            cur = self.conn.cursor()
+            ChessDatabaseConnector.UpdatePlayerResultStats(cur)
+            ChessDatabaseConnector.UpdateRatedPlayerStats(cur)
+
     def GetPlayersDisplay(self):
         cur = self.conn.cursor()
-        res = cur.execute('''SELECT full_name, nick, id FROM CH_PLAYERS ORDER BY id ASC''')
-        for r in res.fetchall():
+        res = self.__Stream(cur, '''SELECT full_name, nick, id FROM CH_PLAYERS ORDER BY id ASC''')
+        for r in res:
             full_name, nick, id = r
             full_name = full_name.split(' ')
             yield ("{} '{}' {}".format(full_name[0], nick, ' '.join(full_name[1:])), id)
 
     def GetPlayersId(self):
         cur = self.conn.cursor()
-        res = cur.execute('''SELECT id FROM CH_PLAYERS''')
-        for r in res.fetchall():
+        res = self.__Stream(cur, '''SELECT id FROM CH_PLAYERS''')
+        for r in res:
             yield r[0]
 
     def GetPlayersElo(self):
         cur = self.conn.cursor()
-        res = cur.execute('''SELECT id, elo FROM CH_PLAYERS''')
-        for r in res.fetchall():
-            yield r
+        yield from self.__Stream(cur, '''SELECT id, elo FROM CH_PLAYERS''')
 
     def GetPlayersCount(self)-> int:
         cur = self.conn.cursor()
@@ -92,74 +255,120 @@ class ChessDataAPI:
         return res.fetchone()
 
     # Games
-    def AddGame(self, game: ChessGame)-> int:
-        cur = self.conn.cursor()
+    def AddGame(self, game: ChessGame, pgn_info: GamePgnInfo=None)-> int:
+        # PGN is parsed once, its positions are hashed from the parsed moves
+        # pgn_info - already parsed PGN of the game, e.g. by the edit dialog, parsed here if not set
+        if pgn_info is None:
+            pgn_info = PositionTimeline.ParsePgn(game.pgn)
+        positions = PositionHasher.GetPgnInfoPositions(pgn_info)
         data = (
             # game.id,
             game.player_1_id,
             game.player_2_id,
             game.date,
             game.result,
-            game.pgn
+            *ChessDataAPI.__PgnValues(game.pgn, self.GetInfo().pgn_compact)
         )
         
-        cur.execute('''
-            INSERT INTO 
-                CH_GAMES (
-                    id, 
-                    player_1_id, 
-                    player_2_id, 
-                    date, 
-                    result, 
-                    pgn
-                )
-            VALUES 
-                (
-                    (SELECT IFNULL(MAX(id), 0) + 1 FROM CH_GAMES), 
-                    ?,
-                    ?,
-                    ?,
-                    ?,
-                    ?
-                )
-        ''', data)
-        self.conn.commit()
+        with self.conn:
+            cur = self.conn.cursor()
+            cur.execute('''
+                INSERT INTO 
+                    CH_GAMES (
+                        id, 
+                        player_1_id, 
+                        player_2_id, 
+                        date, 
+                        result, 
+                        pgn,
+                        pgn_packed
+                    )
+                VALUES 
+                    (
+                        (SELECT IFNULL(MAX(id), 0) + 1 FROM CH_GAMES), 
+                        ?,
+                        ?,
+                        ?,
+                        ?,
+                        ?,
+                        ?
+                    )
+            ''', data)
+            game_id = cur.lastrowid
+            self.__StorePositions(cur, [(game_id, positions)])
+            self.__StorePgnInfo(cur, [(game_id, pgn_info)])
+
+    def AddGamesBatch(self, games, index_positions: bool=True, pgn_infos: list=None)-> int:
+        # Insert many games in a single transaction, ids are assigned by the database
+        # index_positions - if not set, PGN is not parsed, positions are left to PositionIndexer
+        # and the PGN info is stored when the game is opened
+        # pgn_infos - GamePgnInfo of the games if the caller already parsed them, they are not parsed again
+        if index_positions and pgn_infos is None:
+            pgn_infos = [PositionTimeline.ParsePgn(game.pgn) for game in games]
+        elif not index_positions:
+            pgn_infos = None
+        compact = self.GetInfo().pgn_compact
+        data = [
+            (
+                game.player_1_id,
+                game.player_2_id,
+                game.date,
+                game.result,
+                *ChessDataAPI.__PgnValues(game.pgn, compact)
+            ) for game in games
+        ]
+
+        with self.WriteTransaction():
+            cur = self.conn.cursor()
+            # New rowids follow the largest one, the transaction keeps them consecutive
+            first_id = cur.execute('''SELECT IFNULL(MAX(id), 0) + 1 FROM CH_GAMES''').fetchone()[0]
+            cur.executemany('''
+                INSERT INTO 
+                    CH_GAMES (
+                        player_1_id, 
+                        player_2_id, 
+                        date, 
+                        result, 
+                        pgn,
+                        pgn_packed
+                    )
+                VALUES 
+                    (?, ?, ?, ?, ?, ?)
+            ''', data)
+            if pgn_infos is not None:
+                game_ids = range(first_id, first_id + len(data))
+                self.__StorePositions(cur, zip(game_ids, map(PositionHasher.GetPgnInfoPositions, pgn_infos)))
+                self.__StorePgnInfo(cur, zip(game_ids, pgn_infos))
+        return len(data)
 
-    def GetGames(self, start_date: int=0, end_date: int=0)-> int:
+    def GetGames(self, start_date: int=0, end_date: int=0, with_pgn: bool=True):
+        # with_pgn - if not set, pgn of the games is None and is not read at all
         cur = self.conn.cursor()
-        if start_date + end_date== 0:
-            res = cur.execute('''
-                SELECT 
-                    id, 
-                    date,
-                    player_1_id,
-                    player_2_id,
-                    result, 
-                    pgn 
-                FROM 
-                    CH_GAMES
-                ORDER BY date DESC
-            ''')
-        else:
+        data = ()
+        filter = ''
+        if start_date + end_date != 0:
+            filter = 'WHERE date >= ? AND date <= ?'
             data = (start_date, end_date)
-            res = cur.execute('''
-                SELECT 
-                    id, 
-                    date,
-                    player_1_id,
-                    player_2_id,
-                    result, 
-                    pgn 
-                FROM 
-                    CH_GAMES 
-                WHERE 
-                    date >= ? AND date <= ? 
-                ORDER BY date DESC''', data)
-        
-        for r in res.fetchall():
+
+        res = self.__Stream(cur, '''
+            SELECT 
+                id, 
+                date,
+                player_1_id,
+                player_2_id,
+                result, 
+                {} 
+            FROM 
+                CH_GAMES
+            {}
+            ORDER BY date DESC
+        '''.format(ChessDataAPI.__PgnColumn(with_pgn), filter), data)
+
+        for r in res:
             yield ChessGame(*r) 
 
-    def GetRichGames(self, start_date: int=0, end_date: int=0):
+    def GetRichGames(self, start_date: int=0, end_date: int=0, with_pgn: bool=True):
+        # with_pgn - if not set, pgn of the games is None and is not read at all
         cur = self.conn.cursor()
         data = ()
         filter = ''
@@ -167,99 +376,186 @@ class ChessDataAPI:
             filter = 'WHERE date >= ? AND date <= ?'
             data = (start_date, end_date)
 
-        res = cur.execute('''
+        res = self.__Stream(cur, '''
             SELECT 
                 id,
-                player_1_id, player_1_full_name, player_1_nick, player_1_elo, player_1_change, 
-                player_2_id, player_2_full_name, player_2_nick, player_2_elo, player_2_change, 
+                player_1_id, player_1_full_name, player_1_nick, player_1_display_name, player_1_elo, player_1_change, 
+                player_2_id, player_2_full_name, player_2_nick, player_2_display_name, player_2_elo, player_2_change, 
                 date,
                 result,
-                pgn,
-                archived
+                {},
+                archived,
+                pgn_valid,
+                pgn_plies
             FROM 
                 CHV_GAMES_RICH
             {}
             ORDER BY date DESC
-        '''.format(filter), data)
+        '''.format(ChessDataAPI.__PgnColumn(with_pgn, 'CHV_GAMES_RICH'), filter), data)
 
-        for r in res.fetchall():
-            yield RichChessGame(
-                id=r[0], 
-
-                player_1_id=r[1], 
-                player_1_full_name=r[2],
-                player_1_nick=r[3],
-                player_1_elo=r[4],
-                player_1_change=r[5], 
-                
-                player_2_id=r[6], 
-                player_2_full_name=r[7],
-                player_2_nick=r[8],
-                player_2_elo=r[9], 
-                player_2_change=r[10], 
-                
-                date=r[11], 
-                result=r[12],
-                pgn=r[13],
-                archived=bool(r[14])
-            )
+        for r in res:
+            yield self.__CreateRichGame(r)
 
-    def GetAllArchivedGamesAscending(self):
-        elo_calc_date = self.GetInfo().elo_calc_date
+    def GetRichGamesPage(self, after_key: tuple, limit: int):
+        # Keyset pagination ordered by (date, id) descending, pgn of the games is None, see GetGamePgn()
+        # after_key - (date, id) of the last game of the previous page, None for the first page
+        return self.SearchGamesPage(GameFilter(), after_key, limit)
+
+    def SearchGamesPage(self, game_filter: GameFilter, after_key: tuple, limit: int):
+        # Games matching all conditions of the filter, paged like GetRichGamesPage
+        conditions = []
+        data = []
+        if after_key:
+            conditions.append('(date, id) < (?, ?)')
+            data += [after_key[0], after_key[1]]
+
+        if game_filter.player_id is not None:
+            conditions.append('(player_1_id == ? OR player_2_id == ?)')
+            data += [game_filter.player_id, game_filter.player_id]
+        if game_filter.date_from is not None:
+            conditions.append('date >= ?')
+            data.append(game_filter.date_from)
+        if game_filter.date_to is not None:
+            conditions.append('date <= ?')
+            data.append(game_filter.date_to)
+        if game_filter.result is not None:
+            # Games of one player are fewer than games with one result, unary + leaves the player indexes to sqlite
+            conditions.append('{}result == ?'.format('+' if game_filter.player_id is not None else ''))
+            data.append(game_filter.result)
+        if game_filter.archived is not None:
+            # Compared on date, so the date indexes are used
+            conditions.append('date {} (SELECT elo_calc_date FROM CH_INFO LIMIT 1)'.format('<=' if game_filter.archived else '>'))
+
+        query = ChessDataAPI.__FtsQuery(game_filter.text)
+        if query:
+            # Words are searched in PGN headers/comments and in names of both players
+            # Unary + keeps sqlite from looking the matches up by index when there are many of them
+            unindexed = '+' if self.__CountTextMatches(query) >= ChessDataAPI.SEARCH_SORT_LIMIT else ''
+            conditions.append('''(
+                {u}id IN (SELECT rowid FROM CH_GAMES_FTS WHERE CH_GAMES_FTS MATCH ?)
+                OR {u}player_1_id IN (SELECT rowid FROM CH_PLAYERS_FTS WHERE CH_PLAYERS_FTS MATCH ?)
+                OR {u}player_2_id IN (SELECT rowid FROM CH_PLAYERS_FTS WHERE CH_PLAYERS_FTS MATCH ?)
+            )'''.format(u=unindexed))
+            data += [query, query, query]
+        data.append(limit)
 
         cur = self.conn.cursor()
         res = cur.execute('''
+            SELECT 
+                id,
+                player_1_id, player_1_full_name, player_1_nick, player_1_display_name, player_1_elo, player_1_change, 
+                player_2_id, player_2_full_name, player_2_nick, player_2_display_name, player_2_elo, player_2_change, 
+                date,
+                result,
+                NULL AS pgn,
+                archived,
+                pgn_valid,
+                pgn_plies
+            FROM 
+                CHV_GAMES_RICH
+            {}
+            ORDER BY date DESC, id DESC
+            LIMIT ?
+        '''.format('WHERE ' + ' AND '.join(conditions) if conditions else ''), data)
+
+        return [self.__CreateRichGame(r) for r in res.fetchall()]
+
+    def GetAllArchivedGamesAscending(self, timestamp: int=None, with_pgn: bool=True):
+        # timestamp - archive bound, elo_calc_date if not set
+        # with_pgn - if not set, pgn of the games is None and is not read at all
+        elo_calc_date = self.GetInfo().elo_calc_date if timestamp is None else timestamp
+
+        cur = self.conn.cursor()
+        res = self.__Stream(cur, '''
             SELECT 
                 id, 
                 date,
                 player_1_id,
                 player_2_id,
                 result, 
-                pgn 
+                {} 
             FROM 
                 CH_GAMES
             WHERE
                 date <= ?
-            ORDER BY date ASC
-        ''', (elo_calc_date,))
-        for r in res.fetchall():
+            ORDER BY date ASC, id ASC
+        '''.format(ChessDataAPI.__PgnColumn(with_pgn)), (elo_calc_date,))
+        for r in res:
             yield ChessGame(*r)
 
-    def GetAllNotArchivedGamesAscending(self, timestamp):
+    def GetAllNotArchivedGamesAscending(self, timestamp, with_pgn: bool=True):
+        # with_pgn - if not set, pgn of the games is None and is not read at all
         elo_calc_date = self.GetInfo().elo_calc_date
 
         cur = self.conn.cursor()
-        res = cur.execute('''
+        res = self.__Stream(cur, '''
             SELECT 
                 id, 
                 date,
                 player_1_id,
                 player_2_id,
                 result, 
-                pgn 
+                {} 
             FROM 
                 CH_GAMES
             WHERE
                 date > ? AND date <= ? 
-            ORDER BY date ASC
-        ''', (elo_calc_date,timestamp))
-        for r in res.fetchall():
+            ORDER BY date ASC, id ASC
+        '''.format(ChessDataAPI.__PgnColumn(with_pgn)), (elo_calc_date,timestamp))
+        for r in res:
             yield ChessGame(*r)
 
-    def UpdateGame(self, game, recalc: bool):
-        self.__UpdateGame(game)
+    def GetArchivedGamesAscendingAfter(self, date: int, game_id: int, timestamp: int=None, with_pgn: bool=True):
+        # Archived games ordered after the (date, game_id) key
+        # timestamp - archive bound, elo_calc_date if not set
+        # with_pgn - if not set, pgn of the games is None and is not read at all
+        elo_calc_date = self.GetInfo().elo_calc_date if timestamp is None else timestamp
+
+        cur = self.conn.cursor()
+        res = self.__Stream(cur, '''
+            SELECT 
+                id, 
+                date,
+                player_1_id,
+                player_2_id,
+                result, 
+                {} 
+            FROM 
+                CH_GAMES
+            WHERE
+                (date, id) > (?, ?) AND date <= ?
+            ORDER BY date ASC, id ASC
+        '''.format(ChessDataAPI.__PgnColumn(with_pgn)), (date, game_id, elo_calc_date))
+        for r in res:
+            yield ChessGame(*r)
+
+    def UpdateGame(self, game, recalc: bool, pgn_info: GamePgnInfo=None):
+        # pgn_info - same as in AddGame
+        prev_date = self.__GetGameDate(game.id)
+        if pgn_info is None:
+            pgn_info = PositionTimeline.ParsePgn(game.pgn)
+        positions = PositionHasher.GetPgnInfoPositions(pgn_info)
+        with self.conn:
+            cur = self.conn.cursor()
+            self.__UpdateGame(cur, game, self.GetInfo().pgn_compact)
+            if prev_date != game.date:
+                cur.execute('''
+                    UPDATE CH_RATING_HISTORY SET date = ? WHERE date = ? AND game_id = ?
+                ''', (game.date, prev_date, game.id))
+            # Positions and PGN info are removed by a trigger when PGN changes, the same transaction stores the new ones
+            self.__StorePositions(cur, [(game.id, positions)])
+            self.__StorePgnInfo(cur, [(game.id, pgn_info)])
 
         if recalc:
-            self.RecalculateArchivedElo()
+            self.RecalculateArchivedEloFrom(min(prev_date, game.date))
 
-    def __UpdateGame(self, game: RichChessGame):
-        cur = self.conn.cursor()
+    def __UpdateGame(self, cur, game: RichChessGame, compact: bool):
         data = (
             game.player_1_id, 
             game.player_2_id, 
             game.date,
             game.result,
-            game.pgn,
+            *ChessDataAPI.__PgnValues(game.pgn, compact),
             game.id,
         )
 
@@ -271,24 +567,38 @@ class ChessDataAPI:
                 player_2_id = ?, 
                 date = ?,
                 result = ?,
-                pgn = ?
+                pgn = ?,
+                pgn_packed = ?
             WHERE 
                 id = ?
         ''', data)
-        self.conn.commit()
 
     def DeleteGame(self, id: int, recalc: bool)-> bool:
-        cur = self.conn.cursor()
-        cur.execute('''DELETE FROM CH_GAMES WHERE id = ?''', (id,))
-        self.conn.commit()
+        # False if there is no such game
+        date = self.__GetGameDate(id)
+        if date is None:
+            return False
+
+        with self.conn:
+            cur = self.conn.cursor()
+            players = cur.execute('''
+                SELECT player_id FROM CH_RATING_HISTORY WHERE date = ? AND game_id = ?
+            ''', (date, id)).fetchall()
+            cur.execute('''DELETE FROM CH_GAMES WHERE id = ?''', (id,))
+            cur.execute('''DELETE FROM CH_GAMES_DETAILS WHERE id = ?''', (id,))
+            cur.execute('''DELETE FROM CH_RATING_HISTORY WHERE date = ? AND game_id = ?''', (date, id))
+            ChessDatabaseConnector.UpdateRatedPlayerStats(cur, [r[0] for r in players])
 
         if recalc:
-            self.RecalculateArchivedElo()
+            self.RecalculateArchivedEloFrom(date)
+        return True
 
     # Game details
     def DeleteAllGameDetails(self):
         cur = self.conn.cursor()
         cur.execute('''DELETE FROM CH_GAMES_DETAILS''')
+        cur.execute('''DELETE FROM CH_RATING_HISTORY''')
+        ChessDatabaseConnector.UpdateRatedPlayerStats(cur)
         self.conn.commit()
 
     def AddGameDetails(self, gdetails: GameDetails):
@@ -315,13 +625,288 @@ class ChessDataAPI:
         ''', data)
         self.conn.commit()
 
+    def __AddGameDetailsBatch(self, cur, gdetails_list):
+        # Does not commit, caller owns the transaction
+        data = (
+            (
+                gd.id,
+                gd.player_1_elo,
+                gd.player_2_elo,
+                gd.player_1_change,
+                gd.player_2_change,
+            ) for gd in gdetails_list
+        )
+
+        cur.executemany('''
+            INSERT INTO 
+                CH_GAMES_DETAILS (
+                    id, 
+                    player_1_elo,
+                    player_2_elo,
+                    player_1_change,
+                    player_2_change
+                )
+            VALUES 
+                (?, ?, ?, ?, ?)
+        ''', data)
+
+    def StoreEloResults(self, gdetails_list, history, players_elo: dict, checkpoints, 
+        rebuild: bool=False, rebuild_after: tuple=None, timestamp: int=None, period_length: int=None
+    ):
+        # Write results of the ELO calculation in a single transaction
+        # history - (player_id, date, game_id, rating_before, delta) rows, see EloCalculator.CreateRatingHistory
+        # rebuild - if True, all game details, history and checkpoints are replaced by the new ones
+        # rebuild_after - (date, game_id) key, details, history and checkpoints after it are replaced
+        # timestamp - if set, elo_calc_date is moved to this value
+        # period_length - if set, elo_period_length the results were calculated with
+        # Players whose rated stats change, None for all
+        stats_players = None if rebuild else {id for id, _, _, _, _ in history}
+
+        with self.conn:
+            cur = self.conn.cursor()
+            if rebuild:
+                cur.execute('''DELETE FROM CH_GAMES_DETAILS''')
+                cur.execute('''DELETE FROM CH_RATING_HISTORY''')
+                cur.execute('''DELETE FROM CH_ELO_CHECKPOINTS''')
+            elif rebuild_after:
+                res = cur.execute('''
+                    SELECT DISTINCT player_id FROM CH_RATING_HISTORY WHERE (date, game_id) > (?, ?)
+                ''', rebuild_after)
+                stats_players.update(r[0] for r in res.fetchall())
+
+                cur.execute('''
+                    DELETE FROM 
+                        CH_GAMES_DETAILS 
+                    WHERE 
+                        id IN (SELECT id FROM CH_GAMES WHERE (date, id) > (?, ?))
+                ''', rebuild_after)
+                cur.execute('''DELETE FROM CH_RATING_HISTORY WHERE (date, game_id) > (?, ?)''', rebuild_after)
+                cur.execute('''DELETE FROM CH_ELO_CHECKPOINTS WHERE (date, game_id) > (?, ?)''', rebuild_after)
+
+            self.__AddGameDetailsBatch(cur, gdetails_list)
+            cur.executemany('''
+                INSERT INTO 
+                    CH_RATING_HISTORY (player_id, date, game_id, rating_before, delta) 
+                VALUES 
+                    (?, ?, ?, ?, ?)
+            ''', history)
+            self.__AddEloCheckpointsBatch(cur, checkpoints)
+            cur.executemany('''UPDATE CH_PLAYERS SET elo = ? WHERE id = ?''', 
+                ((elo, id) for id, elo in players_elo.items()))
+            ChessDatabaseConnector.UpdateRatedPlayerStats(cur, stats_players)
+
+            if timestamp is not None:
+                cur.execute('''UPDATE CH_INFO SET elo_calc_date = ?''', (timestamp,))
+            if period_length is not None:
+                cur.execute('''UPDATE CH_INFO SET elo_period_length = ?''', (period_length,))
+
+    # Rating history
+    def GetPlayerRatingHistory(self, player_id: int)-> list:
+        # All archived games of the player in the order they were rated
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT 
+                player_id, date, game_id, rating_before, delta 
+            FROM 
+                CH_RATING_HISTORY 
+            WHERE 
+                player_id = ? 
+            ORDER BY date ASC, game_id ASC
+        ''', (player_id,))
+        return [RatingHistoryEntry(*r) for r in res.fetchall()]
+
+    def GetPlayerRatingAt(self, player_id: int, date: int)-> int:
+        # Rating after all archived games of the player up to date.
+        # Sum of the changes is exact also with rating periods, where rating_before is the period start rating.
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT IFNULL(SUM(delta), 0) FROM CH_RATING_HISTORY WHERE player_id = ? AND date <= ?
+        ''', (player_id, date))
+        return EloCalculator.ELO_START + res.fetchone()[0]
+
+    # Position index
+    def GetUnindexedGames(self, after_id: int, limit: int)-> list:
+        # -> (id, pgn) of games without indexed positions, ordered by id
+        # after_id - id of the last game of the previous chunk, None for the first chunk
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT 
+                G.id, {} 
+            FROM 
+                CH_GAMES AS G
+            WHERE 
+                G.id > ? AND NOT EXISTS (SELECT 1 FROM CH_POSITIONS_GAMES AS I WHERE I.game_id == G.id)
+            ORDER BY G.id ASC
+            LIMIT ?
+        '''.format(ChessDatabaseConnector.PgnTextSql('G')), (after_id if after_id is not None else -1, limit))
+        return res.fetchall()
+
+    def GetUnindexedGamesCount(self)-> int:
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT COUNT(*) FROM CH_GAMES WHERE id NOT IN (SELECT game_id FROM CH_POSITIONS_GAMES)
+        ''')
+        return res.fetchone()[0]
+
+    def StoreGamePositions(self, game_positions)-> int:
+        # game_positions - list of (game_id, [(hash, ply), ...]), returns number of games stored
+        with self.conn:
+            return self.__StorePositions(self.conn.cursor(), game_positions)
+
+    def GetPositionGamesPage(self, position_hash: int, after_id: int, limit: int)-> list:
+        # -> (RichChessGame, ply) of games that reached the position, ply of its first occurrence
+        # Ordered by game id descending, so the page is read in the order of the primary key
+        # after_id - id of the last game of the previous page, None for the first page
+        # pgn of the games is None, see GetGamePgn()
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT 
+                R.id,
+                R.player_1_id, R.player_1_full_name, R.player_1_nick, R.player_1_display_name, R.player_1_elo, R.player_1_change, 
+                R.player_2_id, R.player_2_full_name, R.player_2_nick, R.player_2_display_name, R.player_2_elo, R.player_2_change, 
+                R.date,
+                R.result,
+                NULL AS pgn,
+                R.archived,
+                R.pgn_valid,
+                R.pgn_plies,
+                M.ply
+            FROM 
+                (
+                    SELECT game_id, MIN(ply) AS ply 
+                    FROM CH_POSITIONS 
+                    WHERE hash == ? AND game_id < ? 
+                    GROUP BY game_id 
+                    ORDER BY game_id DESC 
+                    LIMIT ?
+                ) AS M
+            JOIN 
+                CHV_GAMES_RICH AS R ON R.id == M.game_id
+            ORDER BY M.game_id DESC
+        ''', (position_hash, after_id if after_id is not None else 1 << 62, limit))
+        return [(self.__CreateRichGame(r), r[19]) for r in res.fetchall()]
+
+    def CountPositionGames(self, position_hash: int)-> int:
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT COUNT(DISTINCT game_id) FROM CH_POSITIONS WHERE hash == ?
+        ''', (position_hash,))
+        return res.fetchone()[0]
+
+    # PGN info
+    def GetGamePgn(self, game_id: int)-> str:
+        # PGN text of one game, pages of games are read without it
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT {} FROM CH_GAMES WHERE id == ?
+        '''.format(ChessDatabaseConnector.PgnTextSql('CH_GAMES')), (game_id,))
+        r = res.fetchone()
+        return r[0] if r else None
+
+    def GetGamePgnInfo(self, game_id: int)-> GamePgnInfo:
+        # None if the game was not parsed yet
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT valid, plies, fen, sans, moves, errors FROM CH_GAMES_PGN_INFO WHERE game_id == ?
+        ''', (game_id,))
+        r = res.fetchone()
+        if not r:
+            return None
+
+        return GamePgnInfo(
+            bool(r[0]), 
+            r[1], 
+            r[2], 
+            PgnCodec.Decode(r[3]).split(), 
+            PositionTimeline.UnpackMoves(r[4]), 
+            r[5].split('\n') if r[5] else []
+        )
+
+    def StoreGamePgnInfo(self, game_id: int, pgn: str, pgn_info: GamePgnInfo)-> bool:
+        # pgn_info - parsed from pgn, it is not stored if PGN of the game has changed meanwhile
+        with self.conn:
+            cur = self.conn.cursor()
+            res = cur.execute('''
+                SELECT {} IS ? FROM CH_GAMES WHERE id == ?
+            '''.format(ChessDatabaseConnector.PgnTextSql('CH_GAMES')), (pgn, game_id)).fetchone()
+            if not res or not res[0]:
+                return False
+
+            self.__StorePgnInfo(cur, [(game_id, pgn_info)])
+            return True
+
+    # Elo checkpoints
+    def GetEloCheckpointBefore(self, date: int):
+        # -> (date, game_id, {player_id: elo}) of the latest checkpoint strictly before date
+        # Ratings are read from the last full snapshot up to the checkpoint, later rows override earlier ones
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT 
+                date, game_id 
+            FROM 
+                CH_ELO_CHECKPOINTS 
+            WHERE 
+                date < ? 
+            ORDER BY date DESC, game_id DESC 
+            LIMIT 1
+        ''', (date,))
+        key = res.fetchone()
+        if not key:
+            return None
+
+        res = cur.execute('''
+            SELECT 
+                date, game_id 
+            FROM 
+                CH_ELO_CHECKPOINTS 
+            WHERE 
+                full_snapshot == 1 AND (date, game_id) <= (?, ?) 
+            ORDER BY date DESC, game_id DESC 
+            LIMIT 1
+        ''', key)
+        # Every replay starts with a full snapshot, so there is one unless the table was changed by hand
+        full_key = res.fetchone() or (-1 << 62, -1)
+
+        res = cur.execute('''
+            SELECT 
+                player_id, elo 
+            FROM 
+                CH_ELO_CHECKPOINTS 
+            WHERE 
+                (date, game_id) >= (?, ?) AND (date, game_id) <= (?, ?)
+            ORDER BY date ASC, game_id ASC
+        ''', (*full_key, *key))
+        return (key[0], key[1], {id: elo for id, elo in res.fetchall()})
+
+    def CountArchivedGamesSinceCheckpoint(self)-> int:
+        elo_calc_date = self.GetInfo().elo_calc_date
+
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT date, game_id FROM CH_ELO_CHECKPOINTS ORDER BY date DESC, game_id DESC LIMIT 1
+        ''')
+        key = res.fetchone()
+        if not key:
+            res = cur.execute('''SELECT COUNT(*) FROM CH_GAMES WHERE date <= ?''', (elo_calc_date,))
+        else:
+            res = cur.execute('''
+                SELECT COUNT(*) FROM CH_GAMES WHERE (date, id) > (?, ?) AND date <= ?
+            ''', (key[0], key[1], elo_calc_date))
+        return res.fetchone()[0]
+
     # Elo
-    def RecalculateEloIterate(self, timestamp):
-        EloCalculator.RecalculateEloIterate(self, timestamp)
+    # progress - optional callback(done, total), see EloCalculator.ReplayGames
+    # All of them return EloMetrics of the calculation
+    def RecalculateEloIterate(self, timestamp, progress=None)-> EloMetrics:
+        return EloCalculator.RecalculateEloIterate(self, timestamp, progress=progress)
 
-    def RecalculateArchivedElo(self):
+    def RecalculateArchivedElo(self, progress=None)-> EloMetrics:
         # Update ELO of the players
-        EloCalculator.RecalculateArchivedElo(self)
+        return EloCalculator.RecalculateArchivedElo(self, progress=progress)
+
+    def RecalculateArchivedEloFrom(self, date: int, progress=None)-> EloMetrics:
+        # Replay only games from the nearest checkpoint before date
+        return EloCalculator.RecalculateArchivedEloFrom(self, date, progress=progress)
 
     def UpdatePlayerElo(self, id: int, elo: int):
         cur = self.conn.cursor()
@@ -334,6 +919,141 @@ class ChessDataAPI:
     def __PlayerExists(self, name: str)-> bool:
         pass
 
+    def __AddEloCheckpointsBatch(self, cur, checkpoints):
+        # Does not commit, caller owns the transaction
+        # checkpoints - (date, game_id, {player_id: elo}, full snapshot) rows, see EloCalculator.ReplayGames
+        data = (
+            (date, game_id, player_id, elo, int(full))
+            for date, game_id, players_elo, full in checkpoints
+            for player_id, elo in players_elo.items()
+        )
+        cur.executemany('''
+            INSERT INTO 
+                CH_ELO_CHECKPOINTS (date, game_id, player_id, elo, full_snapshot) 
+            VALUES 
+                (?, ?, ?, ?, ?)
+        ''', data)
+
+    def __CreateRichGame(self, r)-> RichChessGame:
+        # Names repeat in every game of the player, interned strings are stored only once
+        return RichChessGame(
+            id=r[0], 
+
+            player_1_id=r[1], 
+            player_1_full_name=ChessDataAPI.__Intern(r[2]),
+            player_1_nick=ChessDataAPI.__Intern(r[3]),
+            player_1_display_name=ChessDataAPI.__Intern(r[4]),
+            player_1_elo=r[5],
+            player_1_change=r[6], 
+            
+            player_2_id=r[7], 
+            player_2_full_name=ChessDataAPI.__Intern(r[8]),
+            player_2_nick=ChessDataAPI.__Intern(r[9]),
+            player_2_display_name=ChessDataAPI.__Intern(r[10]),
+            player_2_elo=r[11], 
+            player_2_change=r[12], 
+            
+            date=r[13], 
+            result=r[14],
+            pgn=r[15],
+            archived=bool(r[16]),
+            pgn_valid=None if r[17] is None else bool(r[17]),
+            pgn_plies=r[18]
+        )
+
+    def __StorePositions(self, cur, game_positions)-> int:
+        # Positions of games that still exist and are not indexed yet, does not commit
+        # A game indexed meanwhile by another writer keeps its positions
+        stored = 0
+        for game_id, positions in game_positions:
+            cur.execute('''
+                INSERT OR IGNORE INTO CH_POSITIONS_GAMES (game_id) SELECT id FROM CH_GAMES WHERE id == ?
+            ''', (game_id,))
+            if cur.rowcount != 1:
+                continue
+
+            cur.executemany('''
+                INSERT OR IGNORE INTO CH_POSITIONS (hash, game_id, ply) VALUES (?, ?, ?)
+            ''', [(h, game_id, ply) for h, ply in positions])
+            stored += 1
+        return stored
+
+    def __StorePgnInfo(self, cur, game_infos):
+        # game_infos - (game_id, GamePgnInfo), does not commit
+        data = (
+            (
+                game_id,
+                int(info.valid),
+                info.plies,
+                info.fen,
+                PgnCodec.Encode(' '.join(info.sans)),
+                PositionTimeline.PackMoves(info.moves),
+                '\n'.join(' '.join(e.split()) for e in info.errors)
+            ) for game_id, info in game_infos
+        )
+        cur.executemany('''
+            INSERT OR REPLACE INTO 
+                CH_GAMES_PGN_INFO (game_id, valid, plies, fen, sans, moves, errors) 
+            VALUES 
+                (?, ?, ?, ?, ?, ?, ?)
+        ''', data)
+
+    def __Stream(self, cur, sql: str, params=()):
+        # Rows are fetched in batches of fetch_size, the cursor is closed also when the caller stops early
+        try:
+            res = cur.execute(sql, params)
+            while True:
+                rows = res.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cur.close()
+
+    def __CountTextMatches(self, query: str)-> int:
+        # -> number of games matching the text query, counted up to SEARCH_SORT_LIMIT
+        cur = self.conn.cursor()
+        res = cur.execute('''
+            SELECT COUNT(*) FROM (
+                SELECT rowid FROM CH_GAMES_FTS WHERE CH_GAMES_FTS MATCH ?
+                UNION ALL
+                SELECT id FROM CH_GAMES_RICH WHERE player_1_id IN (SELECT rowid FROM CH_PLAYERS_FTS WHERE CH_PLAYERS_FTS MATCH ?)
+                UNION ALL
+                SELECT id FROM CH_GAMES_RICH WHERE player_2_id IN (SELECT rowid FROM CH_PLAYERS_FTS WHERE CH_PLAYERS_FTS MATCH ?)
+                LIMIT ?
+            )
+        ''', (query, query, query, ChessDataAPI.SEARCH_SORT_LIMIT))
+        return res.fetchone()[0]
+
+    @staticmethod
+    def __FtsQuery(text: str)-> str:
+        # Every word of text becomes a quoted prefix term, so user input is never parsed as FTS5 syntax
+        words = text.split() if text else []
+        return ' '.join('"{}"*'.format(w.replace('"', '""')) for w in words)
+
+    @staticmethod
+    def __PgnColumn(with_pgn: bool, source: str='CH_GAMES')-> str:
+        # source - CH_GAMES or CHV_GAMES_RICH, or their alias
+        if not with_pgn:
+            return 'NULL'
+        return ChessDatabaseConnector.PgnTextSql(source)
+
+    @staticmethod
+    def __PgnValues(pgn: str, compact: bool)-> tuple:
+        # -> values of the (pgn, pgn_packed) columns
+        return (None, PgnCodec.Encode(pgn)) if compact else (pgn, None)
+
+    @staticmethod
+    def __Intern(value):
+        return sys.intern(value) if value is not None else None
+
+    def __GetGameDate(self, id: int)-> int:
+        # None if there is no such game
+        cur = self.conn.cursor()
+        res = cur.execute('''SELECT date FROM CH_GAMES WHERE id = ?''', (id,))
+        r = res.fetchone()
+        return r[0] if r else None
+
     def __CanDeletePlayer(self, id: str)-> bool:
         cur = self.conn.cursor()
         res = cur.execute('''SELECT COUNT(*) FROM CH_GAMES WHERE player_1_id == ? OR player_2_id == ?''', (id,id))
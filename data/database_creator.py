@@ -1,22 +1,843 @@
 from pathlib import Path
 import sqlite3
 
+from helpers.pgn_codec import PgnCodec
+from helpers.pgn_search import PgnSearchText
+
 
 class ChessDatabaseConnector:
+    # Version of the newest schema, stored in CH_INFO.schema_version
+    SCHEMA_VERSION = 11
+
+    # Seconds to wait for a lock held by another connection
+    BUSY_TIMEOUT = 30.0
+    # Page cache of one connection in KiB
+    CACHE_SIZE_KB = 65536
+    # Bytes of the database file mapped into memory
+    MMAP_SIZE = 268435456
+
     @staticmethod
     def GetOrCreateDatabase(db_path):
         db_file = Path(db_path)
         conn = None
 
         if db_file.is_file():
-            return sqlite3.connect(db_path)
+            conn = ChessDatabaseConnector.Connect(db_path)
+            ChessDatabaseConnector.MigrateDatabase(conn)
+            return conn
         else:
-            conn = sqlite3.connect(db_path)
+            conn = ChessDatabaseConnector.Connect(db_path)
             ChessDatabaseConnector.CreateDatabaseStructures(conn)
             return conn
 
+    @staticmethod
+    def Connect(db_path)-> sqlite3.Connection:
+        # Connection may be closed from another thread by ChessConnectionManager,
+        # but it is used only by the thread that opened it
+        conn = sqlite3.connect(db_path, timeout=ChessDatabaseConnector.BUSY_TIMEOUT, check_same_thread=False)
+
+        # WAL lets readers run while ELO recalculation writes
+        conn.execute('''PRAGMA journal_mode = WAL''')
+        conn.execute('''PRAGMA synchronous = NORMAL''')
+        conn.execute('''PRAGMA cache_size = -{}'''.format(ChessDatabaseConnector.CACHE_SIZE_KB))
+        conn.execute('''PRAGMA mmap_size = {}'''.format(ChessDatabaseConnector.MMAP_SIZE))
+        conn.execute('''PRAGMA temp_store = MEMORY''')
+
+        # Used by the triggers of CH_GAMES (search index, positions, PGN info), so games can be written
+        # only through connections made here, other sqlite tools can read the database but not change games
+        conn.create_function('pgn_search_text', 1, PgnSearchText.Extract, deterministic=True)
+        # Compact PGN storage, see PgnTextSql()
+        conn.create_function('pgn_pack', 1, PgnCodec.Encode, deterministic=True)
+        conn.create_function('pgn_unpack', 1, PgnCodec.Decode, deterministic=True)
+        return conn
+
     @staticmethod
     def CreateDatabaseStructures(conn: sqlite3.Connection):
+        # New database starts from the base schema and goes through all migrations
+        ChessDatabaseConnector.__CreateBaseStructures(conn)
+        ChessDatabaseConnector.MigrateDatabase(conn)
+
+    ########################
+    # Migrations
+    ########################
+    @staticmethod
+    def GetSchemaVersion(conn: sqlite3.Connection)-> int:
+        cur = conn.cursor()
+        columns = [r[1] for r in cur.execute('''PRAGMA table_info(CH_INFO)''').fetchall()]
+        if 'schema_version' not in columns:
+            return 0
+
+        res = cur.execute('''SELECT schema_version FROM CH_INFO LIMIT 1''')
+        return res.fetchone()[0]
+
+    @staticmethod
+    def MigrateDatabase(conn: sqlite3.Connection):
+        # Each migration upgrades schema from version (index) to version (index + 1)
+        migrations = [
+            ChessDatabaseConnector.__MigrateTypedSchema,
+            ChessDatabaseConnector.__MigrateEloCheckpoints,
+            ChessDatabaseConnector.__MigrateEloPeriod,
+            ChessDatabaseConnector.__MigrateRichGamesTable,
+            ChessDatabaseConnector.__MigrateRatingHistory,
+            ChessDatabaseConnector.__MigratePlayerStats,
+            ChessDatabaseConnector.__MigrateSearchIndex,
+            ChessDatabaseConnector.__MigratePositionIndex,
+            ChessDatabaseConnector.__MigrateCompactPgn,
+            ChessDatabaseConnector.__MigratePgnInfo,
+            ChessDatabaseConnector.__MigrateEloCheckpointDeltas,
+        ]
+
+        version = ChessDatabaseConnector.GetSchemaVersion(conn)
+        if version > ChessDatabaseConnector.SCHEMA_VERSION:
+            raise RuntimeError('Database schema version {} is newer than supported version {}.'.format(
+                version, ChessDatabaseConnector.SCHEMA_VERSION))
+
+        for migration in migrations[version:]:
+            try:
+                migration(conn)
+            except Exception:
+                conn.rollback()
+                raise
+
+    @staticmethod
+    def __MigrateTypedSchema(conn: sqlite3.Connection):
+        # Version 1: typed tables with primary keys and indexes
+        cur = conn.cursor()
+        cur.executescript('''
+            BEGIN;
+
+            DROP VIEW IF EXISTS CHV_GAMES_RICH;
+
+            ALTER TABLE CH_PLAYERS RENAME TO CH_PLAYERS_OLD;
+            ALTER TABLE CH_GAMES RENAME TO CH_GAMES_OLD;
+            ALTER TABLE CH_GAMES_DETAILS RENAME TO CH_GAMES_DETAILS_OLD;
+            ALTER TABLE CH_INFO RENAME TO CH_INFO_OLD;
+
+            CREATE TABLE CH_PLAYERS(
+                id INTEGER PRIMARY KEY,
+                full_name TEXT NOT NULL,
+                nick TEXT NOT NULL,
+                elo INTEGER NOT NULL
+            ) STRICT;
+
+            CREATE TABLE CH_GAMES(
+                id INTEGER PRIMARY KEY,
+                player_1_id INTEGER NOT NULL,
+                player_2_id INTEGER NOT NULL,
+                date INTEGER NOT NULL,
+                result INTEGER NOT NULL,
+                pgn TEXT
+            ) STRICT;
+
+            CREATE TABLE CH_GAMES_DETAILS(
+                id INTEGER PRIMARY KEY,
+                player_1_elo INTEGER,
+                player_2_elo INTEGER,
+                player_1_change INTEGER,
+                player_2_change INTEGER
+            ) STRICT;
+
+            CREATE TABLE CH_INFO(
+                elo_calc_date INTEGER NOT NULL,
+                schema_version INTEGER NOT NULL
+            ) STRICT;
+
+            INSERT INTO CH_PLAYERS
+                SELECT CAST(id AS INTEGER), full_name, nick, CAST(elo AS INTEGER) FROM CH_PLAYERS_OLD;
+            INSERT INTO CH_GAMES
+                SELECT
+                    CAST(id AS INTEGER),
+                    CAST(player_1_id AS INTEGER),
+                    CAST(player_2_id AS INTEGER),
+                    CAST(date AS INTEGER),
+                    CAST(result AS INTEGER),
+                    pgn
+                FROM CH_GAMES_OLD;
+            INSERT OR REPLACE INTO CH_GAMES_DETAILS
+                SELECT
+                    CAST(id AS INTEGER),
+                    CAST(player_1_elo AS INTEGER),
+                    CAST(player_2_elo AS INTEGER),
+                    CAST(player_1_change AS INTEGER),
+                    CAST(player_2_change AS INTEGER)
+                FROM CH_GAMES_DETAILS_OLD;
+            INSERT INTO CH_INFO
+                SELECT CAST(elo_calc_date AS INTEGER), 1 FROM CH_INFO_OLD LIMIT 1;
+            -- Same default row as a new database gets, if the old one had none
+            INSERT INTO CH_INFO
+                SELECT 0, 1 WHERE NOT EXISTS (SELECT 1 FROM CH_INFO);
+
+            DROP TABLE CH_PLAYERS_OLD;
+            DROP TABLE CH_GAMES_OLD;
+            DROP TABLE CH_GAMES_DETAILS_OLD;
+            DROP TABLE CH_INFO_OLD;
+
+            CREATE INDEX IX_GAMES_DATE ON CH_GAMES(date);
+            CREATE INDEX IX_GAMES_PLAYER_1 ON CH_GAMES(player_1_id);
+            CREATE INDEX IX_GAMES_PLAYER_2 ON CH_GAMES(player_2_id);
+        ''')
+
+        ChessDatabaseConnector.__CreateRichGamesView(cur)
+        cur.execute('''UPDATE CH_INFO SET schema_version = 1''')
+        conn.commit()
+
+    @staticmethod
+    def __MigrateEloCheckpoints(conn: sqlite3.Connection):
+        # Version 2: snapshots of players elo taken during ELO calculation
+        # (date, game_id) - key of the last game taken into account in the snapshot
+        cur = conn.cursor()
+        cur.executescript('''
+            BEGIN;
+
+            CREATE TABLE CH_ELO_CHECKPOINTS(
+                date INTEGER NOT NULL,
+                game_id INTEGER NOT NULL,
+                player_id INTEGER NOT NULL,
+                elo INTEGER NOT NULL,
+                PRIMARY KEY (date, game_id, player_id)
+            ) STRICT, WITHOUT ROWID;
+        ''')
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 2''')
+        conn.commit()
+
+    @staticmethod
+    def __MigrateEloPeriod(conn: sqlite3.Connection):
+        # Version 3: length of the rating period, 0 - every game is rated separately
+        cur = conn.cursor()
+        cur.executescript('''
+            BEGIN;
+
+            ALTER TABLE CH_INFO ADD COLUMN elo_period_length INTEGER NOT NULL DEFAULT 0;
+        ''')
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 3''')
+        conn.commit()
+
+    @staticmethod
+    def __MigrateRichGamesTable(conn: sqlite3.Connection):
+        # Version 4: denormalized games with player names and elo, kept current by triggers
+        cur = conn.cursor()
+        script = '''
+            BEGIN;
+
+            DROP VIEW IF EXISTS CHV_GAMES_RICH;
+
+            CREATE TABLE CH_GAMES_RICH(
+                id INTEGER PRIMARY KEY,
+
+                player_1_id INTEGER NOT NULL,
+                player_1_full_name TEXT,
+                player_1_nick TEXT,
+                player_1_display_name TEXT,
+                player_1_elo INTEGER,
+                player_1_change INTEGER,
+
+                player_2_id INTEGER NOT NULL,
+                player_2_full_name TEXT,
+                player_2_nick TEXT,
+                player_2_display_name TEXT,
+                player_2_elo INTEGER,
+                player_2_change INTEGER,
+
+                date INTEGER NOT NULL,
+                result INTEGER NOT NULL
+            ) STRICT;
+
+            CREATE INDEX IX_GAMES_RICH_DATE ON CH_GAMES_RICH(date);
+            CREATE INDEX IX_GAMES_RICH_PLAYER_1 ON CH_GAMES_RICH(player_1_id);
+            CREATE INDEX IX_GAMES_RICH_PLAYER_2 ON CH_GAMES_RICH(player_2_id);
+        '''
+
+        script += '''INSERT INTO CH_GAMES_RICH {};'''.format(ChessDatabaseConnector.__RichGameSelect('G'))
+
+        # Games
+        script += '''
+            CREATE TRIGGER TR_GAMES_RICH_INSERT AFTER INSERT ON CH_GAMES
+            BEGIN
+                INSERT OR REPLACE INTO CH_GAMES_RICH {new};
+            END;
+
+            CREATE TRIGGER TR_GAMES_RICH_UPDATE AFTER UPDATE ON CH_GAMES
+            BEGIN
+                DELETE FROM CH_GAMES_RICH WHERE id = OLD.id;
+                INSERT OR REPLACE INTO CH_GAMES_RICH {new};
+            END;
+
+            CREATE TRIGGER TR_GAMES_RICH_DELETE AFTER DELETE ON CH_GAMES
+            BEGIN
+                DELETE FROM CH_GAMES_RICH WHERE id = OLD.id;
+            END;
+        '''.format(new=ChessDatabaseConnector.__RichGameSelect('NEW'))
+
+        # Players
+        script += '''
+            CREATE TRIGGER TR_GAMES_RICH_PLAYER_UPDATE AFTER UPDATE OF full_name, nick ON CH_PLAYERS
+            BEGIN
+                UPDATE CH_GAMES_RICH 
+                SET player_1_full_name = NEW.full_name, player_1_nick = NEW.nick, player_1_display_name = {display}
+                WHERE player_1_id = NEW.id;
+
+                UPDATE CH_GAMES_RICH 
+                SET player_2_full_name = NEW.full_name, player_2_nick = NEW.nick, player_2_display_name = {display}
+                WHERE player_2_id = NEW.id;
+            END;
+        '''.format(display=ChessDatabaseConnector.__DisplayNameSql('NEW'))
+
+        # Game details
+        script += '''
+            CREATE TRIGGER TR_GAMES_RICH_DETAILS_INSERT AFTER INSERT ON CH_GAMES_DETAILS
+            BEGIN
+                UPDATE CH_GAMES_RICH 
+                SET 
+                    player_1_elo = NEW.player_1_elo, player_1_change = NEW.player_1_change,
+                    player_2_elo = NEW.player_2_elo, player_2_change = NEW.player_2_change
+                WHERE id = NEW.id;
+            END;
+
+            CREATE TRIGGER TR_GAMES_RICH_DETAILS_UPDATE AFTER UPDATE ON CH_GAMES_DETAILS
+            BEGIN
+                UPDATE CH_GAMES_RICH 
+                SET 
+                    player_1_elo = NEW.player_1_elo, player_1_change = NEW.player_1_change,
+                    player_2_elo = NEW.player_2_elo, player_2_change = NEW.player_2_change
+                WHERE id = NEW.id;
+            END;
+
+            CREATE TRIGGER TR_GAMES_RICH_DETAILS_DELETE AFTER DELETE ON CH_GAMES_DETAILS
+            BEGIN
+                UPDATE CH_GAMES_RICH 
+                SET player_1_elo = NULL, player_1_change = NULL, player_2_elo = NULL, player_2_change = NULL
+                WHERE id = OLD.id;
+            END;
+        '''
+
+        # Rich view keeps its columns, archived flag depends on CH_INFO so it is computed on read
+        script += ChessDatabaseConnector.__RichGamesViewSql()
+        cur.executescript(script)
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 4''')
+        conn.commit()
+
+    @staticmethod
+    def __MigrateRatingHistory(conn: sqlite3.Connection):
+        # Version 5: rating of every player before each archived game, filled from game details
+        cur = conn.cursor()
+        cur.executescript('''
+            BEGIN;
+
+            CREATE TABLE CH_RATING_HISTORY(
+                player_id INTEGER NOT NULL,
+                date INTEGER NOT NULL,
+                game_id INTEGER NOT NULL,
+                rating_before INTEGER NOT NULL,
+                delta INTEGER NOT NULL,
+                PRIMARY KEY(player_id, date, game_id)
+            ) STRICT, WITHOUT ROWID;
+
+            CREATE INDEX IX_RATING_HISTORY_DATE ON CH_RATING_HISTORY(date, game_id);
+
+            INSERT INTO CH_RATING_HISTORY 
+            SELECT G.player_1_id, G.date, G.id, D.player_1_elo, D.player_1_change 
+            FROM CH_GAMES_DETAILS AS D JOIN CH_GAMES AS G ON G.id == D.id;
+
+            INSERT INTO CH_RATING_HISTORY 
+            SELECT G.player_2_id, G.date, G.id, D.player_2_elo, D.player_2_change 
+            FROM CH_GAMES_DETAILS AS D JOIN CH_GAMES AS G ON G.id == D.id;
+        ''')
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 5''')
+        conn.commit()
+
+    @staticmethod
+    def __MigratePlayerStats(conn: sqlite3.Connection):
+        # Version 6: per player aggregates.
+        # Results by colour are kept current by triggers on CH_GAMES,
+        # rated columns are written by ELO recalculation, see ChessDataAPI.RebuildPlayerStats
+        cur = conn.cursor()
+        script = '''
+            BEGIN;
+
+            CREATE TABLE CH_PLAYER_STATS(
+                player_id INTEGER PRIMARY KEY,
+
+                white_wins INTEGER NOT NULL DEFAULT 0,
+                white_draws INTEGER NOT NULL DEFAULT 0,
+                white_losses INTEGER NOT NULL DEFAULT 0,
+                black_wins INTEGER NOT NULL DEFAULT 0,
+                black_draws INTEGER NOT NULL DEFAULT 0,
+                black_losses INTEGER NOT NULL DEFAULT 0,
+
+                rated_games INTEGER NOT NULL DEFAULT 0,
+                -- Points of rated games doubled, win = 2, draw = 1
+                rated_points INTEGER NOT NULL DEFAULT 0,
+                opponent_rating_sum INTEGER NOT NULL DEFAULT 0,
+                peak_rating INTEGER
+            ) STRICT;
+
+            INSERT INTO CH_PLAYER_STATS (player_id) SELECT id FROM CH_PLAYERS;
+
+            CREATE TRIGGER TR_PLAYER_STATS_PLAYER_INSERT AFTER INSERT ON CH_PLAYERS
+            BEGIN
+                INSERT INTO CH_PLAYER_STATS (player_id) VALUES (NEW.id);
+            END;
+
+            CREATE TRIGGER TR_PLAYER_STATS_PLAYER_DELETE AFTER DELETE ON CH_PLAYERS
+            BEGIN
+                DELETE FROM CH_PLAYER_STATS WHERE player_id = OLD.id;
+            END;
+
+            CREATE TRIGGER TR_PLAYER_STATS_INSERT AFTER INSERT ON CH_GAMES
+            BEGIN
+                {add_new}
+            END;
+
+            CREATE TRIGGER TR_PLAYER_STATS_UPDATE AFTER UPDATE OF player_1_id, player_2_id, result ON CH_GAMES
+            BEGIN
+                {sub_old}
+                {add_new}
+            END;
+
+            CREATE TRIGGER TR_PLAYER_STATS_DELETE AFTER DELETE ON CH_GAMES
+            BEGIN
+                {sub_old}
+            END;
+        '''.format(
+            add_new=ChessDatabaseConnector.__PlayerResultsSql('NEW', '+'),
+            sub_old=ChessDatabaseConnector.__PlayerResultsSql('OLD', '-')
+        )
+        cur.executescript(script)
+
+        # Results and rated columns of existing games
+        ChessDatabaseConnector.UpdatePlayerResultStats(cur)
+        ChessDatabaseConnector.UpdateRatedPlayerStats(cur)
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 6''')
+        conn.commit()
+
+    @staticmethod
+    def __MigrateSearchIndex(conn: sqlite3.Connection):
+        # Version 7: full-text search over players and PGN headers/comments, indexes of the game filters
+        # Games index is contentless, its text is computed by pgn_search_text() registered in Connect()
+        cur = conn.cursor()
+        cur.executescript('''
+            BEGIN;
+
+            CREATE VIRTUAL TABLE CH_PLAYERS_FTS USING fts5(
+                full_name, nick, 
+                content='CH_PLAYERS', content_rowid='id', 
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );
+
+            INSERT INTO CH_PLAYERS_FTS(CH_PLAYERS_FTS) VALUES ('rebuild');
+
+            CREATE TRIGGER TR_PLAYERS_FTS_INSERT AFTER INSERT ON CH_PLAYERS
+            BEGIN
+                INSERT INTO CH_PLAYERS_FTS(rowid, full_name, nick) VALUES (NEW.id, NEW.full_name, NEW.nick);
+            END;
+
+            CREATE TRIGGER TR_PLAYERS_FTS_UPDATE AFTER UPDATE OF full_name, nick ON CH_PLAYERS
+            BEGIN
+                INSERT INTO CH_PLAYERS_FTS(CH_PLAYERS_FTS, rowid, full_name, nick) VALUES ('delete', OLD.id, OLD.full_name, OLD.nick);
+                INSERT INTO CH_PLAYERS_FTS(rowid, full_name, nick) VALUES (NEW.id, NEW.full_name, NEW.nick);
+            END;
+
+            CREATE TRIGGER TR_PLAYERS_FTS_DELETE AFTER DELETE ON CH_PLAYERS
+            BEGIN
+                INSERT INTO CH_PLAYERS_FTS(CH_PLAYERS_FTS, rowid, full_name, nick) VALUES ('delete', OLD.id, OLD.full_name, OLD.nick);
+            END;
+
+            CREATE VIRTUAL TABLE CH_GAMES_FTS USING fts5(
+                text, 
+                content='', 
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            );
+
+            INSERT INTO CH_GAMES_FTS(rowid, text) SELECT id, pgn_search_text(pgn) FROM CH_GAMES;
+
+            CREATE TRIGGER TR_GAMES_FTS_INSERT AFTER INSERT ON CH_GAMES
+            BEGIN
+                INSERT INTO CH_GAMES_FTS(rowid, text) VALUES (NEW.id, pgn_search_text(NEW.pgn));
+            END;
+
+            CREATE TRIGGER TR_GAMES_FTS_UPDATE AFTER UPDATE OF id, pgn ON CH_GAMES
+            BEGIN
+                INSERT INTO CH_GAMES_FTS(CH_GAMES_FTS, rowid, text) VALUES ('delete', OLD.id, pgn_search_text(OLD.pgn));
+                INSERT INTO CH_GAMES_FTS(rowid, text) VALUES (NEW.id, pgn_search_text(NEW.pgn));
+            END;
+
+            CREATE TRIGGER TR_GAMES_FTS_DELETE AFTER DELETE ON CH_GAMES
+            BEGIN
+                INSERT INTO CH_GAMES_FTS(CH_GAMES_FTS, rowid, text) VALUES ('delete', OLD.id, pgn_search_text(OLD.pgn));
+            END;
+
+            -- Filtered pages are ordered by (date, id) like the unfiltered ones
+            DROP INDEX IX_GAMES_RICH_PLAYER_1;
+            DROP INDEX IX_GAMES_RICH_PLAYER_2;
+            CREATE INDEX IX_GAMES_RICH_PLAYER_1_DATE ON CH_GAMES_RICH(player_1_id, date);
+            CREATE INDEX IX_GAMES_RICH_PLAYER_2_DATE ON CH_GAMES_RICH(player_2_id, date);
+            CREATE INDEX IX_GAMES_RICH_RESULT_DATE ON CH_GAMES_RICH(result, date);
+        ''')
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 7''')
+        conn.commit()
+
+    @staticmethod
+    def __MigratePositionIndex(conn: sqlite3.Connection):
+        # Version 8: zobrist hashes of positions reached in games, see PositionHasher
+        # Positions are written by ChessDataAPI when games are added or updated and by PositionIndexer,
+        # triggers remove positions of deleted games and of games with changed PGN
+        cur = conn.cursor()
+        cur.executescript('''
+            BEGIN;
+
+            CREATE TABLE CH_POSITIONS(
+                hash INTEGER NOT NULL,
+                game_id INTEGER NOT NULL,
+                ply INTEGER NOT NULL,
+                PRIMARY KEY(hash, game_id, ply)
+            ) STRICT, WITHOUT ROWID;
+
+            CREATE INDEX IX_POSITIONS_GAME ON CH_POSITIONS(game_id);
+
+            -- Games whose positions are in CH_POSITIONS, also those without any readable move
+            CREATE TABLE CH_POSITIONS_GAMES(
+                game_id INTEGER PRIMARY KEY
+            ) STRICT;
+
+            CREATE TRIGGER TR_POSITIONS_UPDATE AFTER UPDATE OF id, pgn ON CH_GAMES
+            WHEN OLD.id != NEW.id OR OLD.pgn IS NOT NEW.pgn
+            BEGIN
+                DELETE FROM CH_POSITIONS WHERE game_id = OLD.id;
+                DELETE FROM CH_POSITIONS_GAMES WHERE game_id = OLD.id;
+            END;
+
+            CREATE TRIGGER TR_POSITIONS_DELETE AFTER DELETE ON CH_GAMES
+            BEGIN
+                DELETE FROM CH_POSITIONS WHERE game_id = OLD.id;
+                DELETE FROM CH_POSITIONS_GAMES WHERE game_id = OLD.id;
+            END;
+        ''')
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 8''')
+        conn.commit()
+
+    @staticmethod
+    def __MigrateCompactPgn(conn: sqlite3.Connection):
+        # Version 9: PGN optionally packed by PgnCodec into pgn_packed, pgn is NULL then
+        # CH_INFO.pgn_compact - new games are packed, games are stored as text until ChessDataAPI.SetPgnCompact()
+        # Triggers read the text of either column, the rich view has both columns and needs no function
+        cur = conn.cursor()
+        new_pgn = ChessDatabaseConnector.PgnTextSql('NEW')
+        old_pgn = ChessDatabaseConnector.PgnTextSql('OLD')
+        cur.executescript('''
+            BEGIN;
+
+            DROP VIEW CHV_GAMES_RICH;
+            DROP TRIGGER TR_GAMES_RICH_UPDATE;
+            DROP TRIGGER TR_GAMES_FTS_INSERT;
+            DROP TRIGGER TR_GAMES_FTS_UPDATE;
+            DROP TRIGGER TR_GAMES_FTS_DELETE;
+            DROP TRIGGER TR_POSITIONS_UPDATE;
+
+            ALTER TABLE CH_GAMES ADD COLUMN pgn_packed BLOB;
+            ALTER TABLE CH_INFO ADD COLUMN pgn_compact INTEGER NOT NULL DEFAULT 0;
+
+            -- PGN is not a part of the rich game row
+            CREATE TRIGGER TR_GAMES_RICH_UPDATE AFTER UPDATE OF id, player_1_id, player_2_id, date, result ON CH_GAMES
+            BEGIN
+                DELETE FROM CH_GAMES_RICH WHERE id = OLD.id;
+                INSERT OR REPLACE INTO CH_GAMES_RICH {rich};
+            END;
+
+            CREATE TRIGGER TR_GAMES_FTS_INSERT AFTER INSERT ON CH_GAMES
+            BEGIN
+                INSERT INTO CH_GAMES_FTS(rowid, text) VALUES (NEW.id, pgn_search_text({new}));
+            END;
+
+            -- Changing the storage of the same text keeps the search index and positions
+            CREATE TRIGGER TR_GAMES_FTS_UPDATE AFTER UPDATE OF id, pgn, pgn_packed ON CH_GAMES
+            WHEN OLD.id != NEW.id OR {old} IS NOT {new}
+            BEGIN
+                INSERT INTO CH_GAMES_FTS(CH_GAMES_FTS, rowid, text) VALUES ('delete', OLD.id, pgn_search_text({old}));
+                INSERT INTO CH_GAMES_FTS(rowid, text) VALUES (NEW.id, pgn_search_text({new}));
+            END;
+
+            CREATE TRIGGER TR_GAMES_FTS_DELETE AFTER DELETE ON CH_GAMES
+            BEGIN
+                INSERT INTO CH_GAMES_FTS(CH_GAMES_FTS, rowid, text) VALUES ('delete', OLD.id, pgn_search_text({old}));
+            END;
+
+            CREATE TRIGGER TR_POSITIONS_UPDATE AFTER UPDATE OF id, pgn, pgn_packed ON CH_GAMES
+            WHEN OLD.id != NEW.id OR {old} IS NOT {new}
+            BEGIN
+                DELETE FROM CH_POSITIONS WHERE game_id = OLD.id;
+                DELETE FROM CH_POSITIONS_GAMES WHERE game_id = OLD.id;
+            END;
+        '''.format(rich=ChessDatabaseConnector.__RichGameSelect('NEW'), new=new_pgn, old=old_pgn)
+            + ChessDatabaseConnector.__RichGamesViewSql(packed=True))
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 9''')
+        conn.commit()
+
+    @staticmethod
+    def __MigratePgnInfo(conn: sqlite3.Connection):
+        # Version 10: PGN parsed once when the game is saved, see GamePgnInfo
+        # Games saved before are parsed when they are opened, triggers remove info of changed and deleted games
+        cur = conn.cursor()
+        new_pgn = ChessDatabaseConnector.PgnTextSql('NEW')
+        old_pgn = ChessDatabaseConnector.PgnTextSql('OLD')
+        cur.executescript('''
+            BEGIN;
+
+            DROP VIEW CHV_GAMES_RICH;
+            DROP TRIGGER TR_POSITIONS_UPDATE;
+
+            CREATE TABLE CH_GAMES_PGN_INFO(
+                game_id INTEGER PRIMARY KEY,
+                valid INTEGER NOT NULL,
+                plies INTEGER NOT NULL,
+                fen TEXT,
+                -- SAN moves separated by spaces, packed by PgnCodec
+                sans BLOB NOT NULL,
+                -- PositionTimeline.PackMoves()
+                moves BLOB NOT NULL,
+                -- One error per line
+                errors TEXT NOT NULL
+            ) STRICT;
+
+            -- Positions and parsed PGN are both derived from the text, which is compared only once
+            CREATE TRIGGER TR_GAMES_PGN_UPDATE AFTER UPDATE OF id, pgn, pgn_packed ON CH_GAMES
+            WHEN OLD.id != NEW.id OR {old} IS NOT {new}
+            BEGIN
+                DELETE FROM CH_POSITIONS WHERE game_id = OLD.id;
+                DELETE FROM CH_POSITIONS_GAMES WHERE game_id = OLD.id;
+                DELETE FROM CH_GAMES_PGN_INFO WHERE game_id = OLD.id;
+            END;
+
+            CREATE TRIGGER TR_GAMES_PGN_INFO_DELETE AFTER DELETE ON CH_GAMES
+            BEGIN
+                DELETE FROM CH_GAMES_PGN_INFO WHERE game_id = OLD.id;
+            END;
+        '''.format(new=new_pgn, old=old_pgn)
+            + ChessDatabaseConnector.__RichGamesViewSql(packed=True, pgn_info=True))
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 10''')
+        conn.commit()
+
+    @staticmethod
+    def __MigrateEloCheckpointDeltas(conn: sqlite3.Connection):
+        # Version 11: checkpoints store only players who played since the previous checkpoint,
+        # full_snapshot - 1 if the checkpoint has all players, existing checkpoints have them
+        cur = conn.cursor()
+        cur.executescript('''
+            BEGIN;
+
+            ALTER TABLE CH_ELO_CHECKPOINTS ADD COLUMN full_snapshot INTEGER NOT NULL DEFAULT 1;
+        ''')
+
+        cur.execute('''UPDATE CH_INFO SET schema_version = 11''')
+        conn.commit()
+
+    @staticmethod
+    def UpdatePlayerResultStats(cur: sqlite3.Cursor):
+        # Recounts results by colour of all players from CH_GAMES, does not commit
+        cur.execute('''
+            UPDATE CH_PLAYER_STATS
+            SET white_wins = 0, white_draws = 0, white_losses = 0, black_wins = 0, black_draws = 0, black_losses = 0
+        ''')
+        cur.execute('''
+            UPDATE CH_PLAYER_STATS
+            SET
+                white_wins = W.wins, white_draws = W.draws, white_losses = W.losses
+            FROM
+                (SELECT player_1_id AS id, SUM(result == 0) AS wins, SUM(result == 2) AS draws, SUM(result == 1) AS losses
+                 FROM CH_GAMES GROUP BY player_1_id) AS W
+            WHERE
+                player_id == W.id
+        ''')
+        cur.execute('''
+            UPDATE CH_PLAYER_STATS
+            SET
+                black_wins = B.wins, black_draws = B.draws, black_losses = B.losses
+            FROM
+                (SELECT player_2_id AS id, SUM(result == 1) AS wins, SUM(result == 2) AS draws, SUM(result == 0) AS losses
+                 FROM CH_GAMES GROUP BY player_2_id) AS B
+            WHERE
+                player_id == B.id
+        ''')
+
+    @staticmethod
+    def UpdateRatedPlayerStats(cur: sqlite3.Cursor, player_ids=None):
+        # Recomputes rated columns of CH_PLAYER_STATS from the rating history, does not commit
+        # player_ids - players to update, all players if None
+        # Every rating a player had is either a rating before one of the games or the current one,
+        # also with rating periods where ratings before games are the period start ratings.
+        query = '''
+            UPDATE CH_PLAYER_STATS
+            SET
+                rated_games = S.games, 
+                rated_points = S.points, 
+                opponent_rating_sum = S.opponents, 
+                peak_rating = MAX(S.peak, P.elo)
+            FROM
+                (
+                    SELECT
+                        H.player_id,
+                        COUNT(*) AS games,
+                        SUM(CASE 
+                            WHEN G.result == 2 THEN 1 
+                            WHEN (G.result == 0) == (G.player_1_id == H.player_id) THEN 2 
+                            ELSE 0 
+                        END) AS points,
+                        SUM(CASE WHEN G.player_1_id == H.player_id THEN D.player_2_elo ELSE D.player_1_elo END) AS opponents,
+                        MAX(H.rating_before) AS peak
+                    FROM 
+                        CH_RATING_HISTORY AS H
+                    JOIN 
+                        CH_GAMES AS G ON G.id == H.game_id
+                    JOIN 
+                        CH_GAMES_DETAILS AS D ON D.id == H.game_id
+                    {where}
+                    GROUP BY H.player_id
+                ) AS S
+            JOIN
+                CH_PLAYERS AS P ON P.id == S.player_id
+            WHERE
+                CH_PLAYER_STATS.player_id == S.player_id
+        '''
+        reset = '''
+            UPDATE CH_PLAYER_STATS SET rated_games = 0, rated_points = 0, opponent_rating_sum = 0, peak_rating = NULL
+        '''
+
+        if player_ids is None:
+            cur.execute(reset)
+            cur.execute(query.format(where=''))
+        else:
+            player_ids = [(id,) for id in player_ids]
+            cur.executemany(reset + '''WHERE player_id == ?''', player_ids)
+            cur.executemany(query.format(where='''WHERE H.player_id == ?'''), player_ids)
+
+    @staticmethod
+    def __PlayerResultsSql(game: str, op: str)-> str:
+        # game - 'NEW' or 'OLD' inside of a trigger, op - '+' or '-'
+        return '''
+                UPDATE CH_PLAYER_STATS 
+                SET 
+                    white_wins = white_wins {op} ({g}.result == 0), 
+                    white_draws = white_draws {op} ({g}.result == 2), 
+                    white_losses = white_losses {op} ({g}.result == 1)
+                WHERE player_id = {g}.player_1_id;
+
+                UPDATE CH_PLAYER_STATS 
+                SET 
+                    black_wins = black_wins {op} ({g}.result == 1), 
+                    black_draws = black_draws {op} ({g}.result == 2), 
+                    black_losses = black_losses {op} ({g}.result == 0)
+                WHERE player_id = {g}.player_2_id;
+        '''.format(g=game, op=op)
+
+    @staticmethod
+    def __DisplayNameSql(player: str)-> str:
+        # Same as RichChessGame display name: "First 'nick' Rest of the name"
+        return '''(CASE 
+            WHEN IFNULL({p}.full_name, '') == '' OR IFNULL({p}.nick, '') == '' THEN '[Invalid]'
+            WHEN INSTR({p}.full_name, ' ') == 0 THEN {p}.full_name || ' \'\'' || {p}.nick || '\'\' '
+            ELSE 
+                SUBSTR({p}.full_name, 1, INSTR({p}.full_name, ' ') - 1) 
+                || ' \'\'' || {p}.nick || '\'\' ' 
+                || SUBSTR({p}.full_name, INSTR({p}.full_name, ' ') + 1)
+        END)'''.format(p=player)
+
+    @staticmethod
+    def __RichGameSelect(game: str)-> str:
+        # game - 'NEW' inside of a trigger, otherwise alias of CH_GAMES
+        source = '' if game == 'NEW' else 'CH_GAMES AS {} JOIN'.format(game)
+        return '''
+            SELECT 
+                {g}.id,
+                {g}.player_1_id, PL1.full_name, PL1.nick, {display_1}, D.player_1_elo, D.player_1_change,
+                {g}.player_2_id, PL2.full_name, PL2.nick, {display_2}, D.player_2_elo, D.player_2_change,
+                {g}.date,
+                {g}.result
+            FROM 
+                {source} CH_PLAYERS AS PL1 {on}
+            JOIN 
+                CH_PLAYERS AS PL2 ON PL2.id == {g}.player_2_id
+            LEFT JOIN 
+                CH_GAMES_DETAILS AS D ON D.id == {g}.id
+            {where}
+        '''.format(
+            g=game,
+            source=source,
+            on='' if game == 'NEW' else 'ON PL1.id == {}.player_1_id'.format(game),
+            where='WHERE PL1.id == NEW.player_1_id' if game == 'NEW' else '',
+            display_1=ChessDatabaseConnector.__DisplayNameSql('PL1'),
+            display_2=ChessDatabaseConnector.__DisplayNameSql('PL2')
+        )
+
+    @staticmethod
+    def PgnTextSql(game: str)-> str:
+        # PGN text of the game, stored either as text or packed by PgnCodec
+        # game - 'NEW' or 'OLD' inside of a trigger, otherwise name or alias of CH_GAMES or CHV_GAMES_RICH
+        return 'IFNULL({g}.pgn, pgn_unpack({g}.pgn_packed))'.format(g=game)
+
+    @staticmethod
+    def __RichGamesViewSql(packed: bool=False, pgn_info: bool=False)-> str:
+        # packed - with pgn_packed, PgnTextSql() of the view gives the text
+        # pgn_info - with pgn_valid and pgn_plies of CH_GAMES_PGN_INFO, NULL for games not parsed yet
+        return '''
+            CREATE VIEW
+                CHV_GAMES_RICH
+            AS
+            SELECT
+                R.id,
+
+                R.player_1_id,
+                R.player_1_full_name,
+                R.player_1_nick,
+                R.player_1_display_name,
+                R.player_1_elo,
+                R.player_1_change,
+
+                R.player_2_id,
+                R.player_2_full_name,
+                R.player_2_nick,
+                R.player_2_display_name,
+                R.player_2_elo,
+                R.player_2_change,
+
+                R.date,
+                R.result,
+                CH_GAMES.pgn AS pgn,{packed_column}
+                (CASE WHEN R.date <= INFO.elo_calc_date THEN 1 ELSE 0 END) as archived{info_columns}
+            FROM
+                CH_GAMES_RICH AS R
+            JOIN
+                CH_GAMES
+            ON
+                CH_GAMES.id == R.id
+            CROSS JOIN
+                (SELECT elo_calc_date FROM CH_INFO LIMIT 1) as INFO{info_join};
+        '''.format(
+            packed_column='''
+                CH_GAMES.pgn_packed AS pgn_packed,''' if packed else '',
+            info_columns=''',
+                P.valid AS pgn_valid,
+                P.plies AS pgn_plies''' if pgn_info else '',
+            info_join='''
+            LEFT JOIN
+                CH_GAMES_PGN_INFO AS P
+            ON
+                P.game_id == R.id''' if pgn_info else ''
+        )
+
+    ########################
+    # Structures
+    ########################
+    @staticmethod
+    def __CreateBaseStructures(conn: sqlite3.Connection):
+        # Schema version 0, upgraded by migrations
         cur = conn.cursor()
 
         # Players
@@ -35,50 +856,57 @@ class ChessDatabaseConnector:
             CREATE TABLE CH_GAMES_DETAILS(id, player_1_elo, player_2_elo, player_1_change, player_2_change)
         ''')
 
+        # Database data
+        # elo_calc_date - all games up to this date were calculated
+        cur.executescript('''
+            CREATE TABLE CH_INFO(elo_calc_date);
+            INSERT INTO CH_INFO VALUES (0);
+        ''')
+
         # Game rich view
+        ChessDatabaseConnector.__CreateRichGamesView(cur)
+
+        conn.commit()
+
+    @staticmethod
+    def __CreateRichGamesView(cur: sqlite3.Cursor):
         cur.execute('''
-            CREATE VIEW 
-                CHV_GAMES_RICH 
-            AS 
+            CREATE VIEW
+                CHV_GAMES_RICH
+            AS
             SELECT
-                CH_GAMES.id, 
+                CH_GAMES.id,
 
-                player_1_id, 
+                player_1_id,
                 PL1.full_name as player_1_full_name,
                 PL1.nick as player_1_nick,
                 player_1_elo,
-                player_1_change, 
+                player_1_change,
 
-                player_2_id, 
+                player_2_id,
                 PL2.full_name as player_2_full_name,
                 PL2.nick as player_2_nick,
-                player_2_elo, 
-                player_2_change, 
+                player_2_elo,
+                player_2_change,
 
-                date, 
+                date,
                 result,
                 pgn,
                 (CASE WHEN CH_GAMES.date <= INFO.elo_calc_date THEN 1 ELSE 0 END) as archived
             FROM
-                CH_GAMES,
-                (SELECT id, full_name, nick FROM CH_PLAYERS) AS PL1,
-                (SELECT id, full_name, nick FROM CH_PLAYERS) AS PL2,
+                CH_GAMES
+            JOIN
+                CH_PLAYERS AS PL1
+            ON
+                PL1.id == CH_GAMES.player_1_id
+            JOIN
+                CH_PLAYERS AS PL2
+            ON
+                PL2.id == CH_GAMES.player_2_id
+            CROSS JOIN
                 (SELECT elo_calc_date FROM CH_INFO LIMIT 1) as INFO
             LEFT JOIN
                 CH_GAMES_DETAILS
             ON
                 CH_GAMES_DETAILS.id == CH_GAMES.id
-            WHERE
-                PL1.id == CH_GAMES.player_1_id
-                AND PL2.id == CH_GAMES.player_2_id
         ''')
-
-
-        # Database data
-        # elo_calc_date - all games up to this date were calculated
-        cur.executescript('''
-            CREATE TABLE CH_INFO(elo_calc_date);
-            INSERT INTO CH_INFO VALUES (0);
-        ''')
-
-        conn.commit()
\ No newline at end of file
@@ -0,0 +1,204 @@
+import datetime
+import multiprocessing
+import re
+import time
+
+from data.chess_structs import ChessGame, GameResult
+from data.position_indexer import PositionIndexer
+from helpers.pgn_timeline import PositionTimeline
+
+
+class PgnImportStats:
+    def __init__(self):
+        self.games = 0
+        self.skipped = 0
+        self.players = 0
+        self.errors = []
+        self.elapsed = 0.0
+        # Date of the first imported game, ELO was recalculated from it if it was already archived
+        self.first_date = None
+        self.elo_recalculated = False
+
+    def GetGamesPerSecond(self)-> float:
+        if self.elapsed <= 0.0:
+            return 0.0
+        return self.games / self.elapsed
+
+    def GetSummary(self)-> str:
+        summary = 'Imported {} games ({} skipped, {} new players) in {:.1f}s, {:.0f} games/s'.format(
+            self.games, self.skipped, self.players, self.elapsed, self.GetGamesPerSecond())
+        if self.elo_recalculated:
+            summary += ', archived ELO recalculated from {}'.format(ChessGame.FormatDate(self.first_date))
+        return summary
+
+
+class PgnImporter:
+    ''' Streaming import of multi-game PGN files '''
+    # Number of games inserted in one transaction
+    CHUNK_SIZE = 5000
+    # Number of games sent to one parse process at once
+    PARSE_CHUNK_SIZE = 64
+
+    RESULT_MAP = {
+        '1-0': GameResult.WHITE_WIN,
+        '0-1': GameResult.BLACK_WIN,
+        '1/2-1/2': GameResult.DRAW,
+    }
+    HEADER_RE = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]', re.MULTILINE)
+    # '\"' and '\\' in a tag value stand for '"' and '\'
+    ESCAPE_RE = re.compile(r'\\(["\\])')
+
+    def __init__(self, api, processes: int=1, validate: bool=False):
+        # processes - number of processes of the parse stage, 1 - parse in this process
+        # validate - if True, every game is fully parsed in the parse stage and games with errors are skipped,
+        # positions of the valid ones are indexed from the parse result when they are stored
+        self.api = api
+        self.processes = processes
+        self.validate = validate
+
+    def Import(self, path: str, progress=None)-> PgnImportStats:
+        # progress - optional callback(imported games, skipped games)
+        stats = PgnImportStats()
+        start = time.perf_counter()
+
+        players = {p.full_name: p.id for p in self.api.GetPlayers()}
+        pool = multiprocessing.Pool(self.processes) if self.processes > 1 else None
+        try:
+            with open(path, encoding='utf-8-sig', errors='replace') as pgn_file:
+                texts = PgnImporter.SplitGames(pgn_file)
+                parse_args = ((text, self.validate) for text in texts)
+                if pool:
+                    parsed = pool.imap(PgnImporter.ParseGame, parse_args, PgnImporter.PARSE_CHUNK_SIZE)
+                else:
+                    parsed = map(PgnImporter.ParseGame, parse_args)
+
+                chunk = []
+                for game, error in parsed:
+                    if error:
+                        stats.skipped += 1
+                        stats.errors.append(error)
+                        continue
+
+                    chunk.append(game)
+                    if len(chunk) >= PgnImporter.CHUNK_SIZE:
+                        self.__StoreChunk(chunk, players, stats)
+                        chunk = []
+                        if progress:
+                            progress(stats.games, stats.skipped)
+
+                if chunk:
+                    self.__StoreChunk(chunk, players, stats)
+                    if progress:
+                        progress(stats.games, stats.skipped)
+        finally:
+            if pool:
+                pool.terminate()
+
+        # Games dated up to the ELO calculation date are archived at once, their ratings are replayed
+        if stats.first_date is not None and stats.first_date <= self.api.GetInfo().elo_calc_date:
+            self.api.RecalculateArchivedEloFrom(stats.first_date)
+            stats.elo_recalculated = True
+
+        # Positions of the imported games are hashed over a pool of the same size
+        PositionIndexer(self.api, self.processes).Backfill()
+
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+    @staticmethod
+    def SplitGames(lines):
+        # Yields text of every game, a header line after move text starts a new game
+        # Move text lines may start with '[' too, e.g. a wrapped '[%clk ...]' comment
+        buffer = []
+        in_moves = False
+        for line in lines:
+            stripped = line.strip()
+            is_header = PgnImporter.HEADER_RE.match(stripped) is not None
+            if is_header and in_moves:
+                yield ''.join(buffer)
+                buffer = []
+                in_moves = False
+            elif stripped and not is_header:
+                in_moves = True
+            buffer.append(line)
+
+        if any(l.strip() for l in buffer):
+            yield ''.join(buffer)
+
+    @staticmethod
+    def ParseGame(args):
+        # -> ((white, black, date, result, pgn, pgn info), None) or (None, error)
+        # pgn info - GamePgnInfo if validate is set, otherwise None
+        text, validate = args
+        headers = {key: PgnImporter.ESCAPE_RE.sub(r'\1', value) for key, value in PgnImporter.HEADER_RE.findall(text)}
+
+        white = PgnImporter.NormalizeName(headers.get('White', ''))
+        black = PgnImporter.NormalizeName(headers.get('Black', ''))
+        if not white or not black or white == black:
+            return (None, 'Invalid players: {} - {}'.format(headers.get('White'), headers.get('Black')))
+
+        result = PgnImporter.RESULT_MAP.get(headers.get('Result'))
+        if result is None:
+            return (None, 'Unfinished game: {} - {}'.format(white, black))
+
+        date = PgnImporter.ParseDate(headers.get('Date') or headers.get('UTCDate') or '')
+        if date is None:
+            return (None, 'Unknown date: {} - {}'.format(white, black))
+
+        pgn = text.strip()
+        pgn_info = None
+        if validate:
+            pgn_info = PositionTimeline.ParsePgn(pgn)
+            if not pgn_info.valid:
+                return (None, 'Invalid PGN: {} - {}: {}'.format(white, black, pgn_info.errors[0]))
+
+        return ((white, black, date, result, pgn, pgn_info), None)
+
+    @staticmethod
+    def NormalizeName(name: str)-> str:
+        # 'Last, First' -> 'First Last'
+        name = ' '.join(name.replace('?', '').split())
+        if ',' in name:
+            last, first = name.split(',', 1)
+            name = '{} {}'.format(first.strip(), last.strip()).strip()
+        return name
+
+    @staticmethod
+    def ParseDate(date: str):
+        # 'YYYY.MM.DD' -> seconds since epoch (UTC), unknown month or day is 1, unknown year is None
+        parts = (date.split('.') + ['??', '??'])[:3]
+        if not parts[0].isdigit():
+            return None
+        year = int(parts[0])
+        month = int(parts[1]) if parts[1].isdigit() else 1
+        day = int(parts[2]) if parts[2].isdigit() else 1
+        try:
+            return int(datetime.datetime(year, month, day, tzinfo=datetime.timezone.utc).timestamp())
+        except (ValueError, OverflowError):
+            return None
+
+    def __StoreChunk(self, chunk, players: dict, stats: PgnImportStats):
+        # New players and games of the chunk are stored in one transaction, a failure leaves none of them
+        new_names = list(dict.fromkeys(
+            name for white, black, *_ in chunk for name in (white, black) if name not in players
+        ))
+
+        # A failure ends the whole import, so the ids may be cached before the commit
+        with self.api.WriteTransaction():
+            if new_names:
+                new_ids = self.api.AddPlayersBatch([(name, name.split(' ')[-1]) for name in new_names])
+                players.update(zip(new_names, new_ids))
+
+            games = [
+                ChessGame(None, date, players[white], players[black], result, pgn)
+                for white, black, date, result, pgn, _ in chunk
+            ]
+            pgn_infos = [pgn_info for *_, pgn_info in chunk] if self.validate else None
+            added = self.api.AddGamesBatch(games, index_positions=self.validate, pgn_infos=pgn_infos)
+
+        stats.players += len(new_names)
+        stats.games += added
+
+        first_date = min(game.date for game in games)
+        if stats.first_date is None or first_date < stats.first_date:
+            stats.first_date = first_date
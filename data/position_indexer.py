@@ -0,0 +1,71 @@
+import multiprocessing
+import time
+
+from helpers.position_hash import PositionHasher
+
+
+class PositionIndexCancelled(Exception):
+    ''' Raised by progress callback to stop the backfill, chunks stored so far are kept '''
+    pass
+
+
+class PositionIndexStats:
+    def __init__(self):
+        self.games = 0
+        self.elapsed = 0.0
+
+    def GetGamesPerSecond(self)-> float:
+        if self.elapsed <= 0.0:
+            return 0.0
+        return self.games / self.elapsed
+
+    def GetSummary(self)-> str:
+        return 'Indexed positions of {} games in {:.1f}s, {:.0f} games/s'.format(
+            self.games, self.elapsed, self.GetGamesPerSecond())
+
+
+class PositionIndexer:
+    ''' Bulk backfill of the position index for games that are not indexed yet '''
+    # Number of games read and stored in one transaction
+    CHUNK_SIZE = 2000
+    # Number of games sent to one hashing process at once
+    PARSE_CHUNK_SIZE = 64
+
+    def __init__(self, api, processes: int=1):
+        # processes - number of hashing processes, 1 - hash in this process
+        self.api = api
+        self.processes = processes
+
+    def Backfill(self, progress=None)-> PositionIndexStats:
+        # progress - optional callback(indexed games, total games), may raise PositionIndexCancelled
+        stats = PositionIndexStats()
+        start = time.perf_counter()
+
+        total = self.api.GetUnindexedGamesCount()
+        pool = multiprocessing.Pool(self.processes) if self.processes > 1 else None
+        try:
+            # The pool hashes the next chunk while the previous one is stored
+            after_id = None
+            pending = None
+            while True:
+                games = self.api.GetUnindexedGames(after_id, PositionIndexer.CHUNK_SIZE)
+                hashed = None
+                if games:
+                    after_id = games[-1][0]
+                    if pool:
+                        hashed = pool.map_async(PositionHasher.GetGamePositions, games, PositionIndexer.PARSE_CHUNK_SIZE)
+
+                if pending is not None:
+                    stats.games += self.api.StoreGamePositions(pending.get() if pool else pending)
+                    if progress:
+                        progress(stats.games, total)
+
+                if not games:
+                    break
+                pending = hashed if pool else [PositionHasher.GetGamePositions(g) for g in games]
+        finally:
+            if pool:
+                pool.terminate()
+
+        stats.elapsed = time.perf_counter() - start
+        return stats
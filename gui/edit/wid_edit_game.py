@@ -1,8 +1,9 @@
 import copy
-from PySide6 import QtWidgets, QtCore
+from PySide6 import QtWidgets, QtCore, QtGui
 from data.data_manager import DataManager
-from data.chess_structs import ChessGame, ChessGamesDifference, GameResult
+from data.chess_structs import ChessGame, ChessGamesDifference, GamePgnInfo, GameResult
 from data.database_api import ChessDataAPI
+from gui.worker.pgn_worker import PgnValidationWorker
 from helpers.gui import ShowModalException, SpawnModal
 
 
@@ -14,14 +15,21 @@ class GameEditNamedWidgets:
         self.wid_black = None
         self.wid_result = None
         self.wid_pgn = None
+        self.wid_pgn_status = None
 
 class GameEditDialog(QtWidgets.QDialog):
+    # PGN is validated when the user stops typing
+    PGN_DELAY_MS = 500
+
     def __init__(self, db_manager: DataManager, parent: QtWidgets.QWidget, game: ChessGame = None):
         super().__init__(parent)
         self.db_manager = db_manager
         
         # Check if editing or creating new
         if game:
+            if game.pgn is None and game.id is not None:
+                # Games of the tables are read without PGN
+                game.pgn = db_manager.GetDatabaseAPI().GetGamePgn(game.id)
             self.prev_game = copy.copy(game)
             self.game = game
         else:
@@ -30,6 +38,10 @@ class GameEditDialog(QtWidgets.QDialog):
 
         self.cache_player_data = None
 
+        # (pgn, GamePgnInfo) of the last validated text, passed to the database on accept
+        self.pgn_info = None
+        self.pgn_worker = None
+
         # Layout
         self.main_layout = QtWidgets.QGridLayout(self)
         self.setWindowTitle("Edit game" if self.prev_game else "Create game")
@@ -66,8 +78,26 @@ class GameEditDialog(QtWidgets.QDialog):
         self.edits.wid_pgn.setAcceptRichText(False)
         self.main_layout.addWidget(self.edits.wid_pgn, 5, 2)
 
+        self.edits.wid_pgn_status = QtWidgets.QLabel(self)
+        self.edits.wid_pgn_status.setWordWrap(True)
+        self.edits.wid_pgn_status.setTextInteractionFlags(QtCore.Qt.TextSelectableByMouse)
+        self.main_layout.addWidget(self.edits.wid_pgn_status, 6, 2)
+
+        self.pgn_timer = QtCore.QTimer(self)
+        self.pgn_timer.setSingleShot(True)
+        self.pgn_timer.setInterval(GameEditDialog.PGN_DELAY_MS)
+        self.pgn_timer.timeout.connect(self.__ValidatePgn)
+
         self.__RefreshGameDataUI()
 
+        # Stored game opens with its stored PGN info, otherwise the text is validated at once
+        if self.prev_game and self.prev_game.id:
+            pgn_info = self.db_manager.GetDatabaseAPI().GetGamePgnInfo(self.prev_game.id)
+            if pgn_info:
+                self.pgn_info = (self.game.pgn, pgn_info)
+        self.__ValidatePgn()
+        self.edits.wid_pgn.textChanged.connect(self.pgn_timer.start)
+
         # Add buttons
         accept_btn = QtWidgets.QPushButton("Accept (A)", self)
         cancel_btn = QtWidgets.QPushButton("Cancel (C)", self)
@@ -75,8 +105,8 @@ class GameEditDialog(QtWidgets.QDialog):
         accept_btn.clicked.connect(self.__ApplyChanges)
         cancel_btn.clicked.connect(self.__CancelChanges)
 
-        self.main_layout.addWidget(accept_btn, 6, 1)
-        self.main_layout.addWidget(cancel_btn, 6, 2)
+        self.main_layout.addWidget(accept_btn, 7, 1)
+        self.main_layout.addWidget(cancel_btn, 7, 2)
 
     # Fill data with game data
     def __RefreshGameDataUI(self):
@@ -104,6 +134,9 @@ class GameEditDialog(QtWidgets.QDialog):
             SpawnModal('Error during applying changes to game', m, QtWidgets.QMessageBox.Ok)
             return
         
+        # Result of the background validation, if it is not ready the database parses PGN itself
+        pgn_info = self.pgn_info[1] if self.pgn_info and self.pgn_info[0] == self.game.pgn else None
+
         try:
             # Update / Create
             if self.prev_game:
@@ -111,9 +144,9 @@ class GameEditDialog(QtWidgets.QDialog):
                 if not cont:
                     return
 
-                self.db_manager.GetDatabaseAPI().UpdateGame(self.game, recalc)
+                self.db_manager.GetDatabaseAPI().UpdateGame(self.game, recalc, pgn_info)
             else:
-                self.db_manager.GetDatabaseAPI().AddGame(self.game)
+                self.db_manager.GetDatabaseAPI().AddGame(self.game, pgn_info)
         except Exception as e:
             ShowModalException()
 
@@ -121,6 +154,48 @@ class GameEditDialog(QtWidgets.QDialog):
 
     def __CancelChanges(self):
         self.close()
+
+    # PGN validation
+    def __ValidatePgn(self):
+        pgn = self.edits.wid_pgn.toPlainText()
+        if self.pgn_info and self.pgn_info[0] == pgn:
+            self.__ShowPgnInfo(*self.pgn_info)
+            return
+
+        self.__SetPgnStatus('Validating PGN...', False)
+        self.pgn_worker = PgnValidationWorker(pgn)
+        self.pgn_worker.signals.finished.connect(self.__OnPgnValidated)
+        self.pgn_worker.signals.failed.connect(self.__OnPgnValidationFailed)
+        QtCore.QThreadPool.globalInstance().start(self.pgn_worker)
+
+    def __OnPgnValidated(self, pgn: str, pgn_info: GamePgnInfo):
+        # Result of an older text is dropped, the current one is validated after it
+        if pgn != self.edits.wid_pgn.toPlainText():
+            return
+
+        self.pgn_info = (pgn, pgn_info)
+        self.__ShowPgnInfo(pgn, pgn_info)
+
+    def __OnPgnValidationFailed(self, pgn: str, error: str):
+        if pgn != self.edits.wid_pgn.toPlainText():
+            return
+        self.__SetPgnStatus('PGN validation failed:\n{}'.format(error), True)
+
+    def __ShowPgnInfo(self, pgn: str, pgn_info: GamePgnInfo):
+        if not pgn.strip():
+            self.__SetPgnStatus('No PGN.', False)
+        elif pgn_info.valid:
+            self.__SetPgnStatus('Valid PGN, {} plies.'.format(pgn_info.plies), False)
+        else:
+            errors = ''.join(['\n>> {}'.format(e) for e in pgn_info.errors])
+            self.__SetPgnStatus('Invalid PGN, {} plies read.{}'.format(pgn_info.plies, errors), True)
+
+    def __SetPgnStatus(self, text: str, error: bool):
+        palette = QtGui.QPalette()
+        if error:
+            palette.setColor(QtGui.QPalette.WindowText, QtGui.QColor(255, 100, 100, 255))
+        self.edits.wid_pgn_status.setPalette(palette)
+        self.edits.wid_pgn_status.setText(text)
     
     # Game finish editing handling
     def __CheckGameCorrectness(self):
@@ -0,0 +1,68 @@
+from PySide6 import QtWidgets, QtCore
+from data.data_manager import DataManager
+from data.chess_structs import ChessPlayer
+
+
+class PlayerHistoryDialog(QtWidgets.QDialog):
+    ''' Rating curve of one player, read from the rating history table '''
+
+    def __init__(self, db_manager: DataManager, parent: QtWidgets.QWidget, player: ChessPlayer):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.player = player
+
+        self.main_layout = QtWidgets.QVBoxLayout(self)
+        self.setWindowTitle("Rating history")
+        self.setLayout(self.main_layout)
+        self.setModal(True)
+
+        history = self.db_manager.GetDatabaseAPI().GetPlayerRatingHistory(player.id)
+
+        # Header
+        self.main_layout.addWidget(QtWidgets.QLabel(
+            "{} ({}), ELO: {}, rated games: {}".format(player.full_name, player.nick, player.elo, len(history)), self))
+
+        # Rating at date
+        date_widget = QtWidgets.QWidget(self)
+        date_layout = QtWidgets.QHBoxLayout(date_widget)
+        date_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.date_edit = QtWidgets.QDateTimeEdit(QtCore.QDateTime.currentDateTime(), date_widget)
+        self.date_edit.setCalendarPopup(True)
+        self.date_edit.dateTimeChanged.connect(self.__OnDateChanged)
+        self.rating_at_label = QtWidgets.QLabel(date_widget)
+
+        date_layout.addWidget(QtWidgets.QLabel("Rating at:", date_widget))
+        date_layout.addWidget(self.date_edit)
+        date_layout.addWidget(self.rating_at_label)
+        date_layout.addStretch()
+        self.main_layout.addWidget(date_widget)
+
+        # Datasheet, the latest game first
+        data_layout = [
+            ('Date', lambda h: h.GetFormatedDate()),
+            ('Game ID', lambda h: h.game_id),
+            ('Rating before', lambda h: h.rating_before),
+            ('Change', lambda h: '{:+d}'.format(h.delta)),
+            ('Rating after', lambda h: h.GetRatingAfter()),
+        ]
+        table_widget = QtWidgets.QTableWidget(len(history), len(data_layout), self)
+        table_widget.setHorizontalHeaderLabels([name for name, _ in data_layout])
+        table_widget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        table_widget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        for row, entry in enumerate(reversed(history)):
+            for column, (_, get_data) in enumerate(data_layout):
+                table_widget.setItem(row, column, QtWidgets.QTableWidgetItem(str(get_data(entry))))
+        self.main_layout.addWidget(table_widget)
+
+        # Buttons
+        close_btn = QtWidgets.QPushButton("Close (C)", self)
+        close_btn.clicked.connect(self.close)
+        self.main_layout.addWidget(close_btn)
+
+        self.resize(600, 500)
+        self.__OnDateChanged(self.date_edit.dateTime())
+
+    def __OnDateChanged(self, date: QtCore.QDateTime):
+        rating = self.db_manager.GetDatabaseAPI().GetPlayerRatingAt(self.player.id, date.toSecsSinceEpoch())
+        self.rating_at_label.setText(str(rating))
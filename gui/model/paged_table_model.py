@@ -0,0 +1,75 @@
+from PySide6 import QtCore
+
+
+class PagedTableModel(QtCore.QAbstractTableModel):
+    ''' Table model that fetches rows lazily in pages, using keyset pagination '''
+    PAGE_SIZE = 256
+
+    def __init__(self, columns, fetch_page, get_key, parent: QtCore.QObject = None):
+        # columns - list of (header, getter(row_object))
+        # fetch_page - callable(after_key, limit) returning list of row objects
+        # get_key - callable(row_object) returning key of the row for the next page
+        super().__init__(parent)
+        self.columns = columns
+        self.fetch_page = fetch_page
+        self.get_key = get_key
+
+        self.rows = []
+        self.last_key = None
+        self.exhausted = False
+
+    # Qt model interface
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.columns)
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        return str(self.columns[index.column()][1](self.rows[index.row()]))
+
+    def headerData(self, section: int, orientation, role=QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.columns[section][0]
+        return str(section + 1)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self.exhausted
+
+    def fetchMore(self, parent=QtCore.QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+
+        page = self.fetch_page(self.last_key, PagedTableModel.PAGE_SIZE)
+        if len(page) < PagedTableModel.PAGE_SIZE:
+            self.exhausted = True
+        if not page:
+            return
+
+        self.beginInsertRows(QtCore.QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows.extend(page)
+        self.last_key = self.get_key(page[-1])
+        self.endInsertRows()
+
+    # Helpers
+    def GetRowObject(self, row: int):
+        if 0 <= row < len(self.rows):
+            return self.rows[row]
+        return None
+
+    def Reset(self):
+        self.beginResetModel()
+        self.rows = []
+        self.last_key = None
+        self.exhausted = False
+        self.endResetModel()
@@ -4,30 +4,29 @@ from PySide6.QtSvg import QSvgRenderer
 from PySide6.QtSvgWidgets import QSvgWidget
 from data.data_manager import DataManager
 from functools import partial
-import chess.pgn
-import io
+from gui.pgn.wid_position_games import PositionGamesDialog
+from helpers.pgn_timeline import PositionTimeline
+from helpers.svg_cache import BoardSvgCache
 
 
 class GameDetailsDialog(QtWidgets.QDialog):
-    def __init__(self, db_manager: DataManager, parent: QtWidgets.QWidget, game: RichChessGame):
+    def __init__(self, db_manager: DataManager, parent: QtWidgets.QWidget, game: RichChessGame, ply: int=None):
+        # ply - position shown first, the first move by default
         super().__init__(parent)
         self.db_manager = db_manager
         self.game = game
 
-        self.pgn_game = None
-        self.curr_board = None
-        self.moves = []
+        self.timeline = None
         self.current_move = 0
         self.error = None
 
         try:
-            self.pgn_game = self.__LoadGamePGN()
-            self.curr_board = self.pgn_game.board()
+            self.timeline = self.__LoadGameTimeline()
         except ValueError as e:
             self.error = str(e)
 
-        if len(self.pgn_game.errors):
-            self.error = ''.join(['>> {}\n'.format(str(e)) for e in self.pgn_game.errors])
+        if self.timeline and len(self.timeline.errors):
+            self.error = ''.join(['>> {}\n'.format(e) for e in self.timeline.errors])
 
         # Layout
         self.main_layout = QtWidgets.QHBoxLayout(self)
@@ -39,7 +38,9 @@ class GameDetailsDialog(QtWidgets.QDialog):
         if not self.error:
             self.main_layout.addWidget(self.__CreateMoveWidget())
             self.main_layout.addWidget(self.__CreateSVGWidget())
-            self.__RefreshSVG(1)
+            self.__RefreshSVG(min(1, self.timeline.GetPlyCount()))
+            if ply and ply > 1:
+                self.__OnChangeMove(ply - self.current_move)
         else:
             self.main_layout.addWidget(self.__CreateErrorInfoWidget())
 
@@ -85,6 +86,10 @@ class GameDetailsDialog(QtWidgets.QDialog):
         layout.addWidget(self.__CreateMoveGridWidget())
         layout.addWidget(self.__CreateMoveArrows())
 
+        similar_btn = QtWidgets.QPushButton("Find similar positions (F)", widget)
+        similar_btn.clicked.connect(self.__OnFindSimilar)
+        layout.addWidget(similar_btn)
+
         widget.setLayout(layout)
         return widget
 
@@ -96,21 +101,12 @@ class GameDetailsDialog(QtWidgets.QDialog):
         self.table_widget.setHorizontalHeaderLabels(['White', 'Black'])
         self.table_widget.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
 
-        self.table_widget.setRowCount((len(list(self.pgn_game.mainline_moves())) + 1) / 2)
-
-        board = self.pgn_game.board()
-        row, col, cnt = 0, 0, 1
-        for m in self.pgn_game.mainline_moves():
-            self.moves.append(m)
+        self.table_widget.setRowCount((self.timeline.GetPlyCount() + 1) // 2)
 
-            san = board.san_and_push(m)
+        for i, san in enumerate(self.timeline.sans):
             new_item = QtWidgets.QTableWidgetItem(san)
-            new_item.setData(QtCore.Qt.UserRole, cnt)
-            self.table_widget.setItem(row, col, new_item)
-
-            row += col * 1
-            col = (col + 1) % 2
-            cnt += 1
+            new_item.setData(QtCore.Qt.UserRole, i + 1)
+            self.table_widget.setItem(i // 2, i % 2, new_item)
        
         #self.table_widget.itemClicked.connect(self.__OnMoveSelected)
         self.table_widget.itemSelectionChanged.connect(self.__OnMoveSelected)
@@ -143,13 +139,17 @@ class GameDetailsDialog(QtWidgets.QDialog):
         super(GameDetailsDialog, self).keyPressEvent(event)
 
     def __OnChangeMove(self, delta):
-        move_id = min(max(0, self.current_move + delta - 1), len(self.moves) - 1)
+        move_id = min(max(0, self.current_move + delta - 1), self.timeline.GetPlyCount() - 1)
         row, col = move_id // 2, move_id % 2
 
         self.table_widget.clearSelection()
         self.table_widget.setRangeSelected(QtWidgets.QTableWidgetSelectionRange(row, col, row, col), True) 
         self.__AutoScroll()
 
+    def __OnFindSimilar(self):
+        dialog = PositionGamesDialog(self.db_manager, self, self.timeline.GetBoard(self.current_move))
+        dialog.show()
+
     def __AutoScroll(self):
         items = self.table_widget.selectedItems()
         if len(items):
@@ -159,10 +159,16 @@ class GameDetailsDialog(QtWidgets.QDialog):
         self.svg_wid = QSvgWidget(self)
         return self.svg_wid
 
-    def __LoadGamePGN(self):
-        str_io = io.StringIO(self.game.pgn)
-        pgn_game = chess.pgn.read_game(str_io)
-        return pgn_game
+    def __LoadGameTimeline(self):
+        # PGN is parsed when the game is saved, a game saved before is parsed here once
+        api = self.db_manager.GetDatabaseAPI()
+        pgn_info = api.GetGamePgnInfo(self.game.id)
+        if pgn_info is None:
+            # Games of the tables are read without PGN
+            pgn = self.game.pgn if self.game.pgn is not None else api.GetGamePgn(self.game.id)
+            pgn_info = PositionTimeline.ParsePgn(pgn)
+            api.StoreGamePgnInfo(self.game.id, pgn, pgn_info)
+        return PositionTimeline.FromPgnInfo(pgn_info)
 
     def __OnMoveSelected(self):
         items = self.table_widget.selectedItems()
@@ -173,18 +179,15 @@ class GameDetailsDialog(QtWidgets.QDialog):
                 self.__RefreshSVG(move_id)
 
     def __RefreshSVG(self, move_id: int):
-        while move_id > self.current_move:
-            self.current_move += 1
-            self.curr_board.push(self.moves[self.current_move - 1])
-
-        while move_id < self.current_move:
-            self.current_move -= 1
-            self.curr_board.pop()
-
-        # Refresh
-        svg = chess.svg.board(self.curr_board)
-        svg = bytearray(svg, encoding='utf-8')
-        self.svg_wid.load(svg)
+        # Any position is a direct lookup in the timeline, rendered boards are cached
+        svg_cache = BoardSvgCache.GetInstance()
+        svg = svg_cache.Render(self.timeline.GetFen(move_id), lastmove=self.timeline.GetLastMove(move_id))
+        self.svg_wid.load(QtCore.QByteArray(svg))
 
         self.current_move = move_id
 
+        # Neighbouring moves are the most likely next ones
+        for ply in (move_id - 1, move_id + 1):
+            if 0 <= ply <= self.timeline.GetPlyCount():
+                svg_cache.Prefetch(self.timeline.GetFen(ply), lastmove=self.timeline.GetLastMove(ply))
+
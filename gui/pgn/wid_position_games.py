@@ -0,0 +1,83 @@
+import chess
+from PySide6 import QtWidgets, QtCore
+from data.data_manager import DataManager
+from data.chess_structs import GameSide
+from gui.model.paged_table_model import PagedTableModel
+from helpers.position_hash import PositionHasher
+
+
+class PositionGamesDialog(QtWidgets.QDialog):
+    ''' Games that reached the given position, read from the position index '''
+
+    def __init__(self, db_manager: DataManager, parent: QtWidgets.QWidget, board: chess.Board):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.position_hash = PositionHasher.HashBoard(board)
+
+        self.main_layout = QtWidgets.QVBoxLayout(self)
+        self.setWindowTitle("Games with this position")
+        self.setLayout(self.main_layout)
+        self.setModal(True)
+
+        api = self.db_manager.GetDatabaseAPI()
+
+        # Header
+        header = "{} games reached this position.".format(api.CountPositionGames(self.position_hash))
+        unindexed = api.GetUnindexedGamesCount()
+        if unindexed:
+            header += " {} games are not indexed yet, use Index positions in the games tab.".format(unindexed)
+        if board.ply() > PositionHasher.MAX_PLY:
+            header += " Only the first {} plies of every game are indexed.".format(PositionHasher.MAX_PLY)
+        header_label = QtWidgets.QLabel(header, self)
+        header_label.setWordWrap(True)
+        self.main_layout.addWidget(header_label)
+
+        # Datasheet of (game, ply), the latest added game first
+        data_layout = [
+            ('ID', lambda r: r[0].id),
+            ('Date', lambda r: r[0].GetFormatedDate()),
+            ('White', lambda r: r[0].GetPlayerDisplayName(GameSide.WHITE)),
+            ('Black', lambda r: r[0].GetPlayerDisplayName(GameSide.BLACK)),
+            ('Result', lambda r: r[0].GetFormatedResult()),
+            ('Ply', lambda r: r[1]),
+        ]
+        self.table_widget = QtWidgets.QTableView(self)
+        self.table_widget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table_widget.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.table_widget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table_model = PagedTableModel(
+            data_layout,
+            lambda after_id, limit: self.db_manager.GetDatabaseAPI().GetPositionGamesPage(self.position_hash, after_id, limit),
+            lambda r: r[0].id,
+            self
+        )
+        self.table_widget.setModel(self.table_model)
+        self.table_widget.doubleClicked.connect(self.__OnShowGame)
+        self.main_layout.addWidget(self.table_widget)
+
+        # Buttons
+        buttons_widget = QtWidgets.QWidget(self)
+        buttons_layout = QtWidgets.QHBoxLayout(buttons_widget)
+        buttons_layout.setContentsMargins(0, 0, 0, 0)
+
+        show_btn = QtWidgets.QPushButton("Show (S)", buttons_widget)
+        show_btn.clicked.connect(self.__OnShowGame)
+        close_btn = QtWidgets.QPushButton("Close (C)", buttons_widget)
+        close_btn.clicked.connect(self.close)
+
+        buttons_layout.addWidget(show_btn)
+        buttons_layout.addWidget(close_btn)
+        self.main_layout.addWidget(buttons_widget)
+
+        self.resize(700, 500)
+
+    def __OnShowGame(self):
+        rows = self.table_widget.selectionModel().selectedRows()
+        if not len(rows):
+            return
+
+        # Imported here, the details dialog opens this one
+        from gui.pgn.wid_details_game import GameDetailsDialog
+        game, ply = self.table_model.GetRowObject(rows[0].row())
+        dialog = GameDetailsDialog(self.db_manager, self, game, ply)
+        dialog.show()
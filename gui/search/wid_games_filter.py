@@ -0,0 +1,122 @@
+from PySide6 import QtWidgets, QtCore
+from data.data_manager import DataManager
+from data.chess_structs import GameFilter, GameResult
+
+
+class GamesFilterWidget(QtWidgets.QWidget):
+    ''' Filter bar of the games table, emits changed when the filter is modified '''
+    changed = QtCore.Signal()
+
+    # Text search waits for the user to stop typing
+    TEXT_DELAY_MS = 300
+
+    def __init__(self, db_manager: DataManager, parent: QtWidgets.QWidget):
+        super().__init__(parent)
+        self.db_manager = db_manager
+
+        self.main_layout = QtWidgets.QHBoxLayout(self)
+        self.main_layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(self.main_layout)
+
+        self.text_timer = QtCore.QTimer(self)
+        self.text_timer.setSingleShot(True)
+        self.text_timer.setInterval(GamesFilterWidget.TEXT_DELAY_MS)
+        self.text_timer.timeout.connect(self.changed.emit)
+
+        # Text
+        self.text_edit = QtWidgets.QLineEdit(self)
+        self.text_edit.setPlaceholderText('Search players, PGN headers and comments')
+        self.text_edit.setClearButtonEnabled(True)
+        self.text_edit.textChanged.connect(self.text_timer.start)
+
+        # Player
+        self.player_combo = QtWidgets.QComboBox(self)
+        self.RefreshPlayers()
+        self.player_combo.currentIndexChanged.connect(self.__OnChanged)
+
+        # Date range, bounds are used only when checked
+        self.from_chk = QtWidgets.QCheckBox("From", self)
+        self.from_edit = self.__CreateDateEdit(QtCore.QDateTime.currentDateTime().addMonths(-1))
+        self.to_chk = QtWidgets.QCheckBox("To", self)
+        self.to_edit = self.__CreateDateEdit(QtCore.QDateTime.currentDateTime())
+
+        for widget in (self.from_chk, self.to_chk):
+            widget.toggled.connect(self.__OnChanged)
+        for widget in (self.from_edit, self.to_edit):
+            widget.dateTimeChanged.connect(self.__OnDateChanged)
+
+        # Result
+        self.result_combo = QtWidgets.QComboBox(self)
+        self.result_combo.addItem('Any result', None)
+        for result_name, id in GameResult.getComboData():
+            self.result_combo.addItem(result_name, id)
+        self.result_combo.currentIndexChanged.connect(self.__OnChanged)
+
+        # Archived
+        self.archived_combo = QtWidgets.QComboBox(self)
+        self.archived_combo.addItem('Any', None)
+        self.archived_combo.addItem('Archived', True)
+        self.archived_combo.addItem('Not archived', False)
+        self.archived_combo.currentIndexChanged.connect(self.__OnChanged)
+
+        clear_btn = QtWidgets.QPushButton("Clear", self)
+        clear_btn.clicked.connect(self.Clear)
+
+        # Add all to widget
+        self.main_layout.addWidget(self.text_edit, 1)
+        self.main_layout.addWidget(self.player_combo)
+        self.main_layout.addWidget(self.from_chk)
+        self.main_layout.addWidget(self.from_edit)
+        self.main_layout.addWidget(self.to_chk)
+        self.main_layout.addWidget(self.to_edit)
+        self.main_layout.addWidget(self.result_combo)
+        self.main_layout.addWidget(self.archived_combo)
+        self.main_layout.addWidget(clear_btn)
+
+    def __CreateDateEdit(self, date: QtCore.QDateTime)-> QtWidgets.QDateTimeEdit:
+        date_edit = QtWidgets.QDateTimeEdit(date, self)
+        date_edit.setCalendarPopup(True)
+        return date_edit
+
+    def __OnChanged(self):
+        self.changed.emit()
+
+    def __OnDateChanged(self):
+        if self.from_chk.isChecked() or self.to_chk.isChecked():
+            self.changed.emit()
+
+    def RefreshPlayers(self):
+        # Keeps the selected player if it still exists
+        selected = self.player_combo.currentData()
+        self.player_combo.blockSignals(True)
+        self.player_combo.clear()
+        self.player_combo.addItem('Any player', None)
+        for display_name, id in self.db_manager.GetDatabaseAPI().GetPlayersDisplay():
+            self.player_combo.addItem(display_name, id)
+        self.player_combo.setCurrentIndex(max(0, self.player_combo.findData(selected)))
+        self.player_combo.blockSignals(False)
+
+    def Clear(self):
+        widgets = (self.text_edit, self.player_combo, self.from_chk, self.to_chk, self.result_combo, self.archived_combo)
+        for widget in widgets:
+            widget.blockSignals(True)
+        self.text_timer.stop()
+        self.text_edit.clear()
+        self.player_combo.setCurrentIndex(0)
+        self.from_chk.setChecked(False)
+        self.to_chk.setChecked(False)
+        self.result_combo.setCurrentIndex(0)
+        self.archived_combo.setCurrentIndex(0)
+        for widget in widgets:
+            widget.blockSignals(False)
+        self.changed.emit()
+
+    def GetFilter(self)-> GameFilter:
+        return GameFilter(
+            text=self.text_edit.text(),
+            player_id=self.player_combo.currentData(),
+            date_from=self.from_edit.dateTime().toSecsSinceEpoch() if self.from_chk.isChecked() else None,
+            date_to=self.to_edit.dateTime().toSecsSinceEpoch() if self.to_chk.isChecked() else None,
+            result=self.result_combo.currentData(),
+            archived=self.archived_combo.currentData()
+        )
@@ -0,0 +1,31 @@
+from PySide6 import QtWidgets, QtCore
+
+
+class PlayersFilterWidget(QtWidgets.QWidget):
+    ''' Filter bar of the players table, emits changed when the search text is modified '''
+    changed = QtCore.Signal()
+
+    # Search waits for the user to stop typing
+    TEXT_DELAY_MS = 300
+
+    def __init__(self, parent: QtWidgets.QWidget):
+        super().__init__(parent)
+
+        self.main_layout = QtWidgets.QHBoxLayout(self)
+        self.main_layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(self.main_layout)
+
+        self.text_timer = QtCore.QTimer(self)
+        self.text_timer.setSingleShot(True)
+        self.text_timer.setInterval(PlayersFilterWidget.TEXT_DELAY_MS)
+        self.text_timer.timeout.connect(self.changed.emit)
+
+        self.text_edit = QtWidgets.QLineEdit(self)
+        self.text_edit.setPlaceholderText('Search full name or nick')
+        self.text_edit.setClearButtonEnabled(True)
+        self.text_edit.textChanged.connect(self.text_timer.start)
+
+        self.main_layout.addWidget(self.text_edit)
+
+    def GetText(self)-> str:
+        return self.text_edit.text()
@@ -0,0 +1,131 @@
+from PySide6 import QtWidgets
+from data.data_manager import DataManager
+from helpers.gui import ShowModalException
+
+
+class DiagnosticsWidget(QtWidgets.QWidget):
+    ''' Widget that shows profiling statistics of the database API '''
+
+    def __init__(self, db_manager: DataManager, parent: QtWidgets.QWidget):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.entries = []
+
+        self.main_layout = QtWidgets.QHBoxLayout(self)
+        self.setLayout(self.main_layout)
+
+        # Datasheet and query plan of the selected statement
+        data_widget = QtWidgets.QWidget(self)
+        data_layout = QtWidgets.QVBoxLayout(data_widget)
+        data_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.data_layout = [
+            ('Kind', lambda e: e['kind']),
+            ('Name', lambda e: e['name']),
+            ('Calls', lambda e: e['calls']),
+            ('Rows', lambda e: e['rows']),
+            ('Total ms', lambda e: '{:.1f}'.format(e['total_ms'])),
+            ('Mean ms', lambda e: '{:.2f}'.format(e['mean_ms'])),
+            ('p50 ms', lambda e: '{:.2f}'.format(e['p50_ms'])),
+            ('p95 ms', lambda e: '{:.2f}'.format(e['p95_ms'])),
+            ('p99 ms', lambda e: '{:.2f}'.format(e['p99_ms'])),
+            ('Max ms', lambda e: '{:.2f}'.format(e['max_ms'])),
+        ]
+        self.table_widget = QtWidgets.QTableWidget(self)
+        self.table_widget.setColumnCount(len(self.data_layout))
+        self.table_widget.setHorizontalHeaderLabels([name for name, _ in self.data_layout])
+        self.table_widget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table_widget.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.table_widget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table_widget.itemSelectionChanged.connect(self.__OnSelectionChanged)
+
+        self.plan_widget = QtWidgets.QPlainTextEdit(self)
+        self.plan_widget.setReadOnly(True)
+        self.plan_widget.setMaximumHeight(120)
+
+        data_layout.addWidget(self.table_widget)
+        data_layout.addWidget(self.plan_widget)
+        self.main_layout.addWidget(data_widget)
+
+        # Buttons
+        self.buttons_widget = self.__CreateButtonsWidget()
+        self.main_layout.addWidget(self.buttons_widget)
+
+    def __CreateButtonsWidget(self):
+        buttons_widget = QtWidgets.QWidget(self)
+        buttons_layout = QtWidgets.QVBoxLayout(buttons_widget)
+        buttons_widget.setLayout(buttons_layout)
+
+        # Top
+        self.enable_chk = QtWidgets.QCheckBox("Profiling", buttons_widget)
+        self.plans_chk = QtWidgets.QCheckBox("Query plans", buttons_widget)
+        self.plans_chk.setToolTip('Capture EXPLAIN QUERY PLAN of slow statements')
+        refresh_btn = QtWidgets.QPushButton("Refresh (R)", buttons_widget)
+        reset_btn = QtWidgets.QPushButton("Reset", buttons_widget)
+
+        self.enable_chk.toggled.connect(self.__OnProfilingToggled)
+        self.plans_chk.toggled.connect(self.__OnProfilingToggled)
+        refresh_btn.clicked.connect(self.RefreshData)
+        reset_btn.clicked.connect(self.__OnReset)
+
+        # Bottom
+        export_btn = QtWidgets.QPushButton("Export JSON", buttons_widget)
+
+        export_btn.clicked.connect(self.__OnExport)
+
+        # Add all to widget
+        buttons_layout.addWidget(self.enable_chk)
+        buttons_layout.addWidget(self.plans_chk)
+        buttons_layout.addWidget(refresh_btn)
+        buttons_layout.addWidget(reset_btn)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(export_btn)
+
+        return buttons_widget
+
+    def __OnProfilingToggled(self):
+        api = self.db_manager.GetDatabaseAPI()
+        if self.enable_chk.isChecked():
+            api.EnableProfiling(self.plans_chk.isChecked())
+        else:
+            api.DisableProfiling()
+        self.RefreshData()
+
+    def __OnReset(self):
+        profiler = self.db_manager.GetDatabaseAPI().GetProfiler()
+        if profiler:
+            profiler.Reset()
+        self.RefreshData()
+
+    def __OnExport(self):
+        profiler = self.db_manager.GetDatabaseAPI().GetProfiler()
+        if not profiler:
+            return
+
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, 'Export diagnostics', 'diagnostics.json', 'JSON files (*.json)')
+        if not path:
+            return
+
+        try:
+            profiler.ExportJson(path)
+        except Exception:
+            ShowModalException()
+
+    def __OnSelectionChanged(self):
+        rows = self.table_widget.selectionModel().selectedRows()
+        if not rows:
+            self.plan_widget.clear()
+            return
+
+        entry = self.entries[rows[0].row()]
+        self.plan_widget.setPlainText('\n'.join([entry['name']] + entry['plan']))
+
+    def RefreshData(self):
+        profiler = self.db_manager.GetDatabaseAPI().GetProfiler()
+        self.entries = profiler.GetEntries() if profiler else []
+
+        self.table_widget.setRowCount(len(self.entries))
+        for row, entry in enumerate(self.entries):
+            for column, (_, getter) in enumerate(self.data_layout):
+                self.table_widget.setItem(row, column, QtWidgets.QTableWidgetItem(str(getter(entry))))
+        self.plan_widget.clear()
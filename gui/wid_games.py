@@ -1,10 +1,15 @@
-from PySide6 import QtWidgets
-import PySide6.QtNfc
+from PySide6 import QtWidgets, QtCore
 from data.data_manager import DataManager
 from data.chess_structs import ChessGame, GameSide
 from gui.edit.wid_edit_game import GameEditDialog
 from gui.edit.wid_edit_player import PlayerEditDialog
 from gui.pgn.wid_details_game import GameDetailsDialog
+from gui.model.paged_table_model import PagedTableModel
+from gui.search.wid_games_filter import GamesFilterWidget
+from gui.worker.elo_worker import EloWorker
+from gui.worker.import_worker import ImportWorker
+from gui.worker.position_worker import PositionWorker
+from gui.wid_status_msg import EMsgColor, GlobalStatusMessage
 from helpers.gui import ShowModalException, SpawnModal
 
 
@@ -16,11 +21,24 @@ class GamesWidget(QtWidgets.QWidget):
         # Change behaviour
         self.selected_player = None
 
+        # Background ELO calculation, import and position indexing
+        self.elo_worker = None
+        self.import_worker = None
+        self.position_worker = None
+
         self.main_layout = QtWidgets.QHBoxLayout(self)
         self.setLayout(self.main_layout)
 
+        # Filter bar above the datasheet
+        data_widget = QtWidgets.QWidget(self)
+        data_layout = QtWidgets.QVBoxLayout(data_widget)
+        data_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.filter_widget = GamesFilterWidget(self.db_manager, data_widget)
+        self.filter_widget.changed.connect(self.__RefreshTableData)
+
         # Datasheet
-        self.table_widget = QtWidgets.QTableWidget(self)
+        self.table_widget = QtWidgets.QTableView(self)
         self.table_widget.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)
         #self.table_widget.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.table_widget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
@@ -36,13 +54,22 @@ class GamesWidget(QtWidgets.QWidget):
             ('ELO', lambda rg: rg.GetPlayerEloChange(GameSide.BLACK)),
             ('Result', lambda rg: rg.GetFormatedResult()),
             ('Archived', lambda rg: rg.archived),
+            ('PGN', lambda rg: rg.GetFormatedPgnStatus()),
         ]
         #headers = list(ChessGame.getHeaders())
-        self.table_widget.setColumnCount(len(self.data_layout))
-        self.table_widget.setHorizontalHeaderLabels([t[0] for t in self.data_layout])
+        self.table_model = PagedTableModel(
+            self.data_layout,
+            lambda after_key, limit: self.db_manager.GetDatabaseAPI().SearchGamesPage(self.game_filter, after_key, limit),
+            lambda rg: (rg.date, rg.id),
+            self
+        )
+        self.table_widget.setModel(self.table_model)
 
+        self.game_filter = None
         self.__RefreshTableData()
-        self.main_layout.addWidget(self.table_widget)
+        data_layout.addWidget(self.filter_widget)
+        data_layout.addWidget(self.table_widget)
+        self.main_layout.addWidget(data_widget)
         
         # Buttons
         self.buttons_widget = self.__CreateButtonsWidget()
@@ -54,13 +81,18 @@ class GamesWidget(QtWidgets.QWidget):
         buttons_widget.setLayout(buttons_layout)
 
         # Top
-        new_btn = QtWidgets.QPushButton("New (N)", buttons_widget)
-        delete_btn = QtWidgets.QPushButton("Delete (D)", buttons_widget)
-        edit_btn = QtWidgets.QPushButton("Edit (E)", buttons_widget)
+        self.new_btn = QtWidgets.QPushButton("New (N)", buttons_widget)
+        self.delete_btn = QtWidgets.QPushButton("Delete (D)", buttons_widget)
+        self.edit_btn = QtWidgets.QPushButton("Edit (E)", buttons_widget)
+
+        self.import_btn = QtWidgets.QPushButton("Import PGN (I)", buttons_widget)
+        self.index_btn = QtWidgets.QPushButton("Index positions (P)", buttons_widget)
 
-        new_btn.clicked.connect(self.__OnNewGame)
-        delete_btn.clicked.connect(self.__OnDeleteGame)
-        edit_btn.clicked.connect(self.__OnEditGame)
+        self.new_btn.clicked.connect(self.__OnNewGame)
+        self.import_btn.clicked.connect(self.__OnImportPGN)
+        self.index_btn.clicked.connect(self.__OnIndexPositions)
+        self.delete_btn.clicked.connect(self.__OnDeleteGame)
+        self.edit_btn.clicked.connect(self.__OnEditGame)
 
         # Middle
         show_btn = QtWidgets.QPushButton("Show (S)", buttons_widget)
@@ -70,32 +102,39 @@ class GamesWidget(QtWidgets.QWidget):
         update_btn = QtWidgets.QPushButton("Update ELO (R)", buttons_widget)
         recalculate_btn = QtWidgets.QPushButton("Recalc ELO (T)", buttons_widget)
         
+        self.cancel_elo_btn = QtWidgets.QPushButton("Cancel ELO (C)", buttons_widget)
+        self.cancel_elo_btn.setEnabled(False)
+
         update_btn.clicked.connect(self.__OnUpdateElo)
         recalculate_btn.clicked.connect(self.__OnRecalculateElo)
+        self.cancel_elo_btn.clicked.connect(self.__OnCancelElo)
 
         # Add all to widget
-        buttons_layout.addWidget(new_btn)
-        buttons_layout.addWidget(delete_btn)
-        buttons_layout.addWidget(edit_btn)
+        buttons_layout.addWidget(self.new_btn)
+        buttons_layout.addWidget(self.delete_btn)
+        buttons_layout.addWidget(self.edit_btn)
+        buttons_layout.addWidget(self.import_btn)
+        buttons_layout.addWidget(self.index_btn)
         buttons_layout.addStretch()
         buttons_layout.addWidget(show_btn)
         buttons_layout.addStretch()
         buttons_layout.addWidget(update_btn)
         buttons_layout.addWidget(recalculate_btn)
+        buttons_layout.addWidget(self.cancel_elo_btn)
 
         return buttons_widget
     
     def __GetSelectedGameID(self):
-        rows = self.table_widget.selectionModel().selectedRows()
-        if len(rows):
-            return int(rows[0].data())
+        game = self.__GetSelectedGameData()
+        if game:
+            return game.id
         else:
             return None
     
     def __GetSelectedGameData(self):
-        id = self.__GetSelectedGameID()
-        if id:
-            return next((p for p in self.rich_game_data if p.id == id), None)
+        rows = self.table_widget.selectionModel().selectedRows()
+        if len(rows):
+            return self.table_model.GetRowObject(rows[0].row())
         
     def __OnShowGame(self):
         game = self.__GetSelectedGameData()
@@ -108,18 +147,151 @@ class GamesWidget(QtWidgets.QWidget):
 
     def __OnUpdateElo(self):
         selected_game = self.__GetSelectedGameData()
-        self.db_manager.GetDatabaseAPI().RecalculateEloIterate(selected_game.date)
-        self.__RefreshTableData()
+        if not selected_game:
+            SpawnModal('Error', 'Cannot find currently selected game.', QtWidgets.QMessageBox.Ok)
+            return
+
+        self.__StartEloWorker(EloWorker.MODE_ITERATE, selected_game.date)
 
     def __OnRecalculateElo(self):
-        self.db_manager.GetDatabaseAPI().RecalculateArchivedElo()
+        self.__StartEloWorker(EloWorker.MODE_RECALCULATE)
+
+    def __OnCancelElo(self):
+        if self.elo_worker:
+            self.elo_worker.Cancel()
+            GlobalStatusMessage.SetMessage('Cancelling ELO calculation...', EMsgColor.WARNING)
+
+    # Background ELO calculation
+    def __StartEloWorker(self, mode: int, timestamp: int = None):
+        if self.elo_worker:
+            SpawnModal('Error', 'ELO calculation is already running.', QtWidgets.QMessageBox.Ok)
+            return
+        if self.import_worker:
+            # Import recalculates archived ELO itself when it adds archived games
+            SpawnModal('Error', 'Import of PGN is running, try again when it is finished.', QtWidgets.QMessageBox.Ok)
+            return
+
+        self.elo_worker = EloWorker(self.db_manager.GetDatabaseAPI(), mode, timestamp)
+        self.elo_worker.signals.progress.connect(self.__OnEloProgress)
+        self.elo_worker.signals.finished.connect(self.__OnEloFinished)
+        self.elo_worker.signals.cancelled.connect(self.__OnEloCancelled)
+        self.elo_worker.signals.failed.connect(self.__OnEloFailed)
+
+        self.cancel_elo_btn.setEnabled(True)
+        self.__SetGameActionsEnabled(False)
+        GlobalStatusMessage.SetMessage('ELO calculation started...')
+        QtCore.QThreadPool.globalInstance().start(self.elo_worker)
+
+    def __StopEloWorker(self):
+        self.elo_worker = None
+        self.cancel_elo_btn.setEnabled(False)
+        self.__SetGameActionsEnabled(True)
+
+    def __SetGameActionsEnabled(self, enabled: bool):
+        # Changes of games recalculate archived ELO, they wait until the ELO and import workers
+        # are done with the same tables, enabled is ignored while any of them runs
+        enabled = enabled and self.elo_worker is None and self.import_worker is None
+        self.new_btn.setEnabled(enabled)
+        self.delete_btn.setEnabled(enabled)
+        self.edit_btn.setEnabled(enabled)
+        self.import_btn.setEnabled(enabled)
+
+    def __OnEloProgress(self, done: int, total: int):
+        GlobalStatusMessage.SetMessage('Calculating ELO... {}/{} games'.format(done, total))
+
+    def __OnEloFinished(self, summary: str):
+        self.__StopEloWorker()
+        GlobalStatusMessage.SetMessage('ELO calculation finished: {}'.format(summary))
         self.__RefreshTableData()
 
+    def __OnEloCancelled(self):
+        self.__StopEloWorker()
+        GlobalStatusMessage.SetMessage('ELO calculation cancelled, nothing was changed.', EMsgColor.WARNING)
+
+    def __OnEloFailed(self, trace: str):
+        self.__StopEloWorker()
+        GlobalStatusMessage.SetMessage('ELO calculation failed.', EMsgColor.ERROR)
+        SpawnModal("Error", "Error occured: {}".format(trace), QtWidgets.QMessageBox.Ok)
+
     def __OnNewGame(self):
         dialog = GameEditDialog(self.db_manager, self)
         if dialog.exec_():
             self.__RefreshTableData()
 
+    def __OnImportPGN(self):
+        if self.import_worker:
+            SpawnModal('Error', 'Import is already running.', QtWidgets.QMessageBox.Ok)
+            return
+        if self.elo_worker:
+            # Import recalculates archived ELO, it cannot run together with another calculation
+            SpawnModal('Error', 'ELO calculation is running, try again when it is finished.', QtWidgets.QMessageBox.Ok)
+            return
+
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self, 'Import PGN', '', 'PGN files (*.pgn);;All files (*)')
+        if not path:
+            return
+
+        self.import_worker = ImportWorker(self.db_manager.GetDatabaseAPI(), path)
+        self.import_worker.signals.progress.connect(self.__OnImportProgress)
+        self.import_worker.signals.finished.connect(self.__OnImportFinished)
+        self.import_worker.signals.failed.connect(self.__OnImportFailed)
+
+        self.__SetGameActionsEnabled(False)
+        GlobalStatusMessage.SetMessage('Import of PGN started...')
+        QtCore.QThreadPool.globalInstance().start(self.import_worker)
+
+    def __OnImportProgress(self, imported: int, skipped: int):
+        GlobalStatusMessage.SetMessage('Importing PGN... {} games imported, {} skipped'.format(imported, skipped))
+
+    def __OnImportFinished(self, summary: str):
+        self.import_worker = None
+        self.__SetGameActionsEnabled(True)
+        GlobalStatusMessage.SetMessage(summary)
+        self.__RefreshTableData()
+
+    def __OnImportFailed(self, trace: str):
+        self.import_worker = None
+        self.__SetGameActionsEnabled(True)
+        GlobalStatusMessage.SetMessage('Import of PGN failed.', EMsgColor.ERROR)
+        SpawnModal("Error", "Error occured: {}".format(trace), QtWidgets.QMessageBox.Ok)
+
+    def __OnIndexPositions(self):
+        # The same button cancels the running indexing, games indexed so far are kept
+        if self.position_worker:
+            self.position_worker.Cancel()
+            GlobalStatusMessage.SetMessage('Cancelling position indexing...', EMsgColor.WARNING)
+            return
+
+        self.position_worker = PositionWorker(self.db_manager.GetDatabaseAPI())
+        self.position_worker.signals.progress.connect(self.__OnIndexProgress)
+        self.position_worker.signals.finished.connect(self.__OnIndexFinished)
+        self.position_worker.signals.cancelled.connect(self.__OnIndexCancelled)
+        self.position_worker.signals.failed.connect(self.__OnIndexFailed)
+
+        self.index_btn.setText("Cancel indexing (P)")
+        GlobalStatusMessage.SetMessage('Position indexing started...')
+        QtCore.QThreadPool.globalInstance().start(self.position_worker)
+
+    def __StopPositionWorker(self):
+        self.position_worker = None
+        self.index_btn.setText("Index positions (P)")
+
+    def __OnIndexProgress(self, done: int, total: int):
+        GlobalStatusMessage.SetMessage('Indexing positions... {}/{} games'.format(done, total))
+
+    def __OnIndexFinished(self, summary: str):
+        self.__StopPositionWorker()
+        GlobalStatusMessage.SetMessage(summary)
+
+    def __OnIndexCancelled(self):
+        self.__StopPositionWorker()
+        GlobalStatusMessage.SetMessage('Position indexing cancelled, indexed games are kept.', EMsgColor.WARNING)
+
+    def __OnIndexFailed(self, trace: str):
+        self.__StopPositionWorker()
+        GlobalStatusMessage.SetMessage('Position indexing failed.', EMsgColor.ERROR)
+        SpawnModal("Error", "Error occured: {}".format(trace), QtWidgets.QMessageBox.Ok)
+
     def __OnDeleteGame(self):
         id = self.__GetSelectedGameID()
         try:
@@ -157,17 +329,10 @@ class GamesWidget(QtWidgets.QWidget):
             self.__RefreshTableData()
 
     def RefreshData(self):
+        self.filter_widget.RefreshPlayers()
         self.__RefreshTableData()
         
     def __RefreshTableData(self):
-        self.rich_game_data = list(self.db_manager.GetDatabaseAPI().GetRichGames())
-        self.table_widget.setRowCount(len(self.rich_game_data))
-
-        for i, game in enumerate(self.rich_game_data):
-            for j, data_layout in enumerate(self.data_layout):
-                new_item = QtWidgets.QTableWidgetItem(str(data_layout[1](game)))
-                self.table_widget.setItem(i, j, new_item)
-        
-        # self.table_widget.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)
-        # self.table_widget.resizeColumnsToContents()
-        # self.table_widget.horizontalHeader().setStretchLastSection(True)
+        # Rows are fetched page by page when the view needs them
+        self.game_filter = self.filter_widget.GetFilter()
+        self.table_model.Reset()
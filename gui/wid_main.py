@@ -3,6 +3,7 @@ from PySide6 import QtWidgets
 from data.data_manager import DataManager
 from gui.wid_players import PlayersWidget
 from gui.wid_games import GamesWidget
+from gui.wid_diagnostics import DiagnosticsWidget
 from gui.wid_status_msg import GlobalStatusMessage
 
 
@@ -34,11 +35,14 @@ class MainWidget(QtWidgets.QWidget):
 
         players_tab = PlayersWidget(self.db_manager, self)
         games_tab = GamesWidget(self.db_manager, self)
+        diagnostics_tab = DiagnosticsWidget(self.db_manager, self)
         
         self.root_tab.addTab(players_tab, "Players")
         self.root_tab.addTab(games_tab, "Games")
+        self.root_tab.addTab(diagnostics_tab, "Diagnostics")
+        self.main_layout.addWidget(self.status_widget)
 
-        self.change_response = [players_tab, games_tab]
+        self.change_response = [players_tab, games_tab, diagnostics_tab]
         self.root_tab.currentChanged.connect(self.OnTabChanged)
 
     def OnTabChanged(self, index: int):
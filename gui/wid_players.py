@@ -1,7 +1,10 @@
 from PySide6 import QtWidgets
 from data.data_manager import DataManager
-from data.chess_structs import ChessGame, ChessPlayer
+from data.chess_structs import ChessGame, ChessPlayer, GameSide
 from gui.edit.wid_edit_player import PlayerEditDialog
+from gui.history.wid_player_history import PlayerHistoryDialog
+from gui.model.paged_table_model import PagedTableModel
+from gui.search.wid_players_filter import PlayersFilterWidget
 from helpers.gui import ShowModalException, SpawnModal
 
 
@@ -15,20 +18,46 @@ class PlayersWidget(QtWidgets.QWidget):
         self.main_layout = QtWidgets.QHBoxLayout(self)
         self.setLayout(self.main_layout)
 
+        # Filter bar above the datasheet
+        data_widget = QtWidgets.QWidget(self)
+        data_layout = QtWidgets.QVBoxLayout(data_widget)
+        data_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.filter_widget = PlayersFilterWidget(data_widget)
+        self.filter_widget.changed.connect(self.__RefreshTableData)
+
         # Datasheet
-        self.table_widget = QtWidgets.QTableWidget(self)
+        self.table_widget = QtWidgets.QTableView(self)
         self.table_widget.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)
         # self.table_widget.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
         self.table_widget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
         self.table_widget.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.SingleSelection)
         self.table_widget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
 
-        headers = list(ChessPlayer.getHeaders())
-        self.table_widget.setColumnCount(len(headers))
-        self.table_widget.setHorizontalHeaderLabels(headers)
-
+        self.data_layout = [
+            ('ID', lambda p: p.id),
+            ('Full Name', lambda p: p.full_name),
+            ('Nick', lambda p: p.nick),
+            ('Elo', lambda p: p.elo),
+            ('Games', lambda p: p.stats.GetGamesCount()),
+            ('White W/D/L', lambda p: p.stats.GetFormatedResults(GameSide.WHITE)),
+            ('Black W/D/L', lambda p: p.stats.GetFormatedResults(GameSide.BLACK)),
+            ('Peak', lambda p: p.stats.peak_rating if p.stats.peak_rating is not None else '-'),
+            ('Performance', lambda p: p.stats.GetPerformanceRating() or '-'),
+        ]
+        self.table_model = PagedTableModel(
+            self.data_layout,
+            lambda after_id, limit: self.db_manager.GetDatabaseAPI().SearchPlayersPage(self.search_text, after_id, limit),
+            lambda p: p.id,
+            self
+        )
+        self.table_widget.setModel(self.table_model)
+
+        self.search_text = ''
         self.__RefreshTableData()
-        self.main_layout.addWidget(self.table_widget)
+        data_layout.addWidget(self.filter_widget)
+        data_layout.addWidget(self.table_widget)
+        self.main_layout.addWidget(data_widget)
         
         # Buttons
         self.buttons_widget = self.__CreateButtonsWidget()
@@ -63,16 +92,16 @@ class PlayersWidget(QtWidgets.QWidget):
         return buttons_widget
     
     def __GetSelectedPlayerID(self):
-        rows = self.table_widget.selectionModel().selectedRows()
-        if len(rows):
-            return int(rows[0].data())
+        player = self.__GetSelectedPlayerData()
+        if player:
+            return player.id
         else:
             return None
     
     def __GetSelectedPlayerData(self):
-        id = self.__GetSelectedPlayerID()
-        if id:
-            return next((p for p in self.player_data if p.id == id), None)
+        rows = self.table_widget.selectionModel().selectedRows()
+        if len(rows):
+            return self.table_model.GetRowObject(rows[0].row())
         
     def __OnNewPlayer(self):
         dialog = PlayerEditDialog(self.db_manager, self)
@@ -104,20 +133,18 @@ class PlayersWidget(QtWidgets.QWidget):
             self.__RefreshTableData()
 
     def __OnShowPlayerGame(self):
-        print("!!!")
+        player = self.__GetSelectedPlayerData()
+        if not player:
+            SpawnModal('Error', 'Cannot find currently selected player.', QtWidgets.QMessageBox.Ok)
+            return
+
+        dialog = PlayerHistoryDialog(self.db_manager, self, player)
+        dialog.exec_()
 
     def RefreshData(self):
         self.__RefreshTableData()
 
     def __RefreshTableData(self):
-        self.player_data = list(self.db_manager.GetDatabaseAPI().GetPlayers())
-        self.table_widget.setRowCount(len(self.player_data))
-        for i, player in enumerate(self.player_data):
-            for j, data in enumerate(player.getData()):
-                new_item = QtWidgets.QTableWidgetItem(str(data))
-                self.table_widget.setItem(i, j, new_item)
-        
-        # self.table_widget.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)
-        # self.table_widget.resizeColumnsToContents()
-        # self.table_widget.horizontalHeader().setStretchLastSection(True)
-    
\ No newline at end of file
+        # Rows are fetched page by page when the view needs them
+        self.search_text = self.filter_widget.GetText()
+        self.table_model.Reset()
@@ -0,0 +1,51 @@
+import threading
+import traceback
+from PySide6 import QtCore
+from helpers.elo import EloCalculationCancelled
+
+
+class EloWorkerSignals(QtCore.QObject):
+    ''' Signals of EloWorker, emitted from the worker thread '''
+    progress = QtCore.Signal(int, int)
+    # Summary of EloMetrics
+    finished = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+    failed = QtCore.Signal(str)
+
+
+class EloWorker(QtCore.QRunnable):
+    ''' Runs ELO calculation in the thread pool on the connection of the worker thread '''
+    MODE_RECALCULATE = 0
+    MODE_ITERATE = 1
+
+    def __init__(self, api, mode: int, timestamp: int = None):
+        super().__init__()
+        self.api = api
+        self.mode = mode
+        self.timestamp = timestamp
+
+        self.signals = EloWorkerSignals()
+        self.cancel_event = threading.Event()
+
+    def Cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        api = self.api
+        try:
+            if self.mode == EloWorker.MODE_ITERATE:
+                metrics = api.RecalculateEloIterate(self.timestamp, progress=self.__OnProgress)
+            else:
+                metrics = api.RecalculateArchivedElo(progress=self.__OnProgress)
+            self.signals.finished.emit(metrics.GetSummary())
+        except EloCalculationCancelled:
+            self.signals.cancelled.emit()
+        except Exception:
+            self.signals.failed.emit(traceback.format_exc())
+        finally:
+            api.ReleaseConnection()
+
+    def __OnProgress(self, done: int, total: int):
+        if self.cancel_event.is_set():
+            raise EloCalculationCancelled()
+        self.signals.progress.emit(done, total)
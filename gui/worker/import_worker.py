@@ -0,0 +1,32 @@
+import os
+import traceback
+from PySide6 import QtCore
+from data.pgn_importer import PgnImporter
+
+
+class ImportWorkerSignals(QtCore.QObject):
+    ''' Signals of ImportWorker, emitted from the worker thread '''
+    progress = QtCore.Signal(int, int)
+    finished = QtCore.Signal(str)
+    failed = QtCore.Signal(str)
+
+
+class ImportWorker(QtCore.QRunnable):
+    ''' Imports PGN file in the thread pool on the connection of the worker thread '''
+
+    def __init__(self, api, pgn_path: str):
+        super().__init__()
+        self.api = api
+        self.pgn_path = pgn_path
+        self.signals = ImportWorkerSignals()
+
+    def run(self):
+        api = self.api
+        try:
+            importer = PgnImporter(api, processes=os.cpu_count() or 1, validate=True)
+            stats = importer.Import(self.pgn_path, progress=self.signals.progress.emit)
+            self.signals.finished.emit(stats.GetSummary())
+        except Exception:
+            self.signals.failed.emit(traceback.format_exc())
+        finally:
+            api.ReleaseConnection()
@@ -0,0 +1,25 @@
+import traceback
+from PySide6 import QtCore
+from helpers.pgn_timeline import PositionTimeline
+
+
+class PgnValidationWorkerSignals(QtCore.QObject):
+    ''' Signals of PgnValidationWorker, emitted from the worker thread '''
+    # PGN text and its GamePgnInfo
+    finished = QtCore.Signal(str, object)
+    failed = QtCore.Signal(str, str)
+
+
+class PgnValidationWorker(QtCore.QRunnable):
+    ''' Parses PGN text in the thread pool, does not use the database '''
+
+    def __init__(self, pgn: str):
+        super().__init__()
+        self.pgn = pgn
+        self.signals = PgnValidationWorkerSignals()
+
+    def run(self):
+        try:
+            self.signals.finished.emit(self.pgn, PositionTimeline.ParsePgn(self.pgn))
+        except Exception:
+            self.signals.failed.emit(self.pgn, traceback.format_exc())
@@ -0,0 +1,44 @@
+import os
+import threading
+import traceback
+from PySide6 import QtCore
+from data.position_indexer import PositionIndexCancelled, PositionIndexer
+
+
+class PositionWorkerSignals(QtCore.QObject):
+    ''' Signals of PositionWorker, emitted from the worker thread '''
+    progress = QtCore.Signal(int, int)
+    finished = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+    failed = QtCore.Signal(str)
+
+
+class PositionWorker(QtCore.QRunnable):
+    ''' Fills the position index in the thread pool on the connection of the worker thread '''
+
+    def __init__(self, api):
+        super().__init__()
+        self.api = api
+        self.signals = PositionWorkerSignals()
+        self.cancel_event = threading.Event()
+
+    def Cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        api = self.api
+        try:
+            indexer = PositionIndexer(api, processes=os.cpu_count() or 1)
+            stats = indexer.Backfill(progress=self.__OnProgress)
+            self.signals.finished.emit(stats.GetSummary())
+        except PositionIndexCancelled:
+            self.signals.cancelled.emit()
+        except Exception:
+            self.signals.failed.emit(traceback.format_exc())
+        finally:
+            api.ReleaseConnection()
+
+    def __OnProgress(self, done: int, total: int):
+        if self.cancel_event.is_set():
+            raise PositionIndexCancelled()
+        self.signals.progress.emit(done, total)
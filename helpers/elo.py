@@ -1,10 +1,34 @@
+import time
+
 from data.chess_structs import GameDetails, GameResult, GameSide
+from helpers.elo_metrics import EloMetrics
+
+
+class EloCalculationCancelled(Exception):
+    ''' Raised by progress callback to stop the calculation before anything is stored '''
+    pass
 
 
 class EloCalculator:
     ELO_START = 1500
     K_VALUE = 20.0
     RANGE_VALUE = 400.0
+    # Number of games between two snapshots of players elo
+    CHECKPOINT_INTERVAL = 1000
+    # The first checkpoint of a replay and every n-th after it has all players,
+    # the others only players who played since the previous checkpoint
+    FULL_CHECKPOINT_INTERVAL = 50
+    # Number of games between two progress reports
+    PROGRESS_INTERVAL = 10000
+
+    # Engine used to replay games, numpy replays rounds of games without common players at once,
+    # see NumpyEloEngine.ReplayGames, both give the same results
+    ENGINE_PYTHON = 0
+    ENGINE_NUMPY = 1
+    ENGINE_MODE = ENGINE_NUMPY
+
+    # Callbacks(game, game details) called for every replayed game, see AddTraceHook
+    TRACE_HOOKS = []
 
     @staticmethod
     def ExpectedScore(player_elo: int, opponent_elo: int):
@@ -15,15 +39,47 @@ class EloCalculator:
         return int(EloCalculator.K_VALUE * (GameResult.getEloResult(result, side) - exp))
 
     @staticmethod
-    def RecalculateEloIterate(api, timestamp: int):
-        players_elo = {id: elo for id, elo in api.GetPlayersElo()}
-        game_generator = api.GetAllNotArchivedGamesAscending(timestamp)
-        
-        if timestamp <= api.GetInfo().elo_calc_date:
-            return
+    def GetPeriodStart(date: int, period_length: int)-> int:
+        if period_length <= 0:
+            return date
+        return date // period_length * period_length
+
+    @staticmethod
+    def AddTraceHook(hook):
+        EloCalculator.TRACE_HOOKS.append(hook)
+
+    @staticmethod
+    def RemoveTraceHook(hook):
+        EloCalculator.TRACE_HOOKS.remove(hook)
+
+    @staticmethod
+    def ReplayGames(players_elo: dict, game_generator, checkpoint_count: int=0, period_length: int=0, progress=None):
+        # -> (game details, checkpoints), players_elo is updated in place
+        # checkpoints - (date, game_id, {player_id: elo}, full snapshot), see FULL_CHECKPOINT_INTERVAL
+        # checkpoint_count - number of games already played since the last checkpoint
+        # period_length - if set, games of one period are rated against ratings from the period start
+        # progress - optional callback(done, total), may raise EloCalculationCancelled
+        if period_length > 0:
+            from helpers.elo_numpy import NumpyEloEngine
+            return NumpyEloEngine.ReplayPeriods(EloCalculator, players_elo, game_generator, period_length, progress)
+
+        if EloCalculator.ENGINE_MODE == EloCalculator.ENGINE_NUMPY:
+            from helpers.elo_numpy import NumpyEloEngine
+            return NumpyEloEngine.ReplayGames(EloCalculator, players_elo, game_generator, checkpoint_count, progress)
+
+        return EloCalculator.ReplaySequential(players_elo, game_generator, checkpoint_count, progress)
+
+    @staticmethod
+    def ReplaySequential(players_elo: dict, game_generator, checkpoint_count: int=0, progress=None):
+        # ReplayGames of the python engine, games are rated one by one
+        games = list(game_generator)
+        gdetails_list = []
+        checkpoints = []
+        changed = set()
+        for i, g in enumerate(games):
+            if progress and i % EloCalculator.PROGRESS_INTERVAL == 0:
+                progress(i, len(games))
 
-        # Main calculation
-        for g in game_generator:
             elo1 = players_elo[g.player_1_id]
             elo2 = players_elo[g.player_2_id]
 
@@ -32,60 +88,135 @@ class EloCalculator:
 
             added1 = EloCalculator.AddedScore(exp1, GameSide.WHITE, g.result)
             added2 = EloCalculator.AddedScore(exp2, GameSide.BLACK, g.result)
-            
+
             players_elo[g.player_1_id] = elo1 + added1
             players_elo[g.player_2_id] = elo2 + added2
 
-            # Debug
-            print('')
-            print('P1: elo={}, exp={}, added={}'.format(elo1, exp1, added1))
-            print('P2: elo={}, exp={}, added={}'.format(elo2, exp2, added2))
+            gdetails_list.append(GameDetails(g.id, elo1, elo2, added1, added2))
+            changed.add(g.player_1_id)
+            changed.add(g.player_2_id)
 
-            api.AddGameDetails(GameDetails(g.id, elo1, elo2, added1, added2))
+            checkpoint_count += 1
+            if checkpoint_count % EloCalculator.CHECKPOINT_INTERVAL == 0:
+                checkpoints.append(EloCalculator.CreateCheckpoint(g.date, g.id, players_elo, changed, len(checkpoints)))
+                changed = set()
 
-        # Debug
-        for p_id, elo in players_elo.items():
-            print("id: {}, elo: {}".format(p_id, elo))
+        return gdetails_list, checkpoints
 
-        # Update players elo
-        for p_id, elo in players_elo.items():
-            api.UpdatePlayerElo(p_id, elo)
-        
-        api.UpdateEloTimestamp(timestamp)
+    @staticmethod
+    def CreateCheckpoint(date: int, game_id: int, players_elo: dict, changed, index: int)-> tuple:
+        # changed - players who played since the previous checkpoint
+        # index - number of checkpoints taken before in the same replay
+        if index % EloCalculator.FULL_CHECKPOINT_INTERVAL == 0:
+            return (date, game_id, dict(players_elo), True)
+        return (date, game_id, {id: players_elo[id] for id in changed}, False)
 
     @staticmethod
-    def RecalculateArchivedElo(api):
-        players_elo = {id: EloCalculator.ELO_START for id in api.GetPlayersId()}
-        game_generator = api.GetAllArchivedGamesAscending()
-        api.DeleteAllGameDetails()
+    def RecalculateEloIterate(api, timestamp: int, progress=None)-> EloMetrics:
+        info = api.GetInfo()
+        if timestamp <= info.elo_calc_date:
+            return EloMetrics()
+
+        # Period containing elo_calc_date may be incomplete, replay it as a whole
+        if info.elo_period_length > 0:
+            return EloCalculator.RecalculateArchivedEloFrom(api, info.elo_calc_date + 1, timestamp, progress)
+
+        metrics = EloMetrics()
+        start = time.perf_counter()
+        with metrics.MeasureSql(), api.ReadSnapshot():
+            players_elo = {id: elo for id, elo in api.GetPlayersElo()}
+            games = list(api.GetAllNotArchivedGamesAscending(timestamp, with_pgn=False))
+            checkpoint_count = api.CountArchivedGamesSinceCheckpoint()
 
         # Main calculation
-        print('===========================')
-        print('Calculation of ELO started.')
-        for g in game_generator:
-            elo1 = players_elo[g.player_1_id]
-            elo2 = players_elo[g.player_2_id]
+        gdetails_list, checkpoints, history = EloCalculator.__Replay(
+            metrics, players_elo, games, checkpoint_count, progress=progress)
 
-            exp1 = EloCalculator.ExpectedScore(elo1, elo2)
-            exp2 = EloCalculator.ExpectedScore(elo2, elo1)
+        # Store details, players elo and timestamp at once
+        with metrics.MeasureSql():
+            api.StoreEloResults(gdetails_list, history, players_elo, checkpoints, timestamp=timestamp)
 
-            added1 = EloCalculator.AddedScore(exp1, GameSide.WHITE, g.result)
-            added2 = EloCalculator.AddedScore(exp2, GameSide.BLACK, g.result)
-            
-            players_elo[g.player_1_id] = elo1 + added1
-            players_elo[g.player_2_id] = elo2 + added2
+        metrics.elapsed = time.perf_counter() - start
+        return metrics
 
-            # Debug
-            print('')
-            print('P1: elo={}, exp={}, added={}'.format(elo1, exp1, added1))
-            print('P2: elo={}, exp={}, added={}'.format(elo2, exp2, added2))
+    @staticmethod
+    def RecalculateArchivedElo(api, timestamp: int=None, progress=None, period_length: int=None)-> EloMetrics:
+        # timestamp - if set, games up to it are archived, elo_calc_date otherwise
+        # period_length - if set, new length of the rating period stored with the results
+        metrics = EloMetrics()
+        start = time.perf_counter()
+        with metrics.MeasureSql(), api.ReadSnapshot():
+            players_elo = {id: EloCalculator.ELO_START for id in api.GetPlayersId()}
+            games = list(api.GetAllArchivedGamesAscending(timestamp, with_pgn=False))
+            store_period = period_length
+            if period_length is None:
+                period_length = api.GetInfo().elo_period_length
+
+        # Main calculation
+        gdetails_list, checkpoints, history = EloCalculator.__Replay(
+            metrics, players_elo, games, period_length=period_length, progress=progress)
 
-            api.AddGameDetails(GameDetails(g.id, elo1, elo2, added1, added2))
+        # Replace details and update players elo at once
+        with metrics.MeasureSql():
+            api.StoreEloResults(gdetails_list, history, players_elo, checkpoints, rebuild=True, 
+                timestamp=timestamp, period_length=store_period)
 
-        # Debug
-        for p_id, elo in players_elo.items():
-            print("id: {}, elo: {}".format(p_id, elo))
+        metrics.elapsed = time.perf_counter() - start
+        return metrics
 
-        # Update players elo
-        for p_id, elo in players_elo.items():
-            api.UpdatePlayerElo(p_id, elo)
\ No newline at end of file
+    @staticmethod
+    def RecalculateArchivedEloFrom(api, date: int, timestamp: int=None, progress=None)-> EloMetrics:
+        # Restore the nearest checkpoint before date and replay only games after it
+        # timestamp - if set, games up to it are archived, elo_calc_date otherwise
+        metrics = EloMetrics()
+        start = time.perf_counter()
+        with metrics.MeasureSql():
+            period_length = api.GetInfo().elo_period_length
+            checkpoint = api.GetEloCheckpointBefore(EloCalculator.GetPeriodStart(date, period_length))
+        if not checkpoint:
+            return EloCalculator.RecalculateArchivedElo(api, timestamp, progress)
+
+        ckpt_date, ckpt_game_id, ckpt_elo = checkpoint
+        with metrics.MeasureSql(), api.ReadSnapshot():
+            players_elo = {id: ckpt_elo.get(id, EloCalculator.ELO_START) for id in api.GetPlayersId()}
+            games = list(api.GetArchivedGamesAscendingAfter(ckpt_date, ckpt_game_id, timestamp, with_pgn=False))
+
+        # Main calculation
+        gdetails_list, checkpoints, history = EloCalculator.__Replay(
+            metrics, players_elo, games, period_length=period_length, progress=progress)
+
+        # Replace details after the checkpoint and update players elo at once
+        with metrics.MeasureSql():
+            api.StoreEloResults(gdetails_list, history, players_elo, checkpoints, 
+                rebuild_after=(ckpt_date, ckpt_game_id), timestamp=timestamp)
+
+        metrics.elapsed = time.perf_counter() - start
+        return metrics
+
+    @staticmethod
+    def CreateRatingHistory(games, gdetails_list)-> list:
+        # -> (player_id, date, game_id, rating_before, delta) rows of both players of every game
+        history = []
+        for g, gd in zip(games, gdetails_list):
+            history.append((g.player_1_id, g.date, g.id, gd.player_1_elo, gd.player_1_change))
+            history.append((g.player_2_id, g.date, g.id, gd.player_2_elo, gd.player_2_change))
+        return history
+
+    @staticmethod
+    def __Replay(metrics: EloMetrics, players_elo: dict, games: list, checkpoint_count: int=0, period_length: int=0, progress=None):
+        # ReplayGames with measured time and trace hooks called after the replay,
+        # so the replay itself does not pay for disabled tracing
+        with metrics.MeasureMath():
+            gdetails_list, checkpoints = EloCalculator.ReplayGames(
+                players_elo, games, checkpoint_count, period_length, progress)
+            history = EloCalculator.CreateRatingHistory(games, gdetails_list)
+
+        if EloCalculator.TRACE_HOOKS:
+            for game, gdetails in zip(games, gdetails_list):
+                for hook in EloCalculator.TRACE_HOOKS:
+                    hook(game, gdetails)
+
+        metrics.games += len(games)
+        metrics.players = len(players_elo)
+        metrics.checkpoints += len(checkpoints)
+        return gdetails_list, checkpoints, history
@@ -0,0 +1,42 @@
+import contextlib
+import time
+
+
+class EloMetrics:
+    ''' Counters and timings of one ELO calculation '''
+
+    def __init__(self):
+        self.games = 0
+        self.players = 0
+        self.checkpoints = 0
+        # Seconds spent loading games and storing results
+        self.sql_time = 0.0
+        # Seconds spent replaying games
+        self.math_time = 0.0
+        self.elapsed = 0.0
+
+    @contextlib.contextmanager
+    def MeasureSql(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sql_time += time.perf_counter() - start
+
+    @contextlib.contextmanager
+    def MeasureMath(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.math_time += time.perf_counter() - start
+
+    def GetGamesPerSecond(self)-> float:
+        if self.elapsed <= 0.0:
+            return 0.0
+        return self.games / self.elapsed
+
+    def GetSummary(self)-> str:
+        return '{} games of {} players in {:.2f}s (SQL {:.2f}s, rating {:.2f}s), {:.0f} games/s'.format(
+            self.games, self.players, self.elapsed, self.sql_time, self.math_time, self.GetGamesPerSecond())
+
@@ -0,0 +1,284 @@
+import gc
+import itertools
+import operator
+
+import numpy as np
+
+from data.chess_structs import GameDetails, GameResult, GameSide
+
+
+class NumpyEloEngine:
+    ''' Replay of games over contiguous arrays, gives the same results as EloCalculator.ReplayGames '''
+    # Elo difference covered by the precomputed table, bigger differences are computed directly
+    DIFF_LIMIT = 2000
+    # (K_VALUE, RANGE_VALUE) of the calculator -> (table list, table array), see CreateScoreTable
+    SCORE_TABLES = {}
+    # Smallest average number of games in a round of ReplayGames, shorter rounds are replayed one by one
+    MIN_ROUND_SIZE = 16
+
+    @staticmethod
+    def LoadGames(players_elo: dict, game_generator):
+        # -> (game ids, dates, white indices, black indices, results, player ids, ratings)
+        # Player ids are remapped to dense indices into the ratings array
+        columns = operator.attrgetter('id', 'date', 'player_1_id', 'player_2_id', 'result')
+        games = np.fromiter(
+            itertools.chain.from_iterable(map(columns, game_generator)), dtype=np.int64).reshape(-1, 5)
+
+        player_ids = np.array(sorted(players_elo.keys()), dtype=np.int64)
+        ratings = np.array([players_elo[id] for id in player_ids.tolist()], dtype=np.int64)
+
+        white = NumpyEloEngine.__RemapPlayers(player_ids, games[:, 2])
+        black = NumpyEloEngine.__RemapPlayers(player_ids, games[:, 3])
+
+        return (
+            games[:, 0],
+            games[:, 1],
+            white,
+            black,
+            games[:, 4].astype(np.int8),
+            player_ids,
+            ratings
+        )
+
+    @staticmethod
+    def CreateScoreTable(calculator)-> tuple:
+        # Added score depends only on the elo difference and the result.
+        # Entry (diff + DIFF_LIMIT) * 3 + result holds (white added, black added) for diff = white - black
+        # -> (list of tuples, array of shape (entries, 2)), built once for the constants of the calculator
+        key = (calculator.K_VALUE, calculator.RANGE_VALUE)
+        tables = NumpyEloEngine.SCORE_TABLES.get(key)
+        if tables is None:
+            table = []
+            for diff in range(-NumpyEloEngine.DIFF_LIMIT, NumpyEloEngine.DIFF_LIMIT + 1):
+                for result in range(GameResult._SIZE):
+                    table.append(NumpyEloEngine.__ComputeAdded(calculator, diff, result))
+            tables = NumpyEloEngine.SCORE_TABLES[key] = (table, np.array(table, dtype=np.int64).reshape(-1, 2))
+        return tables
+
+    @staticmethod
+    def ReplayGames(calculator, players_elo: dict, game_generator, checkpoint_count: int=0, progress=None):
+        # -> (game details, checkpoints), players_elo is updated in place
+        # Games are split into rounds, a game is played in the round after the previous games of both its players.
+        # Games of one round share no players and games of every player keep their order,
+        # so every round is a handful of array operations with the results of the sequential replay.
+        games = list(game_generator)
+        # A round has at most half of the players, in practice about a tenth of them
+        if len(players_elo) < 4 * NumpyEloEngine.MIN_ROUND_SIZE:
+            return calculator.ReplaySequential(players_elo, games, checkpoint_count, progress)
+
+        ids, dates, white, black, results, player_ids, ratings = NumpyEloEngine.LoadGames(players_elo, games)
+        rounds = NumpyEloEngine.__AssignRounds(white, black, len(player_ids))
+        size = len(ids)
+        if size and size < NumpyEloEngine.MIN_ROUND_SIZE * int(rounds.max()):
+            return calculator.ReplaySequential(players_elo, games, checkpoint_count, progress)
+
+        table = NumpyEloEngine.CreateScoreTable(calculator)[1]
+        order = np.argsort(rounds, kind='stable')
+        bounds = (np.flatnonzero(np.diff(rounds[order])) + 1).tolist()
+        round_white = white[order]
+        round_black = black[order]
+        round_results = results[order]
+
+        start_ratings = ratings.copy()
+        elo1_out = np.empty(size, dtype=np.int64)
+        elo2_out = np.empty(size, dtype=np.int64)
+        added_out = np.empty((size, 2), dtype=np.int64)
+
+        interval = calculator.PROGRESS_INTERVAL
+        for start, end in zip([0] + bounds, bounds + [size]):
+            w = round_white[start:end]
+            b = round_black[start:end]
+            elo1 = ratings[w]
+            elo2 = ratings[b]
+            added = NumpyEloEngine.__LookupAdded(calculator, table, elo1 - elo2, round_results[start:end])
+
+            # Players of a round are unique, plain assignment is enough
+            ratings[w] = elo1 + added[:, 0]
+            ratings[b] = elo2 + added[:, 1]
+
+            elo1_out[start:end] = elo1
+            elo2_out[start:end] = elo2
+            added_out[start:end] = added
+
+            if progress and end // interval != start // interval:
+                progress(end, size)
+
+        # Back to the order of the games
+        unsorted = np.empty(size, dtype=np.int64)
+        unsorted[order] = np.arange(size)
+        elo1_out = elo1_out[unsorted]
+        elo2_out = elo2_out[unsorted]
+        added_out = added_out[unsorted]
+
+        checkpoints = NumpyEloEngine.__CreateGameCheckpoints(calculator, dates, ids, white, black, 
+            elo1_out + added_out[:, 0], elo2_out + added_out[:, 1], player_ids, start_ratings, checkpoint_count)
+
+        players_elo.update(zip(player_ids.tolist(), ratings.tolist()))
+        gdetails_list = NumpyEloEngine.__CreateGameDetails(ids, elo1_out, elo2_out, added_out[:, 0], added_out[:, 1])
+        return gdetails_list, checkpoints
+
+    @staticmethod
+    def ReplayPeriods(calculator, players_elo: dict, game_generator, period_length: int, progress=None):
+        # -> (game details, checkpoints), players_elo is updated in place
+        # All games of a period are rated against ratings frozen at the period start,
+        # so every period is a handful of array operations.
+        ids, dates, white, black, results, player_ids, ratings = NumpyEloEngine.LoadGames(players_elo, game_generator)
+        table = NumpyEloEngine.CreateScoreTable(calculator)[1]
+        size = len(ids)
+
+        elo1_out = np.empty(size, dtype=np.int64)
+        elo2_out = np.empty(size, dtype=np.int64)
+        added1_out = np.empty(size, dtype=np.int64)
+        added2_out = np.empty(size, dtype=np.int64)
+
+        periods = dates // period_length
+        bounds = (np.flatnonzero(np.diff(periods)) + 1).tolist()
+
+        # The last period may get more games later, so it is never checkpointed
+        player_ids_l = player_ids.tolist()
+        checkpoints = []
+        checkpoint_count = 0
+        changed = np.zeros(len(player_ids), dtype=bool)
+        for start, end in zip([0] + bounds, bounds + [size]):
+            w = white[start:end]
+            b = black[start:end]
+            elo1 = ratings[w]
+            elo2 = ratings[b]
+            added = NumpyEloEngine.__LookupAdded(calculator, table, elo1 - elo2, results[start:end])
+
+            np.add.at(ratings, w, added[:, 0])
+            np.add.at(ratings, b, added[:, 1])
+            changed[w] = True
+            changed[b] = True
+
+            elo1_out[start:end] = elo1
+            elo2_out[start:end] = elo2
+            added1_out[start:end] = added[:, 0]
+            added2_out[start:end] = added[:, 1]
+
+            checkpoint_count += end - start
+            if checkpoint_count >= calculator.CHECKPOINT_INTERVAL and end != size:
+                checkpoints.append(NumpyEloEngine.__CreateCheckpoint(
+                    calculator, dates, ids, end, player_ids_l, ratings.tolist(), np.flatnonzero(changed).tolist(), len(checkpoints)))
+                checkpoint_count = 0
+                changed[:] = False
+
+            if progress and end // calculator.PROGRESS_INTERVAL != start // calculator.PROGRESS_INTERVAL:
+                progress(end, size)
+
+        players_elo.update(zip(player_ids.tolist(), ratings.tolist()))
+        gdetails_list = NumpyEloEngine.__CreateGameDetails(ids, elo1_out, elo2_out, added1_out, added2_out)
+        return gdetails_list, checkpoints
+
+    @staticmethod
+    def __CreateGameDetails(ids, elo1, elo2, added1, added2)-> list:
+        # Details are created at once and hold no references to other objects, so they cannot form cycles.
+        # Cycle collector would only walk all live objects again and again while the list grows.
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return list(map(GameDetails, ids.tolist(), elo1.tolist(), elo2.tolist(), added1.tolist(), added2.tolist()))
+        finally:
+            if enabled:
+                gc.enable()
+
+    @staticmethod
+    def __AssignRounds(white, black, players: int):
+        # -> round of every game, 1 + the latest round of either player, see ReplayGames
+        last = [0] * players
+        rounds = []
+        append = rounds.append
+        for a, b in zip(white.tolist(), black.tolist()):
+            r = last[a]
+            rb = last[b]
+            if rb > r:
+                r = rb
+            r += 1
+            last[a] = r
+            last[b] = r
+            append(r)
+        return np.array(rounds, dtype=np.int64)
+
+    @staticmethod
+    def __CreateGameCheckpoints(calculator, dates, ids, white, black, elo1_after, elo2_after, 
+        player_ids, ratings, checkpoint_count: int)-> list:
+        # Checkpoints of the sequential replay, ratings - dense ratings before the first game, updated in place
+        # Rating of a player at a checkpoint is the one after their last game before it
+        interval = calculator.CHECKPOINT_INTERVAL
+        size = len(ids)
+        player_ids_l = player_ids.tolist()
+        checkpoints = []
+        start = 0
+        for end in range(interval - checkpoint_count % interval, size + 1, interval):
+            # Both players of every game, in the order of the games
+            players = np.empty(2 * (end - start), dtype=np.int64)
+            players[0::2] = white[start:end]
+            players[1::2] = black[start:end]
+            elo = np.empty(2 * (end - start), dtype=np.int64)
+            elo[0::2] = elo1_after[start:end]
+            elo[1::2] = elo2_after[start:end]
+
+            # First occurrence from the end is the last game of the player
+            changed, last = np.unique(players[::-1], return_index=True)
+            ratings[changed] = elo[::-1][last]
+
+            checkpoints.append(NumpyEloEngine.__CreateCheckpoint(
+                calculator, dates, ids, end, player_ids_l, ratings.tolist(), changed.tolist(), len(checkpoints)))
+            start = end
+        return checkpoints
+
+    @staticmethod
+    def __CreateCheckpoint(calculator, dates, ids, end: int, player_ids: list, elo: list, changed, index: int)-> tuple:
+        # Same as EloCalculator.CreateCheckpoint after game end - 1, elo and changed are dense player indices
+        if index % calculator.FULL_CHECKPOINT_INTERVAL == 0:
+            return (int(dates[end - 1]), int(ids[end - 1]), dict(zip(player_ids, elo)), True)
+        return (int(dates[end - 1]), int(ids[end - 1]), {player_ids[i]: elo[i] for i in changed}, False)
+
+    @staticmethod
+    def __LookupAdded(calculator, table, diff, results):
+        # -> array of (white added, black added) for every game
+        limit = NumpyEloEngine.DIFF_LIMIT
+        # Index is out of the table exactly when the difference is
+        index = (diff + limit) * GameResult._SIZE + results
+        if len(index) == 0 or (index.min() >= 0 and index.max() < len(table)):
+            return table[index]
+
+        inside = np.abs(diff) <= limit
+        added = table[np.where(inside, index, 0)]
+
+        # Differences out of the table are rare, compute them one by one
+        for i in np.flatnonzero(~inside).tolist():
+            added[i] = NumpyEloEngine.__ComputeAdded(calculator, int(diff[i]), int(results[i]))
+        return added
+
+    @staticmethod
+    def __RemapPlayers(player_ids, column):
+        # Ids of the database are mostly dense, then a lookup array is faster than a search
+        if len(player_ids) and 0 <= player_ids[0] and player_ids[-1] < 4 * len(player_ids) + 1024:
+            lookup = np.full(int(player_ids[-1]) + 1, -1, dtype=np.int64)
+            lookup[player_ids] = np.arange(len(player_ids))
+            valid = (column >= 0) & (column < len(lookup))
+            index = lookup[np.where(valid, column, 0)]
+            unknown = ~valid | (index < 0)
+            if np.any(unknown):
+                raise KeyError(int(column[unknown][0]))
+            return index
+
+        index = np.searchsorted(player_ids, column)
+        if len(column) and (not len(player_ids) or np.any(index >= len(player_ids))):
+            raise KeyError(int(column[np.argmax(index >= len(player_ids))]))
+
+        unknown = player_ids[index] != column
+        if np.any(unknown):
+            raise KeyError(int(column[unknown][0]))
+        return index
+
+    @staticmethod
+    def __ComputeAdded(calculator, diff: int, result: int):
+        # Same arithmetic as EloCalculator, elo1 - elo2 == diff
+        exp1 = calculator.ExpectedScore(diff, 0)
+        exp2 = calculator.ExpectedScore(0, diff)
+        return (
+            calculator.AddedScore(exp1, GameSide.WHITE, result),
+            calculator.AddedScore(exp2, GameSide.BLACK, result)
+        )
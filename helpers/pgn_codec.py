@@ -0,0 +1,147 @@
+import array
+import itertools
+import re
+import sys
+import zlib
+
+
+class PgnCodec:
+    ''' Compact lossless storage of PGN text: SAN moves as 16-bit codes, the rest deflated '''
+    # Format of the packed value, first byte
+    FORMAT_DEFLATE = 0
+    FORMAT_MOVES = 1
+
+    # Placeholders in the skeleton text, a move from the codes / the next move number
+    MOVE_MARK = '\x01'
+    NUMBER_MARK = '\x02'
+
+    # Text is split into words by whitespace and PGN brackets, words are at even indexes
+    SPLIT_RE = re.compile(r'([\s(){};\[\]"]+)')
+
+    # Common PGN text the deflated skeleton may refer to, part of the format and must never change
+    DEFLATE_DICT = (
+        '[WhiteTitle "[BlackTitle "[WhiteFideId "[BlackFideId "[EventDate "[Opening "[Variation "'
+        '[Annotator "[PlyCount "[TimeControl "[Termination "Normal"]\n[Termination "Time forfeit"]\n'
+        '[UTCDate "[UTCTime "[Variant "Standard"]\n[ECO "A[ECO "B[ECO "C[ECO "D[ECO "E'
+        '[WhiteElo "[BlackElo "[WhiteRatingDiff "[BlackRatingDiff "'
+        '[Event "[Site "[Date "[Round "?"]\n[White "[Black "[Result "1/2-1/2"]\n[Result "0-1"]\n[Result "1-0"]\n'
+        '\n\n\x02 \x01 \x01 \x02 \x01 \x01\n\x02 \x01 \x01 \x02 \x01 \x01 \x02 \x01 \x01 \x02 \x01 \x01 '
+    ).encode('utf-8')
+
+    @staticmethod
+    def CreateSanList()-> list:
+        # SAN moves with a code, index in the list is the code, part of the format and must never change
+        # Moves disambiguated by a whole square are rare and stay in the text, 27558 codes fit in 16 bits
+        files = 'abcdefgh'
+        ranks = '12345678'
+        squares = [f + r for r in ranks for f in files]
+        pieces = 'NBRQK'
+
+        sans = list(squares)
+        sans += ['{}x{}{}'.format(f, t, r) for r in ranks for f in files for t in files if abs(ord(f) - ord(t)) == 1]
+        sans += ['{}{}{}'.format(p, c, s) for p in pieces for c in ('', 'x') for s in squares]
+        sans += ['O-O', 'O-O-O']
+        for r in '18':
+            sans += ['{}{}={}'.format(f, r, p) for f in files for p in 'QRBN']
+            sans += ['{}x{}{}={}'.format(f, t, r, p) for f in files for t in files if abs(ord(f) - ord(t)) == 1 for p in 'QRBN']
+        sans += ['{}{}{}{}'.format(p, o, c, s) for p in pieces[:4] for o in files + ranks for c in ('', 'x') for s in squares]
+
+        return [san + suffix for san in sans for suffix in ('', '+', '#')]
+
+    @staticmethod
+    def Encode(pgn: str)-> bytes:
+        if pgn is None:
+            return None
+
+        if PgnCodec.MOVE_MARK in pgn or PgnCodec.NUMBER_MARK in pgn:
+            return bytes([PgnCodec.FORMAT_DEFLATE]) + PgnCodec.__Deflate(pgn)
+
+        get_code = PgnCodec.SAN_CODES.get
+        codes = array.array('H')
+        number = 1
+        number_word = '1.'
+        tokens = PgnCodec.SPLIT_RE.split(pgn)
+        for i in range(0, len(tokens), 2):
+            word = tokens[i]
+            code = get_code(word)
+            if code is not None:
+                codes.append(code)
+                tokens[i] = PgnCodec.MOVE_MARK
+            elif word == number_word:
+                # Only the expected number is replaced, numbers of variations stay in the text
+                tokens[i] = PgnCodec.NUMBER_MARK
+                number += 1
+                number_word = '{}.'.format(number)
+
+        if sys.byteorder != 'little':
+            codes.byteswap()
+        out = bytearray([PgnCodec.FORMAT_MOVES])
+        PgnCodec.__WriteVarint(out, len(codes))
+        out += codes.tobytes()
+        out += PgnCodec.__Deflate(''.join(tokens))
+        return bytes(out)
+
+    @staticmethod
+    def Decode(data: bytes)-> str:
+        if data is None:
+            return None
+
+        if data[0] == PgnCodec.FORMAT_DEFLATE:
+            return PgnCodec.__Inflate(data[1:])
+        if data[0] != PgnCodec.FORMAT_MOVES:
+            raise ValueError('Unknown packed PGN format {}'.format(data[0]))
+
+        count, pos = PgnCodec.__ReadVarint(data, 1)
+        codes = array.array('H')
+        codes.frombytes(data[pos:pos + 2 * count])
+        if sys.byteorder != 'little':
+            codes.byteswap()
+
+        sans = PgnCodec.SAN_LIST
+        moves = [sans[code] for code in codes]
+        numbers = PgnCodec.__Inflate(data[pos + 2 * count:]).split(PgnCodec.NUMBER_MARK)
+        text = PgnCodec.__Interleave(numbers, ['{}.'.format(i) for i in range(1, len(numbers))])
+        parts = text.split(PgnCodec.MOVE_MARK)
+        if len(parts) != len(moves) + 1:
+            raise ValueError('Packed PGN moves do not match its text')
+        return PgnCodec.__Interleave(parts, moves)
+
+    @staticmethod
+    def __Interleave(parts: list, values: list)-> str:
+        # parts[0] + values[0] + parts[1] + ... + parts[-1]
+        return ''.join(itertools.chain.from_iterable(zip(parts, values))) + parts[-1]
+
+    @staticmethod
+    def __WriteVarint(out: bytearray, value: int):
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+
+    @staticmethod
+    def __ReadVarint(data: bytes, pos: int):
+        # -> (value, position after it)
+        value = 0
+        shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return value, pos
+            shift += 7
+
+    @staticmethod
+    def __Deflate(text: str)-> bytes:
+        # Raw deflate without header and checksum, one game is too short to pay for them
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15, zdict=PgnCodec.DEFLATE_DICT)
+        return compressor.compress(text.encode('utf-8')) + compressor.flush()
+
+    @staticmethod
+    def __Inflate(data: bytes)-> str:
+        decompressor = zlib.decompressobj(-15, zdict=PgnCodec.DEFLATE_DICT)
+        return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
+
+
+PgnCodec.SAN_LIST = PgnCodec.CreateSanList()
+PgnCodec.SAN_CODES = {san: code for code, san in enumerate(PgnCodec.SAN_LIST)}
@@ -0,0 +1,26 @@
+import re
+
+
+class PgnSearchText:
+    ''' Text of a PGN that is put into the full-text search index: header values and comments '''
+    HEADER_RE = re.compile(r'^\[(\w+)\s+"((?:[^"\\]|\\.)*)"\]', re.MULTILINE)
+    COMMENT_RE = re.compile(r'\{([^}]*)\}|;([^\n]*)')
+
+    # Header values that carry no information
+    EMPTY_VALUES = ('', '?', '-', '*', '????.??.??')
+
+    @staticmethod
+    def Extract(pgn: str)-> str:
+        # Result must stay the same for the same PGN, deletes from the contentless index repeat it
+        if not pgn:
+            return ''
+
+        parts = [value for _, value in PgnSearchText.HEADER_RE.findall(pgn) if value not in PgnSearchText.EMPTY_VALUES]
+
+        # Comments are searched only in the movetext, header values may contain ';'
+        movetext = PgnSearchText.HEADER_RE.sub('', pgn)
+        for block, line in PgnSearchText.COMMENT_RE.findall(movetext):
+            comment = (block or line).strip()
+            if comment:
+                parts.append(comment)
+        return '\n'.join(parts)
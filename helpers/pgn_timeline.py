@@ -0,0 +1,86 @@
+import array
+import io
+import sys
+
+import chess
+import chess.pgn
+
+from data.chess_structs import GamePgnInfo
+
+
+class PositionTimeline:
+    ''' Positions of every ply of the game mainline, built once per game '''
+
+    def __init__(self, fens, sans, moves, errors):
+        # fens[ply] - position after ply moves, fens[0] is the starting position
+        # sans[ply - 1], moves[ply - 1] - move leading to the position at ply
+        self.fens = fens
+        self.sans = sans
+        self.moves = moves
+        self.errors = errors
+
+    @staticmethod
+    def FromPGN(pgn: str):
+        return PositionTimeline.FromPgnInfo(PositionTimeline.ParsePgn(pgn))
+
+    @staticmethod
+    def FromPgnInfo(info: GamePgnInfo):
+        # Moves of the info are legal, they are replayed without parsing
+        board = chess.Board(info.fen) if info.fen else chess.Board()
+        fens = [board.fen()]
+        for m in info.moves:
+            board.push(m)
+            fens.append(board.fen())
+
+        return PositionTimeline(fens, info.sans, info.moves, info.errors)
+
+    @staticmethod
+    def ParsePgn(pgn: str)-> GamePgnInfo:
+        try:
+            pgn_game = chess.pgn.read_game(io.StringIO(pgn or ''))
+            if pgn_game is None:
+                return GamePgnInfo(False, 0, None, [], [], ['Game is empty.'])
+
+            board = pgn_game.board()
+            fen = board.fen()
+            sans = []
+            moves = []
+            for m in pgn_game.mainline_moves():
+                sans.append(board.san(m))
+                moves.append(m)
+                board.push(m)
+        except ValueError as e:
+            return GamePgnInfo(False, 0, None, [], [], [str(e)])
+
+        errors = [str(e) for e in pgn_game.errors]
+        return GamePgnInfo(not errors, len(moves), None if fen == chess.STARTING_FEN else fen, sans, moves, errors)
+
+    @staticmethod
+    def PackMoves(moves: list)-> bytes:
+        # 16 bits per move: from square, to square and promotion piece type
+        codes = array.array('H', (m.from_square | m.to_square << 6 | (m.promotion or 0) << 12 for m in moves))
+        if sys.byteorder != 'little':
+            codes.byteswap()
+        return codes.tobytes()
+
+    @staticmethod
+    def UnpackMoves(data: bytes)-> list:
+        codes = array.array('H')
+        codes.frombytes(data)
+        if sys.byteorder != 'little':
+            codes.byteswap()
+        return [chess.Move(c & 0x3F, (c >> 6) & 0x3F, (c >> 12) or None) for c in codes]
+
+    def GetPlyCount(self)-> int:
+        return len(self.moves)
+
+    def GetFen(self, ply: int)-> str:
+        return self.fens[ply]
+
+    def GetBoard(self, ply: int)-> chess.Board:
+        return chess.Board(self.fens[ply])
+
+    def GetLastMove(self, ply: int):
+        if ply <= 0:
+            return None
+        return self.moves[ply - 1]
@@ -0,0 +1,123 @@
+import io
+
+import chess
+import chess.pgn
+import chess.polyglot
+
+
+class PositionHashVisitor(chess.pgn.BaseVisitor):
+    ''' Hashes mainline positions while the PGN is parsed, moves after max_ply or an error are not parsed '''
+    HASHER = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+
+    def __init__(self, max_ply: int):
+        self.max_ply = max_ply
+
+    def begin_game(self):
+        self.positions = []
+        self.stopped = False
+        # Pieces part of the hash is updated by the squares a move changes, the rest is cheap to hash
+        self.pieces_hash = None
+        self.move_hash = None
+        self.moved = False
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def begin_parse_san(self, board: chess.Board, san: str):
+        if self.stopped or len(self.positions) >= self.max_ply:
+            return chess.pgn.SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move):
+        # Castling moves the rook as well, the board after it is hashed whole
+        self.move_hash = None if board.is_castling(move) else PositionHashVisitor.GetMoveHash(board, move)
+        self.moved = True
+
+    def visit_board(self, board: chess.Board):
+        # Called for the starting position and after every SAN token, also a skipped or illegal one
+        hasher = PositionHashVisitor.HASHER
+        if self.pieces_hash is None:
+            self.pieces_hash = hasher.hash_board(board)
+            return
+        if not self.moved:
+            return
+
+        if self.move_hash is None:
+            self.pieces_hash = hasher.hash_board(board)
+        else:
+            self.pieces_hash ^= self.move_hash
+        h = self.pieces_hash ^ hasher.hash_castling(board) ^ hasher.hash_ep_square(board) ^ hasher.hash_turn(board)
+        self.positions.append((PositionHasher.ToSigned(h), len(self.positions) + 1))
+        self.moved = False
+
+    def handle_error(self, error: Exception):
+        # Positions before the error are kept
+        self.stopped = True
+
+    def result(self)-> list:
+        return self.positions
+
+    @staticmethod
+    def GetMoveHash(board: chess.Board, move: chess.Move)-> int:
+        # Change of the pieces hash made by a move that is not castling, board is before the move
+        if not move:
+            return 0
+
+        keys = PositionHashVisitor.HASHER.array
+        color = board.turn
+        piece_type = board.piece_type_at(move.from_square)
+        h = keys[64 * ((piece_type - 1) * 2 + color) + move.from_square]
+        h ^= keys[64 * (((move.promotion or piece_type) - 1) * 2 + color) + move.to_square]
+
+        if board.is_en_passant(move):
+            captured_square = move.to_square + (-8 if color == chess.WHITE else 8)
+            h ^= keys[64 * ((chess.PAWN - 1) * 2 + (not color)) + captured_square]
+        else:
+            captured_type = board.piece_type_at(move.to_square)
+            if captured_type:
+                h ^= keys[64 * ((captured_type - 1) * 2 + (not color)) + move.to_square]
+        return h
+
+
+class PositionHasher:
+    ''' Zobrist hashes of game positions, as stored in the position index '''
+    # Plies of every game put into the index, the starting position is not indexed
+    MAX_PLY = 60
+
+    @staticmethod
+    def HashBoard(board: chess.Board)-> int:
+        return PositionHasher.ToSigned(PositionHashVisitor.HASHER(board))
+
+    @staticmethod
+    def ToSigned(h: int)-> int:
+        # Polyglot hash is unsigned 64-bit, sqlite integers are signed
+        return h - (1 << 64) if h >= (1 << 63) else h
+
+    @staticmethod
+    def GetPositions(pgn: str, max_ply: int=MAX_PLY)-> list:
+        # -> (hash, ply) of positions after plies 1..max_ply of the mainline, empty for unreadable PGN
+        positions = chess.pgn.read_game(io.StringIO(pgn or ''), Visitor=lambda: PositionHashVisitor(max_ply))
+        return positions or []
+
+    @staticmethod
+    def GetPgnInfoPositions(info, max_ply: int=MAX_PLY)-> list:
+        # Same as GetPositions for already parsed GamePgnInfo, moves are replayed without parsing
+        hasher = PositionHashVisitor.HASHER
+        board = chess.Board(info.fen) if info.fen else chess.Board()
+        pieces_hash = hasher.hash_board(board)
+        positions = []
+        for ply, move in enumerate(info.moves[:max_ply], 1):
+            if board.is_castling(move):
+                board.push(move)
+                pieces_hash = hasher.hash_board(board)
+            else:
+                pieces_hash ^= PositionHashVisitor.GetMoveHash(board, move)
+                board.push(move)
+            h = pieces_hash ^ hasher.hash_castling(board) ^ hasher.hash_ep_square(board) ^ hasher.hash_turn(board)
+            positions.append((PositionHasher.ToSigned(h), ply))
+        return positions
+
+    @staticmethod
+    def GetGamePositions(args)-> tuple:
+        # (game_id, pgn) -> (game_id, positions), picklable entry point of the backfill pool
+        game_id, pgn = args
+        return (game_id, PositionHasher.GetPositions(pgn))
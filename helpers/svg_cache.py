@@ -0,0 +1,89 @@
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import chess.svg
+
+
+class BoardSvgCache:
+    ''' Process-wide, size bounded LRU cache of rendered board SVGs '''
+    MAX_ENTRIES = 512
+    instance = None
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='svg-prefetch')
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def GetInstance():
+        if BoardSvgCache.instance is None:
+            BoardSvgCache.instance = BoardSvgCache()
+        return BoardSvgCache.instance
+
+    @staticmethod
+    def GetKey(fen: str, orientation: bool, lastmove: chess.Move):
+        # Only piece placement is rendered, move counters and castling rights do not matter
+        return (fen.split(' ')[0], orientation, lastmove.uci() if lastmove else None)
+
+    def Render(self, fen: str, orientation: bool = chess.WHITE, lastmove: chess.Move = None)-> bytes:
+        key = BoardSvgCache.GetKey(fen, orientation, lastmove)
+        with self.lock:
+            svg = self.entries.get(key)
+            if svg is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return svg
+            self.misses += 1
+
+        svg = BoardSvgCache.__RenderSvg(fen, orientation, lastmove)
+        self.__Store(key, svg)
+        return svg
+
+    def Prefetch(self, fen: str, orientation: bool = chess.WHITE, lastmove: chess.Move = None):
+        # Render in the background thread, counters are not affected
+        key = BoardSvgCache.GetKey(fen, orientation, lastmove)
+        with self.lock:
+            if key in self.entries:
+                return
+        self.executor.submit(self.__PrefetchTask, key, fen, orientation, lastmove)
+
+    def GetStats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+    def Clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __PrefetchTask(self, key, fen: str, orientation: bool, lastmove: chess.Move):
+        with self.lock:
+            if key in self.entries:
+                return
+        self.__Store(key, BoardSvgCache.__RenderSvg(fen, orientation, lastmove))
+
+    def __Store(self, key, svg: bytes):
+        with self.lock:
+            self.entries[key] = svg
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    @staticmethod
+    def __RenderSvg(fen: str, orientation: bool, lastmove: chess.Move)-> bytes:
+        svg = chess.svg.board(chess.Board(fen), orientation=orientation, lastmove=lastmove)
+        return bytes(svg, encoding='utf-8')
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from data.chess_structs import ChessGame
+from data.database_api import ChessDataAPI
+from helpers.elo import EloCalculator
+from helpers.elo_numpy import NumpyEloEngine
+
+PLAYERS = 200
+GAMES = 1500
+FIRST_DATE = 1000
+ELO_DATE = 1400
+
+
+def CreateGames(players: int, games: int, seed: int=1):
+    # Three games per date, so checkpoints fall inside dates too
+    rnd = random.Random(seed)
+    return [
+        ChessGame(i + 1, FIRST_DATE + i // 3, *rnd.sample(range(1, players + 1), 2), rnd.randint(0, 2), '')
+        for i in range(games)
+    ]
+
+
+def GetState(api):
+    # Everything a replay writes, checkpoints are left out as their rows depend on the replayed range
+    cur = api.conn.cursor()
+    return (
+        sorted(api.GetPlayersElo()),
+        cur.execute('''SELECT * FROM CH_GAMES_DETAILS ORDER BY id''').fetchall(),
+        cur.execute('''SELECT * FROM CH_RATING_HISTORY ORDER BY 1, 2, 3''').fetchall(),
+    )
+
+
+def DetailsKey(gdetails):
+    return (gdetails.id, gdetails.player_1_elo, gdetails.player_2_elo, gdetails.player_1_change, gdetails.player_2_change)
+
+
+@pytest.fixture(params=[EloCalculator.ENGINE_PYTHON, EloCalculator.ENGINE_NUMPY], ids=['python', 'numpy'])
+def engine(request, monkeypatch):
+    # Small intervals, so the replays cross many delta and full checkpoints
+    monkeypatch.setattr(EloCalculator, 'ENGINE_MODE', request.param)
+    monkeypatch.setattr(EloCalculator, 'CHECKPOINT_INTERVAL', 20)
+    monkeypatch.setattr(EloCalculator, 'FULL_CHECKPOINT_INTERVAL', 3)
+    return request.param
+
+
+@pytest.fixture
+def api(tmp_path):
+    with ChessDataAPI(str(tmp_path / 'elo.db')) as api:
+        api.AddPlayersBatch([('First Last{}'.format(i), 'n{}'.format(i)) for i in range(PLAYERS)])
+        games = [ChessGame(None, g.date, g.player_1_id, g.player_2_id, g.result, '') for g in CreateGames(PLAYERS, GAMES)]
+        api.AddGamesBatch(games, index_positions=False)
+        api.UpdateEloTimestamp(ELO_DATE)
+        yield api
+
+
+@pytest.mark.parametrize('period_length', [0, 50], ids=['sequential', 'period'])
+def test_recalculate_from_checkpoint_equals_full(api, engine, period_length):
+    api.SetEloPeriodLength(period_length)
+    full = GetState(api)
+
+    for date in (FIRST_DATE + 1, 1100, 1250, ELO_DATE - 1):
+        api.RecalculateArchivedEloFrom(date)
+        assert GetState(api) == full
+
+
+@pytest.mark.parametrize('period_length', [0, 50], ids=['sequential', 'period'])
+def test_iterate_and_recalculate_from_checkpoint_equal_full(api, engine, period_length):
+    api.SetEloPeriodLength(period_length)
+    for timestamp in (1410, 1437, 1480, 1499):
+        api.RecalculateEloIterate(timestamp)
+    iterated = GetState(api)
+
+    for date in (1050, 1420):
+        api.RecalculateArchivedEloFrom(date)
+        assert GetState(api) == iterated
+
+    api.RecalculateArchivedElo()
+    assert GetState(api) == iterated
+
+
+@pytest.mark.parametrize('players', [10, 200, 1000])
+def test_numpy_engine_equals_python(monkeypatch, players):
+    games = CreateGames(players, 20000, seed=players)
+    replayed = []
+    for engine in (EloCalculator.ENGINE_PYTHON, EloCalculator.ENGINE_NUMPY):
+        monkeypatch.setattr(EloCalculator, 'ENGINE_MODE', engine)
+        players_elo = {id: EloCalculator.ELO_START for id in range(1, players + 1)}
+        gdetails_list, checkpoints = EloCalculator.ReplayGames(players_elo, iter(games), checkpoint_count=7)
+        replayed.append(([DetailsKey(gd) for gd in gdetails_list], checkpoints, players_elo))
+
+    assert replayed[0] == replayed[1]
+    # Python ints, not numpy ones, are stored in the database
+    assert {type(v) for gd in replayed[1][0] for v in gd} == {int}
+    assert {type(v) for v in replayed[1][2].values()} == {int}
+
+
+def test_numpy_engine_replays_rounds(monkeypatch):
+    # Enough players for the round replay, the sequential fallback is not used
+    def Fail(*args):
+        raise AssertionError('sequential replay')
+
+    monkeypatch.setattr(EloCalculator, 'ReplaySequential', staticmethod(Fail))
+    players_elo = {id: EloCalculator.ELO_START for id in range(1, 201)}
+    gdetails_list, _ = NumpyEloEngine.ReplayGames(EloCalculator, players_elo, CreateGames(200, 5000))
+    assert len(gdetails_list) == 5000
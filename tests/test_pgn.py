@@ -0,0 +1,83 @@
+import io
+
+import pytest
+
+from benchmarks.generator import SyntheticGenerator
+from data.chess_structs import GameResult
+from data.pgn_importer import PgnImporter
+from helpers.pgn_codec import PgnCodec
+
+GAME = '''[Event "Rated Blitz game"]
+[Site "https://lichess.org/abcdefgh"]
+[Date "2023.01.02"]
+[White "Carlsen, Magnus"]
+[Black "Nakamura, Hikaru"]
+[Result "1-0"]
+[ECO "C65"]
+
+1. e4 { [%clk 0:03:00] } 1... e5 { [%clk 0:03:00] } 2. Nf3 Nc6 3. Bb5 (3. Bc4 Bc5 4. c3) 3... Nf6 $1
+4. O-O Nxe4 5. Re1 Nd6 6. Nxe5+ Be7?! 7. Bf1 Nxe5 8. Rxe5 O-O 9. d4 Bf6 10. Re1 Re8 11. Rxe8+ Qxe8 1-0'''
+
+
+@pytest.mark.parametrize('pgn', [
+    GAME,
+    '',
+    '1. e4 e5 *',
+    '1. d4 1-0\r\n',
+    '[White "Łukasz Ärger"]\n\n1. e4 {Zug mit Überraschung ♞} e5 1/2-1/2',
+    # Marks used by the packed format itself keep the text deflated
+    '1. e4 \x01 e5 \x02',
+    # Numbers that do not follow the expected one, and words that only look like moves
+    '5. e4 e5 1. Nf3 2. Nc3 e9 Nxx4 1.',
+], ids=['game', 'empty', 'short', 'crlf', 'unicode', 'marks', 'numbers'])
+def test_codec_round_trip(pgn):
+    assert PgnCodec.Decode(PgnCodec.Encode(pgn)) == pgn
+
+
+def test_codec_round_trip_random_games():
+    generator = SyntheticGenerator(2, 0, seed=3)
+    for result in [GameResult.WHITE_WIN, GameResult.BLACK_WIN, GameResult.DRAW] * 30:
+        pgn = generator.GetRandomPGN(result)
+        assert PgnCodec.Decode(PgnCodec.Encode(pgn)) == pgn
+
+
+def test_codec_none():
+    assert PgnCodec.Encode(None) is None
+    assert PgnCodec.Decode(None) is None
+
+
+def test_split_games_wrapped_clock_comments():
+    # Long comments are wrapped, so move text lines may start with '[' too
+    first = '''[Event "A"]
+[White "W1"]
+[Black "B1"]
+[Result "1-0"]
+
+1. e4 {
+[%clk 0:03:00] } 1... e5 {
+[%clk 0:02:59] [%eval 0.2] } 2. Nf3 1-0
+'''
+    second = '''[Event "B"]
+[White "W2"]
+[Black "B2"]
+[Result "0-1"]
+
+1. d4 {[%clk 0:01:00]}
+[%clk 0:01:00] d5 0-1
+'''
+    games = list(PgnImporter.SplitGames(io.StringIO(first + '\n' + second + '\n\n')))
+    assert [game.strip() for game in games] == [first.strip(), second.strip()]
+
+
+def test_split_games_without_blank_lines():
+    text = '[White "A"]\n[Black "B"]\n1. e4 1-0\n[White "C"]\n[Black "D"]\n1. d4 0-1\n'
+    games = list(PgnImporter.SplitGames(io.StringIO(text)))
+    assert games == ['[White "A"]\n[Black "B"]\n1. e4 1-0\n', '[White "C"]\n[Black "D"]\n1. d4 0-1\n']
+
+
+def test_parse_game_unescapes_tag_values():
+    text = '[White "Smith, John"]\n[Black "O\\"Brien\\\\, Pat"]\n[Date "2020.01.01"]\n[Result "1-0"]\n\n1. e4 1-0'
+    game, error = PgnImporter.ParseGame((text, True))
+    assert error is None
+    assert game[:4] == ('John Smith', 'Pat O"Brien\\', 1577836800, GameResult.WHITE_WIN)
+    assert game[5].valid and game[5].plies == 1